@@ -3,3 +3,7 @@ from decimal import Decimal
 DECIMAL_ZERO = Decimal("0.00")
 TIME_ZONE = "America/Argentina/Buenos_Aires"
 DECIMAL_DIGIT_AMOUNT = 2
+DEFAULT_CONCURRENCY = 100  # Max cafci requests in flight for the async engine
+DEFAULT_FUND_BUDGET = 120  # Max seconds to get the cafci data of a fund, retries included
+DEFAULT_CHUNK_SIZE = 200  # Rows written to the sheet on every streamed chunk
+MAX_PENDING_CHUNKS = 2  # Chunks fetched ahead of the sheet writes
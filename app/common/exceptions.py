@@ -16,3 +16,12 @@ class BaseException(Exception):
 
 class ParameterError(BaseException):
     pass
+
+
+class SheetWriteError(BaseException):
+    """A write of many ranges failed, the ranges before the failed call were written."""
+
+    def __init__(self, message=None, written_ranges=0, updated_cells=0):
+        super().__init__(message)
+        self.written_ranges = written_ranges
+        self.updated_cells = updated_cells
@@ -0,0 +1,125 @@
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+)
+from typing import Optional
+
+
+# Extra of the per fund log lines, only one of every LOG_SAMPLE_RATE of them is written
+SAMPLED = {"sampled": True}
+
+
+class SampleFilter(logging.Filter):
+    """Let through one of every `rate` records logged with extra=SAMPLED.
+
+    Records are counted by message template, so every kind of per fund line
+    keeps showing up while a run goes on. Warnings and errors are never
+    dropped.
+    """
+
+    def __init__(self, rate: int = 1):
+        super().__init__()
+        self.rate = max(int(rate), 1)
+        self.counts: dict = {}  # message template: records seen
+
+    def filter(self, record):
+        if self.rate == 1 or record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+
+        count = self.counts.get(record.msg, 0)
+        self.counts[record.msg] = count + 1
+        if count % self.rate:
+            return False
+
+        if count:
+            record.msg = f"{record.msg} ({count + 1} times so far)"
+        return True
+
+
+class QueueLogHandler(QueueHandler):
+    """Hand the records to a single listener thread that formats and writes them.
+
+    Logging only costs the callers a put in a queue, the stream is written by
+    the listener and never blocks the event loop or the sheet writer. Records
+    are formatted by the listener too, so the arguments are only turned into
+    text for the records that are written.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.handler = logging.StreamHandler(stream)
+        self.listener = None
+        self.start()
+
+        # The queue is drained before logging shuts down, records logged at the end of a run are not lost
+        atexit.register(self.stop)
+        # A forked process has the queue but not the listener thread
+        os.register_at_fork(after_in_child=self.detach)
+
+    def start(self):
+        self.listener = QueueListener(self.queue, self.handler, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        # Records logged from now on are written by the caller, the queued ones by the listener before it stops
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
+    def detach(self):
+        """
+        Write the records from the calling thread, used by forked processes:
+        they exit without running atexit, a listener of their own would lose its last records.
+        """
+        self.queue = queue.SimpleQueue()
+        self.listener = None
+
+    def emit(self, record):
+        if self.listener is None:
+            if record.levelno >= self.handler.level:
+                self.handler.handle(record)
+            return
+
+        super().emit(record)
+
+    def setFormatter(self, fmt):
+        # The listener formats, dictConfig sets the formatter of this handler
+        self.handler.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Same process, the record is handed as is instead of formatted and pickled
+        return record
+
+
+def parse_log_levels(levels: Optional[str]) -> dict:
+    """
+    Parse the per module levels, example: "app.sheets=DEBUG,app.models.fetch_engine=WARNING".
+    return: {logger name: level}
+    """
+    parsed = {}
+    for item in (levels or "").split(","):
+        if not item.strip():
+            continue
+
+        name, _, level = item.partition("=")
+        if not level:
+            raise ValueError(f"Invalid log level {item!r}, expected module=LEVEL")
+
+        parsed[name.strip()] = level.strip().upper()
+
+    return parsed
+
+
+def set_log_levels(level: Optional[str] = None, levels: Optional[dict] = None):
+    """
+    Change the level of the root logger and of some modules.
+    """
+    if level:
+        logging.getLogger().setLevel(level.upper())
+
+    for name, module_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(module_level)
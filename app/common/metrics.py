@@ -0,0 +1,376 @@
+import functools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import (
+    Optional,
+    TypeVar,
+)
+
+from .profiling import (
+    get_profiler,
+)
+from .utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+METRICS_DIR = "metrics"  # Directory of the files written at the end of every run
+# Seconds, from a cached cafci response to a sheet write of thousands of rows
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+RATIO_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1)
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+_registries: dict = {}  # pid: MetricsRegistry
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric():
+    """Values of a metric, one per combination of label values."""
+    TYPE = ""  # Prometheus type, set by every kind of metric
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), lock=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = lock or threading.Lock()
+        self.values: dict = {}  # (label values): value
+
+    def get_key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def get_labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(Metric):
+    """Value that only goes up, example: requests made."""
+    TYPE = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def to_prometheus(self) -> list:
+        return [
+            f"{self.name}{format_labels(self.get_labels(key))} {format_number(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+    def summarize(self, value) -> float:
+        return value
+
+
+class Gauge(Metric):
+    """Value that goes up and down, example: seconds of the run."""
+    TYPE = "gauge"
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self.get_key(labels)] = value
+
+    to_prometheus = Counter.to_prometheus
+    summarize = Counter.summarize
+
+
+class Histogram(Metric):
+    """Distribution of observed values, example: latencies.
+
+    Only the counts of every bucket are kept, so it uses the same memory for
+    ten or ten million observations.
+    """
+    TYPE = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), lock=None, buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def new_value(self) -> list:
+        # Count of every bucket plus the +Inf one, sum and count of the observations
+        return [[0] * (len(self.buckets) + 1), 0, 0]
+
+    def observe(self, amount: float, **labels):
+        key = self.get_key(labels)
+        index = bisect_left(self.buckets, amount)
+
+        with self.lock:
+            value = self.values.get(key)
+            if value is None:
+                value = self.values[key] = self.new_value()
+
+            value[0][index] += 1
+            value[1] += amount
+            value[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the seconds spent inside the with block.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def to_prometheus(self) -> list:
+        lines = []
+        for key, (counts, total, count) in sorted(self.values.items()):
+            labels = self.get_labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"), ), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels({**labels, 'le': format_number(bound)})} {cumulative}")
+
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_number(total)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {count}")
+
+        return lines
+
+    def get_quantile(self, counts: list, count: int, quantile: float) -> float:
+        """
+        Estimate a quantile from the bucket counts, interpolating inside its bucket like prometheus does.
+        """
+        rank = quantile * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    # Over the last bucket, its upper bound is the best known value
+                    return self.buckets[-1]
+
+                lower = self.buckets[index - 1] if index else 0
+                return lower + (self.buckets[index] - lower) * (rank - cumulative) / bucket_count
+
+            cumulative += bucket_count
+
+        return 0
+
+    def summarize(self, value) -> dict:
+        counts, total, count = value
+        summary = {"count": count, "sum": total, "mean": total / count if count else 0}
+        for quantile in SUMMARY_QUANTILES:
+            summary[f"p{int(quantile * 100)}"] = self.get_quantile(counts, count, quantile)
+
+        return summary
+
+
+MetricType = TypeVar("MetricType", bound=Metric)
+
+
+class MetricsRegistry():
+    """Counters, gauges and histograms of the current run.
+
+    Metrics are created the first time they are asked for, so any module can
+    record without declaring them up front.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics: dict = {}  # name: Metric
+        self.command: Optional[str] = None
+        self.started_at: Optional[float] = None
+
+    def get_metric(self, metric_type: type[MetricType], name: str, help: str, labelnames: tuple,
+                   **kwargs) -> MetricType:
+        metric = self.metrics.get(name)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(name)
+                if metric is None:
+                    metric = metric_type(name, help, labelnames, **kwargs)
+                    self.metrics[name] = metric
+
+        if not isinstance(metric, metric_type):
+            raise ValueError(f"Metric {name} is a {metric.TYPE}, not a {metric_type.TYPE}")
+
+        return metric
+
+    def counter(self, name: str, help: str = "", labelnames: tuple = ()) -> Counter:
+        return self.get_metric(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str = "", labelnames: tuple = ()) -> Gauge:
+        return self.get_metric(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str = "", labelnames: tuple = (),
+                  buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.get_metric(Histogram, name, help, labelnames, buckets=buckets)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Observe the seconds of a stage of the run, example: fetch.
+        The stage is profiled too when the run is profiled.
+        """
+        stage_seconds = self.histogram("stage_seconds", "Seconds of every stage of the run", ("stage", ))
+        with stage_seconds.time(stage=stage), get_profiler().stage(stage):
+            yield
+
+    def reset(self):
+        with self.lock:
+            self.metrics = {}
+
+    def to_prometheus(self) -> str:
+        """
+        Get every metric in the prometheus text format.
+        """
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            with metric.lock:
+                if metric.help:
+                    lines.append(f"# HELP {name} {metric.help}")
+                lines.append(f"# TYPE {name} {metric.TYPE}")
+                lines.extend(metric.to_prometheus())
+
+        return "\n".join(lines) + "\n"
+
+    def get_summary(self) -> dict:
+        """
+        Get every metric summarized, histograms as count, sum, mean and quantiles.
+        """
+        summary = {}
+        for name, metric in sorted(self.metrics.items()):
+            with metric.lock:
+                values = [
+                    {**metric.get_labels(key), "value": metric.summarize(value)}
+                    for key, value in sorted(metric.values.items())
+                ]
+
+            summary[name] = {"type": metric.TYPE, "values": values}
+
+        return summary
+
+    def start_run(self, command: str):
+        self.reset()
+        self.command = command
+        self.started_at = time.time()
+
+    def finish_run(self) -> float:
+        """
+        Record the seconds of the run.
+        return: elapsed_time
+        """
+        # A run that never started took no time
+        elapsed_time = time.time() - self.started_at if self.started_at is not None else 0
+        self.gauge("run_seconds", "Seconds of the whole run", ("command", )).set(elapsed_time, command=self.command)
+        self.gauge("run_timestamp_seconds", "Unix time when the run finished", ("command", )).set(
+            time.time(), command=self.command
+        )
+        return elapsed_time
+
+    def write(self, directory: Optional[str] = None) -> tuple:
+        """
+        Write the metrics of the run as <command>.prom and <command>.json.
+
+        The prom file can be read by the node exporter textfile collector, the
+        json summary keeps the start and finish time of the run for graphing.
+        return: prometheus_path, summary_path
+        """
+        directory = directory or METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        command = self.command or "run"
+
+        prometheus_path = os.path.join(directory, f"{command}.prom")
+        summary_path = os.path.join(directory, f"{command}.json")
+
+        # Written to a temporary file first, a collector never reads a half written file
+        temporary_path = f"{prometheus_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as prometheus_file:
+            prometheus_file.write(self.to_prometheus())
+        os.replace(temporary_path, prometheus_path)
+
+        with open(summary_path, "w") as summary_file:
+            json.dump({
+                "command": command,
+                "started_at": self.started_at,
+                "finished_at": time.time(),
+                "metrics": self.get_summary(),
+            }, summary_file, indent=2)
+
+        return prometheus_path, summary_path
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Get the metrics registry of the current process.
+
+    Registries are never shared between processes, a forked worker records
+    into its own.
+    """
+    pid = os.getpid()
+    registry = _registries.get(pid)
+
+    if registry is None:
+        registry = MetricsRegistry()
+        _registries[pid] = registry
+
+    return registry
+
+
+def record_run(command: str, directory: Optional[str] = None):
+    """
+    Decorator of the service entry points, records the metrics of a run and writes them when it finishes.
+    Runs started by another run, like the check at the end of an update, are recorded by the outer one.
+    The profile of the run is written too when it is profiled.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            metrics = get_metrics()
+            if metrics.command is not None:
+                with metrics.stage(command):
+                    return function(*args, **kwargs)
+
+            profiler = get_profiler()
+            metrics.start_run(command)
+            if profiler.enabled:
+                profiler.start_run()
+
+            try:
+                # The time outside every stage is profiled as the command
+                with profiler.stage(command):
+                    return function(*args, **kwargs)
+            finally:
+                metrics.finish_run()
+                try:
+                    paths = metrics.write(directory)
+                    logger.info("Metrics written to %s", ", ".join(paths))
+                except OSError as e:
+                    logger.error("Error writing the metrics: %s", e)
+
+                if profiler.enabled:
+                    try:
+                        profile_paths = profiler.write(command)
+                        logger.info("Profile written to %s", ", ".join(profile_paths))
+                    except Exception as e:
+                        # A broken report must not fail the run
+                        logger.error("Error writing the profile: %s", e)
+
+                metrics.command = None
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,288 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from .utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+PROFILE_DIR = "profile"  # Directory of the reports written at the end of every profiled run
+TRACEMALLOC_FRAMES = 1  # Frames kept of every allocation, the report groups them by line and every frame is slower
+TOP_ALLOCATIONS = 30  # Allocations shown for every stage in the memory report
+TOP_FUNCTIONS = 30  # Functions shown for every stage in the text report
+PROFILER_FILES = ("cProfile.py", "pstats.py", "tracemalloc.py", "profiling.py")  # Left out of the memory report
+COLLAPSED_MAX_DEPTH = 100
+COLLAPSED_MIN_TIME = 0.0001  # Seconds, shorter call paths are left out of the collapsed stacks
+
+_profilers: dict = {}  # pid: StageProfiler
+
+
+def format_frame(function: tuple) -> str:
+    """
+    Name a pstats function key (file, line, name) for the collapsed stacks, without the ; separator.
+    """
+    filename, line, name = function
+    if filename == "~":
+        # Builtins, example: <method 'poll' of 'select.epoll' objects>
+        return name.replace(";", ",")
+
+    return f"{os.path.basename(filename)}:{name}:{line}".replace(";", ",")
+
+
+def collapse_stats(stats: dict, root: str) -> dict:
+    """
+    Turn the call graph of a profile into collapsed stacks, the input of flamegraph.pl and speedscope.
+
+    cProfile only keeps the time of every caller -> callee edge, the time of
+    a callee called from many paths is split between them in proportion.
+    param: stats - pstats.Stats.stats
+    param: root - First frame of every stack, example: the stage
+    return: {"root;caller;callee": seconds of the callee itself on that path}
+    """
+    callees: dict = {}  # caller: {callee: caller -> callee edge}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, {})[function] = edge
+
+    stacks: dict = {}  # collapsed stack: seconds
+    path = [root]
+    in_path = set()
+
+    def walk(function, own_time, total_time):
+        path.append(format_frame(function))
+        in_path.add(function)
+
+        if own_time > 0:
+            key = ";".join(path)
+            stacks[key] = stacks.get(key, 0) + own_time
+
+        function_total_time = stats[function][3]
+        if len(path) < COLLAPSED_MAX_DEPTH and function_total_time > 0:
+            scale = min(total_time / function_total_time, 1)
+            for callee, (_, _, edge_own_time, edge_total_time) in callees.get(function, {}).items():
+                # Recursive calls are already counted by the first frame of the function
+                if callee not in in_path and edge_total_time * scale >= COLLAPSED_MIN_TIME:
+                    walk(callee, edge_own_time * scale, edge_total_time * scale)
+
+        in_path.discard(function)
+        path.pop()
+
+    # Functions called from the frames running when the profile started have no callers
+    for function, (_, _, own_time, total_time, callers) in stats.items():
+        if not any(caller in stats for caller in callers):
+            walk(function, own_time, total_time)
+
+    return stacks
+
+
+class StageProfiler():
+    """cProfile and tracemalloc of every stage of a run, enabled with --profile.
+
+    Every stage gets its own profile. A stage started inside another one
+    pauses the outer profile, so the time of every function is counted once,
+    on the innermost stage. Threads keep their own stages, example: the sheet
+    writes of the streamed update. The stats of a stage entered many times, or
+    from many threads, are added together.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.directory = PROFILE_DIR
+        self.trace_memory = True
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.stats = {}  # stage: pstats.Stats
+        self.snapshots = []  # (stage, tracemalloc snapshot) taken when the main thread leaves a stage
+
+    def enable(self, directory: Optional[str] = None, trace_memory: bool = True):
+        self.enabled = True
+        self.directory = directory or PROFILE_DIR
+        self.trace_memory = trace_memory
+
+    def get_stack(self) -> list:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+
+        return stack
+
+    def start_run(self):
+        self.stats = {}
+        self.snapshots = []
+
+        if self.trace_memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, stage: str):
+        """
+        Profile the with block as a stage of the run, does nothing if the profiler is not enabled.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        import cProfile
+
+        stack = self.get_stack()
+        if stack:
+            stack[-1][1].disable()
+
+        profile = cProfile.Profile()
+        stack.append((stage, profile))
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            stack.pop()
+            self.add_profile(stage, profile)
+
+            if stack:
+                stack[-1][1].enable()
+
+            # Stages of the run itself and the run, the sheet writes of other threads are too many
+            if len(stack) <= 1 and self.trace_memory and threading.current_thread() is threading.main_thread():
+                self.take_snapshot(stage)
+
+    def add_profile(self, stage: str, profile):
+        import pstats
+
+        with self.lock:
+            stats = self.stats.get(stage)
+            if stats is None:
+                self.stats[stage] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    def take_snapshot(self, stage: str):
+        import tracemalloc
+
+        if tracemalloc.is_tracing():
+            self.snapshots.append((stage, tracemalloc.take_snapshot()))
+
+    def get_merged_stats(self):
+        """
+        Get the stats of every stage added together.
+        """
+        import pstats
+
+        if not self.stats:
+            return None
+
+        return pstats.Stats().add(*self.stats.values())
+
+    def write_collapsed(self, path: str):
+        """
+        Write the collapsed stacks of every stage, in microseconds.
+        """
+        lines = []
+        for stage, stats in self.stats.items():
+            for stack, seconds in collapse_stats(stats.stats, stage).items():
+                microseconds = int(seconds * 1000000)
+                if microseconds:
+                    lines.append(f"{stack} {microseconds}")
+
+        with open(path, "w") as collapsed_file:
+            collapsed_file.write("\n".join(sorted(lines)) + "\n")
+
+    def write_report(self, path: str):
+        """
+        Write the functions with the most cumulative time of every stage.
+        """
+        with open(path, "w") as report_file:
+            for stage, stats in self.stats.items():
+                report_file.write(f"=== {stage} ===\n")
+                stats.stream = report_file
+                stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    def write_memory_report(self, path: str):
+        """
+        Write the peak traced memory and the top allocations alive at the end of every stage.
+        """
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, "w") as report_file:
+            report_file.write(f"Traced memory: {current / 2 ** 20:.1f} MiB now, {peak / 2 ** 20:.1f} MiB peak\n")
+
+            for stage, snapshot in self.snapshots:
+                statistics = [
+                    statistic for statistic in snapshot.statistics("lineno")
+                    if not statistic.traceback[0].filename.endswith(PROFILER_FILES)
+                ]
+                total = sum(statistic.size for statistic in statistics)
+                report_file.write(f"\n=== {stage}: {total / 2 ** 20:.1f} MiB alive ===\n")
+
+                for statistic in statistics[:TOP_ALLOCATIONS]:
+                    frame = statistic.traceback[0]
+                    report_file.write(
+                        f"{statistic.size / 1024:10.1f} KiB {statistic.count:8} blocks  "
+                        f"{frame.filename}:{frame.lineno}\n"
+                    )
+
+    def write(self, command: str) -> list:
+        """
+        Write the reports of the run into the profile directory.
+        - <command>.pstats: stats of every stage merged, for pstats or snakeviz
+        - <command>.<stage>.pstats: stats of every stage
+        - <command>.collapsed: collapsed stacks, for flamegraph.pl or speedscope
+        - <command>.txt: top functions of every stage
+        - <command>.memory.txt: top allocations of every stage
+        return: paths
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, command)
+        paths = []
+
+        if self.trace_memory:
+            import tracemalloc
+
+            if self.snapshots:
+                self.write_memory_report(f"{prefix}.memory.txt")
+                paths.append(f"{prefix}.memory.txt")
+
+            # Tracing slows every allocation, it is started again by the next run
+            self.snapshots = []
+            tracemalloc.stop()
+
+        merged = self.get_merged_stats()
+        if merged is not None:
+            merged.dump_stats(f"{prefix}.pstats")
+            paths.append(f"{prefix}.pstats")
+
+            for stage, stats in self.stats.items():
+                stats.dump_stats(f"{prefix}.{stage}.pstats")
+
+            self.write_collapsed(f"{prefix}.collapsed")
+            self.write_report(f"{prefix}.txt")
+            paths.extend([f"{prefix}.collapsed", f"{prefix}.txt"])
+
+        return paths
+
+
+def get_profiler() -> StageProfiler:
+    """
+    Get the stage profiler of the current process, a forked worker profiles into its own.
+    """
+    pid = os.getpid()
+    profiler = _profilers.get(pid)
+
+    if profiler is None:
+        profiler = StageProfiler()
+        parent = next(iter(_profilers.values()), None)
+        if parent is not None and parent.enabled:
+            # Workers forked from a profiled run are profiled too, into their own files
+            profiler.enable(os.path.join(parent.directory, str(pid)), parent.trace_memory)
+
+        _profilers[pid] = profiler
+
+    return profiler
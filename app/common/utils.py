@@ -6,10 +6,10 @@ from datetime import (
 from decimal import (
     Decimal,
     InvalidOperation,
-    localcontext,
     ROUND_DOWN,
 )
 import logging
+import os
 from pytz import timezone as pytz_timezone
 
 from .constants import (
@@ -18,9 +18,21 @@ from .constants import (
     DECIMAL_DIGIT_AMOUNT,
 )
 from .exceptions import ParameterError
+from .log_handlers import (  # noqa: F401, SAMPLED is used by the modules that log per fund
+    SAMPLED,
+    QueueLogHandler,
+    SampleFilter,
+    parse_log_levels,
+    set_log_levels,
+)
 
 import logging.config
 
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")  # Per module levels, example: app.sheets=DEBUG,app.models=WARNING
+LOG_SAMPLE_RATE = int(os.environ.get("LOG_SAMPLE_RATE", 100))  # One of every LOG_SAMPLE_RATE per fund lines
+DATA_DIR = os.environ.get("DATA_DIR", "")  # Directory of the local sqlite stores, the current one by default
+
 LOGGING_CONFIG = {
     'version': 1,
     'disable_existing_loggers': True,
@@ -29,18 +41,25 @@ LOGGING_CONFIG = {
             'format': '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
         },
     },
+    'filters': {
+        'sample': {
+            '()': SampleFilter,
+            'rate': LOG_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'default': {
-            'level': 'INFO',
+            # Written by a single listener thread, logging never blocks the fetching
+            '()': QueueLogHandler,
             'formatter': 'standard',
-            'class': 'logging.StreamHandler',
+            'filters': ['sample', ],
             'stream': 'ext://sys.stdout',  # Default is stderr
         },
     },
     'loggers': {
         '': {  # root logger
             'handlers': ['default', ],
-            'level': 'DEBUG',
+            'level': LOG_LEVEL,
             'propagate': False
         },
         'error': {
@@ -52,6 +71,7 @@ LOGGING_CONFIG = {
 }
 
 logging.config.dictConfig(LOGGING_CONFIG)
+set_log_levels(levels=parse_log_levels(LOG_LEVELS))
 
 
 def get_logger(name):
@@ -65,6 +85,22 @@ def get_logger(name):
 logger = get_logger(__name__)
 
 
+def get_data_path(filename: str) -> str:
+    """
+    Get the path of a local store file inside DATA_DIR, absolute paths are kept as they are.
+    """
+    return os.path.join(DATA_DIR, filename)
+
+
+def emojize(text):
+    """
+    Same as emoji.emojize, the emoji module is only imported the first time it is used.
+    """
+    from emoji import emojize as emoji_emojize
+
+    return emoji_emojize(text)
+
+
 def datetime_to_utc(date, with_tzinfo=False):
     """
     Return date in UTC datetime.
@@ -131,6 +167,22 @@ def normalize_amount(value):
     return normal_value
 
 
+# Quantums are immutable, build them once per amount of decimals
+_QUANTUMS: dict = {}  # decimals_to_round: Decimal quantum
+
+
+def get_quantum(decimals_to_round):
+    """
+    Get the Decimal used to quantize a value to the given decimals, example: 2 -> Decimal('0.00').
+    """
+    quantum = _QUANTUMS.get(decimals_to_round)
+    if quantum is None:
+        quantum = Decimal(f'0.{"0" * decimals_to_round}')
+        _QUANTUMS[decimals_to_round] = quantum
+
+    return quantum
+
+
 def normalize_decimals(value, decimals_to_round=8, method=ROUND_DOWN):
     """
     Normalize decimal value to the decimals given.
@@ -139,21 +191,19 @@ def normalize_decimals(value, decimals_to_round=8, method=ROUND_DOWN):
     param decimals_to_round: Integer, number of decimals to have
     param method: str (?), round method to use. not used so far.
     """
-    new_value = value
     try:
         if value is None:
             return DECIMAL_ZERO
 
-        if not isinstance(value, str) and not isinstance(value, Decimal):
-            value = str(value)
-
         if not isinstance(value, Decimal):
-            new_value = Decimal(value)
+            # Ints are exact, any other type goes through str like floats ('0.1' instead of 0.1000000000000000055)
+            if type(value) is not int and not isinstance(value, str):
+                value = str(value)
 
-        decimals = Decimal(f'0.{"0" * decimals_to_round}')
-        with localcontext() as ctx:
-            ctx.rounding = method
-            new_value = new_value.quantize(decimals)
+            value = Decimal(value)
+
+        # Same as quantizing inside a localcontext with the given rounding
+        new_value = value.quantize(get_quantum(decimals_to_round), rounding=method)
     except InvalidOperation:
         logger.warn("Could not normalize '%s' into Decimal", value)
         new_value = DECIMAL_ZERO
@@ -161,6 +211,30 @@ def normalize_decimals(value, decimals_to_round=8, method=ROUND_DOWN):
     return new_value
 
 
+def normalize_many(values, decimals_to_round=8, method=ROUND_DOWN):
+    """
+    Normalize many values to the decimals given, same result as normalize_decimals for each value.
+
+    param values: iterable of anything castable to Decimal, example: a sheet column
+    return: list of Decimal
+    """
+    quantum = get_quantum(decimals_to_round)
+    normalized: list = []
+    append = normalized.append
+
+    for value in values:
+        if type(value) is Decimal:
+            try:
+                append(value.quantize(quantum, rounding=method))
+                continue
+            except InvalidOperation:
+                pass
+
+        append(normalize_decimals(value, decimals_to_round, method))
+
+    return normalized
+
+
 def parse_date(date_str):
     """
     Parse a string with format DD/MM/YYYY or YYYY/MM/DD to a date object.
@@ -227,11 +301,12 @@ def date_or_today(__date=None):
     return __date
 
 
-def validate_option(opcion):
+def validate_option(opcion, options=('1', '2', '3', '4', '5')):
     while True:
-        if (opcion != '1' and opcion != '2' and opcion != '3' and opcion != '4' and opcion != '5'):
-            print("Error: Debes ingresar 1 o 2 o 3 o 4 o 5")
-            opcion = input("Ingresa 1 o 2 o 3 o 4 o 5: ")
+        if opcion not in options:
+            options_text = " o ".join(options)
+            print(f"Error: Debes ingresar {options_text}")
+            opcion = input(f"Ingresa {options_text}: ")
         else:
             return opcion
 
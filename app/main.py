@@ -1,39 +1,197 @@
+import argparse
+import sys
+
+from .common.profiling import (
+    PROFILE_DIR,
+    get_profiler,
+)
 from .common.utils import (
     get_logger,
+    parse_log_levels,
+    set_log_levels,
     validate_option,
 )
 
+# Services only import google, requests, aiohttp, numpy and emoji inside the functions that use them,
+# so every command loads just what it needs
 from .services import (
     create_initial_funds_database,
     search_fund_by_name,
+    search_funds_from_file,
     start_debug_mode,
     update_funds_database,
     check_database_integrity,
+    sync_price_store,
+    backfill_price_store,
+)
+from .common.constants import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_FUND_BUDGET,
 )
 
 logger = get_logger(__name__)
 
-if __name__ == '__main__':
+RATE_LIMIT_HELP = "Max cafci requests per second, 0 disables the limit"
+REFRESH_HELP = "Read the funds sheet from google even if the local copy is fresh"
+
+
+def interactive_menu():
     # Give to the user 2 options, create the initial funds database or update it
     print("1. Create initial funds database")
     print("2. Update funds database")
     print("3. Search fund by name")
     print("4. Check database integrity")
     print("5. Start debug mode")
+    print("6. Sync price store")
+    print("7. Backfill price store")
+    print("8. Search funds from file")
     option = input("Select an option: ")
 
-    option = validate_option(option)
-
     switcher = {
         "1": create_initial_funds_database,
         "2": update_funds_database,
         "3": search_fund_by_name,
         "4": check_database_integrity,
         "5": start_debug_mode,
+        "6": sync_price_store,
+        "7": backfill_price_store,
+        "8": search_funds_from_file,
     }
 
+    option = validate_option(option, options=list(switcher))
+
     # Get the function from switcher dictionary
     func = switcher.get(option, lambda: "Invalid option")
 
     # Execute the function
     func()
+
+
+def create_command(args):
+    create_initial_funds_database(dry_run=args.dry_run, chunk_size=args.chunk_size)
+
+
+def update_command(args):
+    update_funds_database(
+        concurrency=args.workers,
+        single_fetch=args.single_fetch,
+        use_price_store=args.price_store,
+        use_response_cache=not args.no_cache,
+        limit=args.limit,
+        dry_run=args.dry_run,
+        rate_limit=args.rate_limit,
+        fund_budget=args.fund_budget,
+        deadline=args.deadline,
+        resume=args.resume,
+        chunk_size=args.chunk_size,
+        refresh_sheet=args.refresh,
+    )
+
+
+def search_command(args):
+    if args.file:
+        search_funds_from_file(path=args.file, results=args.results, refresh_sheet=args.refresh)
+    else:
+        search_fund_by_name(fund_name=" ".join(args.name), results=args.results, refresh_sheet=args.refresh)
+
+
+def check_command(args):
+    check_database_integrity(
+        use_response_cache=not args.no_cache,
+        limit=args.limit,
+        dry_run=args.dry_run,
+        rate_limit=args.rate_limit,
+        refresh_sheet=args.refresh,
+        concurrency=args.workers,
+        max_repairs=args.max_repairs,
+    )
+
+
+def sync_prices_command(args):
+    sync_price_store(concurrency=args.workers, backfill=args.backfill, rate_limit=args.rate_limit)
+
+
+def debug_command(args):
+    start_debug_mode()
+
+
+def get_arguments_parser():
+    parser = argparse.ArgumentParser(prog="python -m app.main", description="Dondeinvierto funds database")
+    parser.add_argument("--log-level", help="Level of every module, example: DEBUG")
+    parser.add_argument("--log-levels", type=parse_log_levels, default={},
+                        help="Level of some modules, example: app.sheets=DEBUG,app.models.fetch_engine=WARNING")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_DIR, default=None, metavar="DIR",
+                        help=f"Profile every stage of the run into DIR, {PROFILE_DIR} by default")
+    subparsers = parser.add_subparsers(dest="command")
+
+    create = subparsers.add_parser("create", help="Create the initial funds database")
+    create.add_argument("--dry-run", action="store_true", help="Get the funds without writing the sheet")
+    create.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows appended to the sheet at once")
+    create.set_defaults(func=create_command)
+
+    update = subparsers.add_parser("update", help="Update the funds database")
+    update.add_argument("--workers", type=int, default=DEFAULT_CONCURRENCY, help="Max cafci requests in flight")
+    update.add_argument("--rate-limit", type=float, default=None, help=RATE_LIMIT_HELP)
+    update.add_argument("--fund-budget", type=float, default=DEFAULT_FUND_BUDGET, help="Max seconds per fund")
+    update.add_argument("--deadline", type=float, default=None,
+                        help="Max seconds of the run, unfinished funds keep their values")
+    update.add_argument("--resume", action="store_true", help="Skip the funds already fetched by an unfinished run")
+    update.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows written to the sheet at once")
+    update.add_argument("--limit", type=int, default=None, help="Only update the first funds of the sheet")
+    update.add_argument("--single-fetch", action="store_true", help="One price history request per fund")
+    update.add_argument("--price-store", action="store_true", help="Use the local price store")
+    update.add_argument("--no-cache", action="store_true", help="Ignore the cafci responses cached this week")
+    update.add_argument("--dry-run", action="store_true", help="Calculate the funds without writing the sheet")
+    update.add_argument("--refresh", action="store_true", help=REFRESH_HELP)
+    update.set_defaults(func=update_command)
+
+    search = subparsers.add_parser("search", help="Search a fund by name")
+    search.add_argument("name", nargs="*", help="Name of the fund")
+    search.add_argument("--file", help="File with one name per line")
+    search.add_argument("--results", type=int, default=5, help="Amount of results")
+    search.add_argument("--refresh", action="store_true", help=REFRESH_HELP)
+    search.set_defaults(func=search_command)
+
+    check = subparsers.add_parser("check", help="Check the database integrity")
+    check.add_argument("--workers", type=int, default=DEFAULT_CONCURRENCY, help="Max cafci requests in flight")
+    check.add_argument("--max-repairs", type=int, default=None,
+                       help="Max funds repaired, the rest wait for the next check")
+    check.add_argument("--rate-limit", type=float, default=None, help=RATE_LIMIT_HELP)
+    check.add_argument("--limit", type=int, default=None, help="Only check the first funds of the sheet")
+    check.add_argument("--no-cache", action="store_true", help="Ignore the cafci responses cached this week")
+    check.add_argument("--dry-run", action="store_true", help="Report the funds with errors without repairing")
+    check.add_argument("--refresh", action="store_true", help=REFRESH_HELP)
+    check.set_defaults(func=check_command)
+
+    sync_prices = subparsers.add_parser("sync-prices", help="Sync the local price store")
+    sync_prices.add_argument("--workers", type=int, default=DEFAULT_CONCURRENCY, help="Max cafci requests in flight")
+    sync_prices.add_argument("--rate-limit", type=float, default=None, help=RATE_LIMIT_HELP)
+    sync_prices.add_argument("--backfill", action="store_true", help="Download the whole history of every fund")
+    sync_prices.set_defaults(func=sync_prices_command)
+
+    debug = subparsers.add_parser("debug", help="Start the debug mode")
+    debug.set_defaults(func=debug_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = get_arguments_parser().parse_args(argv)
+    set_log_levels(args.log_level, args.log_levels)
+    if args.profile:
+        get_profiler().enable(args.profile)
+
+    if args.command is None:
+        # Without a command keep the interactive menu
+        interactive_menu()
+        return
+
+    if args.command == "search" and not args.name and not args.file:
+        args.name = [input("Ingrese el nombre del fondo: ")]
+
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1 +1,2 @@
 from .funds import *
+from .records import *
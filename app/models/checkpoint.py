@@ -0,0 +1,107 @@
+import json
+import sqlite3
+import time
+from decimal import Decimal
+from typing import Optional
+
+from ..common.utils import (
+    get_logger,
+    get_last_friday,
+    get_data_path,
+)
+
+
+logger = get_logger(__name__)
+
+
+class UpdateCheckpoint():
+    """Journal of the fund data already fetched by the current update.
+
+    Every fund is saved as soon as its requests finish, so a killed run can
+    be resumed fetching only the missing funds. Entries are anchored on the
+    last friday, like the cafci urls, and the ones of previous weeks are
+    evicted when the checkpoint is opened.
+    """
+    DB_PATH = "checkpoint.sqlite3"
+
+    def __init__(self, path=None):
+        self.path = path or get_data_path(self.DB_PATH)
+        self.anchor = get_last_friday().isoformat()
+        self.resumed = 0
+        self.saved = 0
+
+        self.connection = sqlite3.connect(self.path)
+        # One commit per fund, WAL keeps them cheap without losing the finished funds on a crash
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+        self.evict_expired()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS funds (
+                    fund_cafci_code TEXT NOT NULL,
+                    class_cafci_code TEXT NOT NULL,
+                    anchor TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    saved_at REAL NOT NULL,
+                    PRIMARY KEY (fund_cafci_code, class_cafci_code)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def evict_expired(self):
+        with self.connection:
+            deleted = self.connection.execute("DELETE FROM funds WHERE anchor != ?", (self.anchor, )).rowcount
+
+        if deleted:
+            logger.info("Evicted %s checkpoint funds of previous weeks", deleted)
+
+    def clear(self):
+        """
+        Forget the funds of the current week, used when an update starts from scratch.
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM funds")
+
+    def get(self, class_id: str, fund_id: str):
+        """
+        Get the fund data saved by a previous run of this week.
+        return: fund_data - (first_price, last_price, monthly, six_month, year performance) or None
+        """
+        row = self.connection.execute(
+            "SELECT data FROM funds WHERE fund_cafci_code = ? AND class_cafci_code = ? AND anchor = ?",
+            (fund_id, class_id, self.anchor),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        self.resumed += 1
+        return tuple(Decimal(value) for value in json.loads(row[0]))
+
+    def save(self, class_id: str, fund_id: str, fund_data: Optional[tuple]):
+        """
+        Journal the data of a fund, incomplete data (failed requests) is never saved.
+        """
+        if fund_data is None or None in fund_data:
+            return
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO funds (fund_cafci_code, class_cafci_code, anchor, data, saved_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (fund_id, class_id, self.anchor, json.dumps([str(value) for value in fund_data]), time.time()),
+            )
+        self.saved += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "resumed": self.resumed,
+            "saved": self.saved,
+        }
+
+    def close(self):
+        self.connection.close()
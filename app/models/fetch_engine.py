@@ -0,0 +1,497 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+import aiohttp
+
+from ..common.metrics import (
+    RATIO_BUCKETS,
+    get_metrics,
+)
+from ..common.utils import (
+    SAMPLED,
+    get_logger,
+)
+from .funds import (
+    MAX_RETRIES,
+    PERFORMANCE_RANGES,
+    PRICES_RANGE,
+)
+from .rate_limit import (
+    RETRY_STATUSES,
+    THROTTLED_STATUS,
+    RateLimitError,
+    get_backoff_delay,
+    parse_retry_after,
+)
+from .transport import (
+    ACCEPT_ENCODING,
+    CONNECT_TIMEOUT,
+    READ_TIMEOUT,
+    TransportStats,
+    get_endpoint,
+    record_request,
+    record_retry,
+)
+
+
+logger = get_logger(__name__)
+
+ADMISSION_SECONDS = 2  # Seconds of rate limited requests the admitted items can have waiting for their tokens
+
+
+class AsyncFetchEngine():
+    """Fetch cafci data for many funds from a single process using asyncio.
+
+    Every fund needs one prices request and one request per performance range,
+    all of them are requested together and the amount of requests in flight is
+    limited by `concurrency` and by the requests per second of the parser
+    rate limiter, shared with the sync requests of the process. Funds are
+    admitted a window at a time, only as many as those limits can serve right
+    away, and their budget starts once admitted. With `single_fetch` every
+    fund needs only one price history request and the ranges are calculated
+    locally.
+    """
+
+    def __init__(self, parser, concurrency: int, connections_per_host: Optional[int] = None,
+                 single_fetch: bool = False, item_budget: Optional[float] = None,
+                 deadline: Optional[float] = None):
+        self.parser = parser
+        self.concurrency = concurrency
+        self.single_fetch = single_fetch
+        # Max seconds of every item and time.monotonic() value when the unfinished items are given up
+        self.item_budget = item_budget
+        self.deadline = deadline
+        self.over_budget: list = []
+        self.unfinished: list = []
+        self.failed: list = []  # Items whose coroutine raised, they get None like the ones over the budget
+        self.connections_per_host = connections_per_host or concurrency
+        self.semaphore: asyncio.Semaphore  # Created with every session, inside its event loop
+        self.rate_limiter = parser.rate_limiter
+        self.stats = TransportStats()
+        self.in_flight = 0  # Requests holding a slot of the semaphore
+        self.metrics = get_metrics()
+        self.pool_utilization = self.metrics.histogram(
+            "cafci_pool_utilization", "Fraction of the concurrency slots in use when a request starts",
+            buckets=RATIO_BUCKETS,
+        )
+        self.fund_seconds = self.metrics.histogram(
+            "fund_seconds", "Seconds to get the data of a fund, retries included", ("result", )
+        )
+
+    def get_trace_config(self):
+        """
+        Count the requests made and the connections opened by the session.
+        """
+        async def on_request_start(session: aiohttp.ClientSession, context: SimpleNamespace,
+                                   params: aiohttp.TraceRequestStartParams) -> None:
+            self.stats.requests_count += 1
+
+        async def on_connection_create_end(session: aiohttp.ClientSession, context: SimpleNamespace,
+                                           params: aiohttp.TraceConnectionCreateEndParams) -> None:
+            self.stats.new_connections += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+
+        return trace_config
+
+    async def perform_request(self, session, url):
+        """
+        Async version of FundClassParser.perform_request.
+        Retries wait outside the semaphore, so a backing off task never holds a slot of the other fetches.
+        return: response - Decoded json response or None
+        """
+        endpoint = get_endpoint(url)
+        response = None
+        for i in range(MAX_RETRIES):
+            await self.rate_limiter.acquire_async()
+            status = None
+            try:
+                async with self.semaphore:
+                    self.in_flight += 1
+                    self.pool_utilization.observe(self.in_flight / self.concurrency)
+                    start_time = time.perf_counter()
+                    try:
+                        async with session.get(url) as raw_response:
+                            status = raw_response.status
+                            if raw_response.status in RETRY_STATUSES:
+                                retry_after = parse_retry_after(raw_response.headers.get("Retry-After"))
+                                raise RateLimitError(raw_response.status, retry_after)
+
+                            response = await raw_response.json(content_type=None)
+                    except asyncio.TimeoutError:
+                        # Socket timeouts are also connection errors, count them once
+                        status = "timeout"
+                        raise
+                    except aiohttp.ClientConnectionError:
+                        status = "connection_error"
+                        raise
+                    except asyncio.CancelledError:
+                        # Over the budget or unfinished at the deadline
+                        status = "cancelled"
+                        raise
+                    finally:
+                        self.in_flight -= 1
+                        record_request(endpoint, status or "error", time.perf_counter() - start_time)
+                break
+
+            except RateLimitError as e:
+                wait_time = get_backoff_delay(i, e.retry_after)
+                if e.status == THROTTLED_STATUS:
+                    self.rate_limiter.pause(wait_time)
+
+                self.stats.retries += 1
+                record_retry(endpoint, e.status)
+                logger.warning("%s. Retrying in %.1f seconds.", e, wait_time)
+                await asyncio.sleep(wait_time)
+
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.stats.timeouts += 1
+
+                wait_time = get_backoff_delay(i)
+                self.stats.retries += 1
+                record_retry(endpoint, "timeout" if isinstance(e, asyncio.TimeoutError) else "connection_error")
+                logger.warning("%s: %s. Retrying in %.1f seconds.", type(e).__name__, e, wait_time)
+                await asyncio.sleep(wait_time)
+
+            except Exception as e:
+                logger.error("Error getting response: %s", e)
+                return None
+
+        if response is None:
+            logger.error("Error getting response after %s retries", MAX_RETRIES)
+            return None
+
+        return response
+
+    async def perform_cached_request(self, session, url):
+        """
+        Async version of FundClassParser.perform_cached_request.
+        """
+        response_cache = self.parser.response_cache
+
+        if response_cache is not None:
+            response = response_cache.get(url)
+            if response is not None:
+                return response
+
+        response = await self.perform_request(session, url)
+
+        if response_cache is not None:
+            response_cache.set(url, response)
+
+        return response
+
+    async def get_fund_data(self, session, fund_code: list) -> tuple:
+        """
+        Get the data of a fund, from the checkpoint of a previous run when possible.
+        Every fund is journaled to the checkpoint as soon as it is fetched.
+        return: first_price, last_price, monthly_performance, six_month_performance, year_performance
+        """
+        checkpoint = self.parser.checkpoint
+        if checkpoint is None:
+            return await self.fetch_fund_data(session, fund_code)
+
+        class_id = fund_code[0]
+        fund_id = fund_code[1]
+
+        fund_data = checkpoint.get(class_id, fund_id)
+        if fund_data is not None:
+            return fund_data
+
+        fund_data = await self.fetch_fund_data(session, fund_code)
+        checkpoint.save(class_id, fund_id, fund_data)
+
+        return fund_data
+
+    async def fetch_fund_data(self, session, fund_code: list) -> tuple:
+        """
+        Get the prices and performances of a fund, requesting every range at the same time.
+        return: first_price, last_price, monthly_performance, six_month_performance, year_performance
+        """
+        class_id = fund_code[0]
+        fund_id = fund_code[1]
+
+        logger.info("Getting cafci data from class id %s and fund id %s", class_id, fund_id, extra=SAMPLED)
+
+        # Funds already covered by the local price store don't need any request
+        history = self.parser.get_stored_history(class_id, fund_id)
+        if history is not None:
+            return self.parser.get_fund_data_from_history(history)
+
+        if self.single_fetch:
+            url = self.parser.get_price_history_url(class_id, fund_id)
+            response = await self.perform_cached_request(session, url)
+            history = self.parser.parse_price_history_response(response, class_id, fund_id)
+
+            return self.parser.get_fund_data_from_history(history)
+
+        urls = [self.parser.get_performance_url(class_id, fund_id, PRICES_RANGE)]
+        urls.extend(
+            self.parser.get_performance_url(class_id, fund_id, date_range) for date_range in PERFORMANCE_RANGES
+        )
+        responses = await asyncio.gather(*(self.perform_cached_request(session, url) for url in urls))
+
+        first_price, last_price = self.parser.parse_prices_response(responses[0], class_id, fund_id)
+        performances = [
+            self.parser.parse_performance_response(response, class_id, fund_id) for response in responses[1:]
+        ]
+
+        return (first_price, last_price, *performances)
+
+    async def fetch_price_history(self, session, class_id: str, fund_id: str, start_date, end_date) -> list:
+        """
+        Get the daily prices of a fund class between two dates.
+        """
+        url = self.parser.get_price_history_url_between(class_id, fund_id, start_date, end_date)
+        response = await self.perform_cached_request(session, url)
+
+        return self.parser.parse_price_history_response(response, class_id, fund_id)
+
+    def create_session(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # Keep-alive connections are shared by every task, aiohttp negotiates gzip by default
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.connections_per_host)
+        # Only socket timeouts, waiting for a free connection is bounded by the item budget
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"Accept-Encoding": ACCEPT_ENCODING},
+            trace_configs=[self.get_trace_config()],
+        )
+
+    def get_requests_per_fund(self) -> int:
+        return 1 if self.single_fetch else 1 + len(PERFORMANCE_RANGES)
+
+    def create_admission(self, requests_per_item: int) -> asyncio.Semaphore:
+        """
+        Limit the items fetched at the same time to the ones whose requests can be in flight right away.
+
+        Items waiting for admission are not started, so their budget does not
+        count the time spent behind the rest of the items.
+        param: requests_per_item - Requests made by every item at the same time
+        """
+        window = self.concurrency
+        if self.rate_limiter.rate:
+            window = min(window, self.rate_limiter.rate * ADMISSION_SECONDS)
+
+        return asyncio.Semaphore(max(int(window) // requests_per_item, 1))
+
+    async def run_with_budget(self, coroutine, item, admission: asyncio.Semaphore):
+        """
+        Await the coroutine of an item once admitted, giving it up after item_budget seconds.
+        An error of the item, example: a malformed cafci response, only gives up that item.
+        return: result or None if the item went over the budget or failed
+        """
+        try:
+            async with admission:
+                return await self.run_admitted(coroutine, item)
+        finally:
+            # Items cancelled at the deadline before their admission never started their coroutine
+            coroutine.close()
+
+    async def run_admitted(self, coroutine, item):
+        """
+        Same as run_with_budget, the budget starts now.
+        """
+        start_time = time.perf_counter()
+        try:
+            if self.item_budget is None:
+                result = await coroutine
+            else:
+                result = await asyncio.wait_for(coroutine, timeout=self.item_budget)
+        except asyncio.TimeoutError:
+            logger.warning("Gave up %s after %s seconds", item, self.item_budget)
+            self.over_budget.append(item)
+            self.fund_seconds.observe(time.perf_counter() - start_time, result="over_budget")
+            return None
+        except Exception as e:
+            logger.error("Error getting %s: %s: %s", item, type(e).__name__, e)
+            self.failed.append(item)
+            self.fund_seconds.observe(time.perf_counter() - start_time, result="error")
+            return None
+
+        self.fund_seconds.observe(time.perf_counter() - start_time, result="done")
+        return result
+
+    async def gather(self, coroutine_function, items: list, requests_per_item: int = 1) -> list:
+        """
+        Run coroutine_function(session, *item) for every item, keeping the order of items.
+        Items not finished at the deadline are cancelled and get None, like the ones over the budget.
+        param: requests_per_item - Requests made by every item at the same time
+        """
+        admission = self.create_admission(requests_per_item)
+        async with self.create_session() as session:
+            tasks = [
+                asyncio.ensure_future(self.run_with_budget(coroutine_function(session, *item), item, admission))
+                for item in items
+            ]
+
+            if not tasks:
+                pass
+            elif self.deadline is None:
+                await asyncio.wait(tasks)
+            else:
+                timeout = max(self.deadline - time.monotonic(), 0)
+                _, pending = await asyncio.wait(tasks, timeout=timeout)
+
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            results: list = []
+            for item, task in zip(items, tasks):
+                if task.cancelled():
+                    self.unfinished.append(item)
+                    results.append(None)
+                else:
+                    results.append(task.result())
+
+        if self.unfinished:
+            logger.warning("Deadline reached, %s of %s items unfinished", len(self.unfinished), len(items))
+        if self.over_budget:
+            logger.warning("%s of %s items went over the %ss budget", len(self.over_budget), len(items),
+                           self.item_budget)
+        if self.failed:
+            logger.warning("%s of %s items failed", len(self.failed), len(items))
+
+        logger.info("Cafci transport stats: %s", self.stats)
+        logger.info("Cafci rate limit: %s", self.rate_limiter)
+        self.parser.add_engine_stats(self.stats)
+
+        return results
+
+    def calc_data_by_funds(self, fund_codes: list) -> list:
+        """
+        Calculate the data for every fund, keeping the order of fund_codes.
+        """
+        funds_data = asyncio.run(self.gather(
+            self.get_fund_data, [(fund_code, ) for fund_code in fund_codes], self.get_requests_per_fund()
+        ))
+
+        # Every proyection is calculated in a single vectorized pass
+        return self.parser.build_calc_data_many(funds_data)
+
+    def write_chunk(self, write_chunk, start: int, funds_data: list):
+        """
+        Build the rows of a chunk and hand them to write_chunk, runs on the writer thread.
+        """
+        try:
+            write_chunk(start, self.parser.build_calc_data_many(funds_data))
+        except Exception as e:
+            # A failed write must not stop the pipeline, its funds keep their previous values
+            logger.error("Error writing the funds %s to %s: %s", start, start + len(funds_data), e)
+
+    async def stream(self, fund_codes: list, write_chunk, chunk_size: int, max_pending_chunks: int):
+        """
+        Fetch every fund and hand the rows to write_chunk(start, rows) in order, chunk_size rows at a time.
+
+        Funds complete in any order, a chunk is written as soon as all its funds
+        are finished while the next ones keep being fetched. Only
+        chunk_size * (max_pending_chunks + 1) funds are fetched or waiting to be
+        written at the same time, when the writes lag the fetching waits.
+        """
+        loop = asyncio.get_running_loop()
+        total = len(fund_codes)
+        slots = asyncio.Semaphore(chunk_size * (max_pending_chunks + 1))
+        admission = self.create_admission(self.get_requests_per_fund())
+        chunks: asyncio.Queue = asyncio.Queue()
+        results: dict = {}  # Index of the fund: row
+        tasks = []
+        next_index = 0  # First fund not handed to the writer
+
+        def queue_ready_chunks(final: bool = False):
+            nonlocal next_index
+            while next_index < total:
+                end = min(next_index + chunk_size, total)
+                if not final and not all(index in results for index in range(next_index, end)):
+                    break
+
+                # Funds without result at the end are the unfinished ones, they get None
+                chunks.put_nowait((next_index, [results.pop(index, None) for index in range(next_index, end)]))
+                next_index = end
+
+        async def fetch(session, index, fund_code):
+            try:
+                # Failed funds get None too, their chunk is written and its slots released
+                results[index] = await self.run_with_budget(
+                    self.get_fund_data(session, fund_code), fund_code, admission
+                )
+            finally:
+                queue_ready_chunks()
+
+        async def fetch_all(session):
+            try:
+                for index, fund_code in enumerate(fund_codes):
+                    await slots.acquire()
+                    tasks.append(asyncio.ensure_future(fetch(session, index, fund_code)))
+
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # Cancelled at the deadline or failed, no fetch is left running after the session is closed
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+        async def write_chunks():
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    return
+
+                start, funds_data = chunk
+                await loop.run_in_executor(None, self.write_chunk, write_chunk, start, funds_data)
+                for _ in funds_data:
+                    slots.release()
+
+        writer = asyncio.ensure_future(write_chunks())
+        async with self.create_session() as session:
+            fetcher = asyncio.ensure_future(fetch_all(session))
+            timeout = None if self.deadline is None else max(self.deadline - time.monotonic(), 0)
+            # The writer only stops before the fetcher on an error, the fetcher would wait for its slots forever
+            done, _ = await asyncio.wait([fetcher, writer], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            if fetcher not in done:
+                fetcher.cancel()
+                await asyncio.gather(fetcher, return_exceptions=True)
+                if writer in done:
+                    writer.result()
+
+                self.unfinished = [fund_codes[index] for index in range(next_index, total) if index not in results]
+                logger.warning("Deadline reached, %s of %s funds unfinished", len(self.unfinished), total)
+
+        queue_ready_chunks(final=True)
+        chunks.put_nowait(None)
+        await writer
+        if not fetcher.cancelled():
+            # The finished chunks are written before an error of the fetcher is raised
+            fetcher.result()
+
+        if self.over_budget:
+            logger.warning("%s of %s funds went over the %ss budget", len(self.over_budget), total, self.item_budget)
+        if self.failed:
+            logger.warning("%s of %s funds failed", len(self.failed), total)
+
+        logger.info("Cafci transport stats: %s", self.stats)
+        logger.info("Cafci rate limit: %s", self.rate_limiter)
+        self.parser.add_engine_stats(self.stats)
+
+    def stream_calc_data_by_funds(self, fund_codes: list, write_chunk, chunk_size: int,
+                                  max_pending_chunks: int):
+        """
+        Calculate the data for every fund, writing it while the rest are fetched.
+        """
+        asyncio.run(self.stream(fund_codes, write_chunk, chunk_size, max_pending_chunks))
+
+    def fetch_price_histories(self, items: list) -> list:
+        """
+        Get the price history of every (class_id, fund_id, start_date, end_date) item.
+        """
+        return asyncio.run(self.gather(self.fetch_price_history, items))
@@ -1,19 +1,49 @@
 import math
+from bisect import bisect_right
 import time
 from datetime import timedelta
 import json
-import requests
-from requests.exceptions import ConnectionError
 from decimal import Decimal
-from multiprocessing import (
-    Pool,
+from typing import Optional
+
+from ..common.constants import (
+    DECIMAL_ZERO,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_FUND_BUDGET,
+    MAX_PENDING_CHUNKS,
+)
+from ..common.metrics import (
+    get_metrics,
 )
-
 from ..common.utils import (
+    SAMPLED,
     get_logger,
     get_current_time,
     normalize_decimals,
+    normalize_many,
     get_last_friday,
+    parse_date,
+    proportion_of,
+)
+from .json_stream import (
+    JSONStreamError,
+    iter_array_items,
+)
+from .rate_limit import (
+    RETRY_STATUSES,
+    THROTTLED_STATUS,
+    RateLimitError,
+    get_backoff_delay,
+    get_rate_limiter,
+    parse_retry_after,
+)
+from .transport import (
+    get_endpoint,
+    get_transport,
+    record_request,
+    record_retry,
+    TransportStats,
 )
 
 
@@ -31,6 +61,12 @@ RISK_LEVEL_DICT = {
 }
 
 MAX_RETRIES = 5  # Make this a configurable parameter
+PRICES_RANGE = 7  # Range used to calculate tna, tea and tem
+PERFORMANCE_RANGES = (30, 180, 365)  # monthly, six months and year performance
+# Single fetch mode downloads the longest window once and slices every range from it,
+# plus a week to find the last price before a window starting on non business days
+PRICE_HISTORY_RANGE = max(PRICES_RANGE, *PERFORMANCE_RANGES) + 7
+STREAM_CHUNK_SIZE = 65536  # Bytes read at a time of the streamed funds listing
 
 
 class FundClassParser():
@@ -40,22 +76,44 @@ class FundClassParser():
     """
     SHEET = "funds"
     COLUMN_MAX_RANGE = "A2:N"
+    FIRST_DATA_ROW = 2
+    TABLE_RANGE = "A1:N"  # Includes the header row
     BASE_CAFCI_URL = "https://api.cafci.org.ar"
     FUND_CODES_CELL_RANGE = "D2:E"
     CALC_DATE_RANGE = "H2:N"
     START_COLUMN = "A"
     END_COLUMN = "N"
     TNA_COLUMN = "H"
+    PRICE_HISTORY_PATH = "/fondo/{fund_id}/clase/{class_id}/cuotapartes/{start_date}/{end_date}"
 
     # Create the init
-    def __init__(self,):
-        pass
+    def __init__(self, transport=None, price_store=None, response_cache=None, rate_limiter=None, checkpoint=None):
+        # Every parser of the same process shares the keep-alive connection pool and the rate limit
+        self.transport = transport or get_transport()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        # Optional local PriceStore used before asking cafci
+        self.price_store = price_store
+        # Optional ResponseCache for the urls anchored on the last friday
+        self.response_cache = response_cache
+        # Optional UpdateCheckpoint where every fetched fund is journaled
+        self.checkpoint = checkpoint
+        self.engine_stats = TransportStats()
 
     def perform_request(self, url, method="GET", data=None, headers=None, params=None, json_data=None):
+        from requests.exceptions import (
+            ConnectionError,
+            Timeout,
+        )
+
+        endpoint = get_endpoint(url)
         response = None
         for i in range(MAX_RETRIES):
+            # Every attempt, retries included, takes a token of the shared limiter
+            self.rate_limiter.acquire()
+            start_time = time.perf_counter()
+            status = None
             try:
-                response = requests.request(
+                response = self.transport.request(
                     method=method,
                     url=url,
                     data=data,
@@ -63,26 +121,91 @@ class FundClassParser():
                     params=params,
                     json=json_data,
                 )
+                status = response.status_code
+                if response.status_code in RETRY_STATUSES:
+                    raise RateLimitError(response.status_code, parse_retry_after(response.headers.get("Retry-After")))
+
                 response = response.json()
+                record_request(endpoint, status, time.perf_counter() - start_time)
                 break
 
-            except ConnectionError as e:
-                wait_time = 60 * i
-                logger.warning(f"ConnectionError: {e}. Retrying in {wait_time} seconds.")
+            except RateLimitError as e:
+                record_request(endpoint, status, time.perf_counter() - start_time)
+                response = None
+                wait_time = get_backoff_delay(i, e.retry_after)
+                if e.status == THROTTLED_STATUS:
+                    self.rate_limiter.pause(wait_time)
+
+                self.engine_stats.retries += 1
+                record_retry(endpoint, e.status)
+                logger.warning("%s. Retrying in %.1f seconds.", e, wait_time)
+                time.sleep(wait_time)
+
+            except (ConnectionError, Timeout) as e:
+                # Connect timeouts are also connection errors, count them once
+                status = "connection_error"
+                if isinstance(e, Timeout):
+                    status = "timeout"
+                    self.engine_stats.timeouts += 1
+
+                record_request(endpoint, status, time.perf_counter() - start_time)
+                wait_time = get_backoff_delay(i)
+                self.engine_stats.retries += 1
+                record_retry(endpoint, status)
+                logger.warning("%s: %s. Retrying in %.1f seconds.", type(e).__name__, e, wait_time)
                 time.sleep(wait_time)
 
             except Exception as e:
+                record_request(endpoint, status or "error", time.perf_counter() - start_time)
                 logger.error("Error getting response: %s", e)
                 return None
 
         if response is None:
-            logger.error(f"Error getting response after {MAX_RETRIES} retries")
+            logger.error("Error getting response after %s retries", MAX_RETRIES)
             return None
 
         return response
 
+    def perform_cached_request(self, url):
+        """
+        Perform a GET request answered from the response cache when possible.
+        Only use it for urls anchored on the last friday.
+        """
+        if self.response_cache is not None:
+            response = self.response_cache.get(url)
+            if response is not None:
+                return response
+
+        response = self.perform_request(url=url)
+
+        if self.response_cache is not None:
+            self.response_cache.set(url, response)
+
+        return response
+
+    def get_cache_stats(self):
+        """
+        Get the hits and misses of the response cache used by this parser.
+        """
+        if self.response_cache is None:
+            return None
+
+        return self.response_cache.get_stats()
+
+    def get_transport_stats(self):
+        """
+        Get the connection reuse stats of the transport and async engine used by this parser.
+        """
+        stats = self.transport.get_stats()
+        stats.requests_count += self.engine_stats.requests_count
+        stats.new_connections += self.engine_stats.new_connections
+        stats.retries += self.engine_stats.retries
+        stats.timeouts += self.engine_stats.timeouts
+
+        return stats
+
     def get_cafci_ficha_default(self):
-        response = requests.get(
+        response = self.transport.get(
             "https://api.cafci.org.ar/fondo/1222/clase/3924/ficha",
         )
 
@@ -149,9 +272,25 @@ class FundClassParser():
         # Return the proyection
         return [tem, tna, tea]
 
+    def get_proyections(self, initial_prices: list, final_prices: list, interval=7) -> list:
+        """
+        Calculate the proyection of many funds at once.
+        param: initial_prices: list of Decimal
+        param: final_prices: list of Decimal
+        param: interval: int or list with one interval per fund
+        return: [[tem, tna, tea], ...]: list
+        """
+        from .projections import get_proyections
+
+        # Funds near a cent boundary are calculated again with the Decimal path to get the same result
+        return get_proyections(initial_prices, final_prices, interval, exact_proyection=self.get_proyection)
+
     def get_max_range(self):
         return self.COLUMN_MAX_RANGE
 
+    def get_table_range(self):
+        return self.TABLE_RANGE
+
     def get_sheet(self):
         return self.SHEET
 
@@ -161,6 +300,13 @@ class FundClassParser():
     def get_calc_data_range(self):
         return self.CALC_DATE_RANGE
 
+    def get_calc_data_rows_range(self, start: int, count: int):
+        """
+        Get the CALC_DATE_RANGE cells of count funds, starting from the fund number start (zero based).
+        """
+        first_row = self.FIRST_DATA_ROW + start
+        return f"{self.TNA_COLUMN}{first_row}:{self.END_COLUMN}{first_row + count - 1}"
+
     def get_monthly_performance(self):
         #
         pass
@@ -169,23 +315,101 @@ class FundClassParser():
         return "class_cafci_code"
 
     def validated_cafci_response(self, response):
-        if response.status_code != 200:
-            logger.error("Error getting cafci response: %s", response.text)
-            raise Exception("Error getting cafci response: %s", response.text)
+        # perform_request returns the decoded json, or None when the request failed
+        if not response or response.get("error"):
+            logger.error("Error getting cafci response: %s", response)
+            raise Exception("Error getting cafci response: %s", response)
 
         return True
 
     def get_all_fund_groups(self):
+        return list(self.iter_all_fund_groups())
+
+    def iter_all_fund_groups(self):
+        """
+        Get every fund group of cafci while the listing is downloaded.
+
+        The listing of every fund with its classes is the biggest cafci response,
+        its groups are decoded from the streamed body one at a time instead of
+        loading the whole document. A connection lost halfway requests the
+        listing again and skips the groups already yielded.
+        return: generator of the fund groups
+        """
+        from requests.exceptions import (
+            ChunkedEncodingError,
+            ConnectionError,
+            Timeout,
+        )
+
         cafci_funds_url = self.BASE_CAFCI_URL + "/fondo?estado=1&include=gerente,tipoRenta,clase_fondo&limit=0"
+        endpoint = get_endpoint(cafci_funds_url)
         logger.info("Getting all funds from cafci")
-        response = self.perform_request(url=cafci_funds_url)
 
-        self.validated_cafci_response(response)
+        seen = set()  # Ids of the groups already yielded
+        fields = None  # Top level fields of the listing, None until it is decoded to the end
+        for i in range(MAX_RETRIES):
+            self.rate_limiter.acquire()
+            start_time = time.perf_counter()
+            status = None
+            try:
+                with self.transport.get(cafci_funds_url, stream=True) as response:
+                    status = response.status_code
+                    if response.status_code in RETRY_STATUSES:
+                        raise RateLimitError(
+                            response.status_code, parse_retry_after(response.headers.get("Retry-After"))
+                        )
+
+                    # Timed to the headers, the body is read while the caller consumes the groups
+                    record_request(endpoint, status, time.perf_counter() - start_time)
+                    document_fields: dict = {}  # Top level fields of the document, example: error
+                    chunks = response.iter_content(STREAM_CHUNK_SIZE)
+                    for fund_group in iter_array_items(chunks, "data", document_fields):
+                        fund_id = fund_group.get("id")
+                        if fund_id in seen:
+                            continue
+
+                        seen.add(fund_id)
+                        yield fund_group
+
+                    fields = document_fields
+                break
 
-        parsed_response = response.get("data")
-        logger.info("Got %s funds from cafci", len(parsed_response))
+            except RateLimitError as e:
+                record_request(endpoint, status, time.perf_counter() - start_time)
+                wait_time = get_backoff_delay(i, e.retry_after)
+                if e.status == THROTTLED_STATUS:
+                    self.rate_limiter.pause(wait_time)
+
+                self.engine_stats.retries += 1
+                record_retry(endpoint, e.status)
+                logger.warning("%s. Retrying in %.1f seconds.", e, wait_time)
+                time.sleep(wait_time)
 
-        return parsed_response
+            except (ConnectionError, Timeout, ChunkedEncodingError) as e:
+                reason = "connection_error"
+                if isinstance(e, Timeout):
+                    reason = "timeout"
+                    self.engine_stats.timeouts += 1
+
+                # A connection lost while reading the body was already counted with its status
+                if status is None:
+                    record_request(endpoint, reason, time.perf_counter() - start_time)
+                wait_time = get_backoff_delay(i)
+                self.engine_stats.retries += 1
+                record_retry(endpoint, reason)
+                logger.warning("%s: %s. Retrying in %.1f seconds, %s funds already got.",
+                               type(e).__name__, e, wait_time, len(seen))
+                time.sleep(wait_time)
+
+            except JSONStreamError as e:
+                logger.error("Error decoding the cafci funds: %s", e)
+                break
+
+        # Raises when the listing failed or cafci answered an error, the data array is not in the fields
+        if fields is None or fields.get("error"):
+            self.validated_cafci_response(fields)
+
+        logger.info("Got %s funds from cafci", len(seen))
 
     def get_fund_classes_by_fund_group(self, fund_group_data: dict):
         fund_classes = []
@@ -220,52 +444,57 @@ class FundClassParser():
             if class_name_formated != "A":
                 continue
 
-            logger.info(f'Creando data de fondo/codigo: {class_id}/{name}')
+            logger.info('Creando data de fondo/codigo: %s/%s', class_id, name, extra=SAMPLED)
 
-            # Crear data de fondo ejemplo: [class_name, fund_name, trading_currency, class_cafci_code, fund_cafci_code, rescue_time, risk_level, tna, tea, tem, monthly_performance, year_performance, updated, logo_url]
+            # Crear data de fondo ejemplo: [class_name, fund_name, trading_currency, class_cafci_code,
+            # fund_cafci_code, rescue_time, risk_level, tna, tea, tem, monthly_performance,
+            # six_month_performance, year_performance, updated, logo_url]
             fund_class_data = [class_name_formated, name, trading_currency, class_id,
-                               fund_id, rescue_time, risk_level, None, None, None, None, None, updated, None]
+                               fund_id, rescue_time, risk_level, None, None, None, None, None, None, updated, None]
 
             fund_classes.append(fund_class_data)
 
         return fund_classes
 
     def get_all_funds(self):
-        response = self.get_all_fund_groups()
-        all_fund_classes = []
-
-        for fund_group in response:
-            fund_classes = self.get_fund_classes_by_fund_group(fund_group)
-            all_fund_classes.extend(fund_classes)
+        return list(self.iter_all_funds())
 
-        return all_fund_classes
+    def iter_all_funds(self):
+        """
+        Get the sheet rows of every fund class of cafci, yielded while the listing is decoded.
+        return: generator of the fund class rows
+        """
+        for fund_group in self.iter_all_fund_groups():
+            yield from self.get_fund_classes_by_fund_group(fund_group)
 
-    def get_prices_by_range(self, class_id: str, fund_id: str, date_range: int) -> list:
+    def get_performance_url(self, class_id: str, fund_id: str, date_range: int) -> str:
         """
-        Get the first and last price of the last seven days.
+        Build the cafci rendimiento url for the given range, anchored on the last friday.
         param: class_id - Fund class id
         param: fund_id - Fund id
         param: date_range - Date range in days
-        return: first_price, last_price - Prices in pesos
+        return: url - Cafci rendimiento url
         """
-        cafci_performance_url = f"{self.BASE_CAFCI_URL}/fondo/{fund_id}/clase/{class_id}/rendimiento/"
-
         today = get_last_friday()
         start_date = today - timedelta(days=date_range)
 
+        cafci_performance_url = f"{self.BASE_CAFCI_URL}/fondo/{fund_id}/clase/{class_id}/rendimiento/"
         params = f"{start_date.strftime('%Y-%m-%d')}/{today.strftime('%Y-%m-%d')}"
-        cafci_performance_url = cafci_performance_url + params
 
-        logger.info("Getting cafci performance from %s", cafci_performance_url)
-        response = self.perform_request(url=cafci_performance_url)
+        return cafci_performance_url + params
 
+    def parse_prices_response(self, response, class_id: str, fund_id: str):
+        """
+        Get the first and last price from a cafci rendimiento response.
+        return: first_price, last_price - Prices in pesos
+        """
         if not response:
-            logger.error(f"Error getting cafci performance after {MAX_RETRIES} retries")
+            logger.error("Error getting cafci performance after %s retries", MAX_RETRIES)
             return None, None
 
         has_errors = response.get('error')  # Possible errors are 'wrong-dates' and 'inexistence'
         if has_errors:
-            logger.warning(f"Wrong dates for {fund_id}/{class_id} in cafci")
+            logger.warning("Wrong dates for %s/%s in cafci", fund_id, class_id)
             return 0, 0
 
         returned_elems = response.get('data')
@@ -276,42 +505,395 @@ class FundClassParser():
 
         return first_price, last_price
 
-    def get_performance_by_range(self, class_id: str, fund_id: str, date_range: int) -> Decimal:
+    def parse_performance_response(self, response, class_id: str, fund_id: str):
+        """
+        Get the performance from a cafci rendimiento response.
+        return: performance - Performance in percentage
+        """
+        if not response:
+            logger.error("Error getting cafci performance after %s retries", MAX_RETRIES)
+            return None
+
+        has_errors = response.get('error')
+
+        if has_errors:
+            logger.debug("%s for %s/%s in cafci", has_errors, class_id, fund_id)
+            return 0
+
+        returned_elems = response.get('data')
+
+        # Normalize the shares to avoid problems with the decimal field
+        performance = normalize_decimals(returned_elems.get('rendimiento'), 2)
+
+        return performance
+
+    def get_prices_by_range(self, class_id: str, fund_id: str, date_range: int) -> list:
+        """
+        Get the first and last price of the last seven days.
+        param: class_id - Fund class id
+        param: fund_id - Fund id
+        param: date_range - Date range in days
+        return: first_price, last_price - Prices in pesos
+        """
+        history = self.get_stored_history(class_id, fund_id, date_range)
+        if history is not None:
+            return self.get_prices_from_history(history, date_range)
+
+        cafci_performance_url = self.get_performance_url(class_id, fund_id, date_range)
+
+        logger.info("Getting cafci performance from %s", cafci_performance_url, extra=SAMPLED)
+        response = self.perform_cached_request(cafci_performance_url)
+
+        return self.parse_prices_response(response, class_id, fund_id)
+
+    def get_performance_by_range(self, class_id: str, fund_id: str, date_range: int) -> Optional[Decimal]:
         """
         Get the last monthly performance.
         param: class_id - Fund class id
         param: fund_id - Fund id
         param: date_range - Date range in days
-        return: performance - Performance in percentage
+        return: performance - Performance in percentage, None if the request failed
         """
+        history = self.get_stored_history(class_id, fund_id, date_range)
+        if history is not None:
+            return self.get_performance_from_history(history, date_range)
 
+        cafci_performance_url = self.get_performance_url(class_id, fund_id, date_range)
+        logger.info("Getting cafci performance from %s", cafci_performance_url, extra=SAMPLED)
+
+        response = self.perform_cached_request(cafci_performance_url)
+
+        return self.parse_performance_response(response, class_id, fund_id)
+
+    def get_price_history_url(self, class_id: str, fund_id: str, date_range: int = PRICE_HISTORY_RANGE) -> str:
+        """
+        Build the cafci daily cuotaparte url for the given range, anchored on the last friday.
+        """
         today = get_last_friday()
         start_date = today - timedelta(days=date_range)
-        end_date = today
 
-        cafci_performance_url = f"{self.BASE_CAFCI_URL}/fondo/{fund_id}/clase/{class_id}/rendimiento/"
-        params = f"{start_date.strftime('%Y-%m-%d')}/{end_date.strftime('%Y-%m-%d')}"
-        cafci_performance_url = cafci_performance_url + params
-        logger.info("Getting cafci performance from %s", cafci_performance_url)
+        return self.get_price_history_url_between(class_id, fund_id, start_date, today)
 
-        response = self.perform_request(url=cafci_performance_url)
+    def get_price_history_url_between(self, class_id: str, fund_id: str, start_date, end_date) -> str:
+        """
+        Build the cafci daily cuotaparte url between two dates.
+        """
+        price_history_path = self.PRICE_HISTORY_PATH.format(
+            fund_id=fund_id,
+            class_id=class_id,
+            start_date=start_date.strftime('%Y-%m-%d'),
+            end_date=end_date.strftime('%Y-%m-%d'),
+        )
+
+        return self.BASE_CAFCI_URL + price_history_path
 
+    def parse_price_history_response(self, response, class_id: str, fund_id: str) -> Optional[list]:
+        """
+        Get the daily prices from a cafci cuotaparte response.
+        return: history - List of (date, price) sorted by date, prices in pesos, None if the request failed
+        """
         if not response:
-            logger.error(f"Error getting cafci performance after {MAX_RETRIES} retries")
+            logger.error("Error getting cafci price history after %s retries", MAX_RETRIES)
             return None
 
         has_errors = response.get('error')
-
         if has_errors:
-            logger.debug(f"{has_errors} for {class_id}/{fund_id} in cafci")
-            return 0
+            logger.warning("%s for %s/%s price history in cafci", has_errors, fund_id, class_id)
+            return []
 
-        returned_elems = response.get('data')
+        elems = response.get('data') or []
+        # Same normalization as get_prices_by_range, cafci informs the value of 1000 shares
+        values = normalize_many([elem.get('valor') for elem in elems])
 
-        # Normalize the shares to avoid problems with the decimal field
-        performance = normalize_decimals(returned_elems.get('rendimiento'), 2)
+        history = [
+            (parse_date(elem.get('fecha')[:10]), value / 1000)
+            for elem, value in zip(elems, values)
+        ]
 
-        return performance
+        history.sort(key=lambda day_price: day_price[0])
+        return history
+
+    def get_price_history(self, class_id: str, fund_id: str, date_range: int = PRICE_HISTORY_RANGE) -> Optional[list]:
+        """
+        Get the daily prices of a fund class.
+        param: class_id - Fund class id
+        param: fund_id - Fund id
+        param: date_range - Date range in days
+        return: history - List of (date, price) sorted by date, prices in pesos, None if the request failed
+        """
+        price_history_url = self.get_price_history_url(class_id, fund_id, date_range)
+        logger.info("Getting cafci price history from %s", price_history_url, extra=SAMPLED)
+
+        response = self.perform_cached_request(price_history_url)
+
+        return self.parse_price_history_response(response, class_id, fund_id)
+
+    def get_stored_history(self, class_id: str, fund_id: str, date_range: int = PRICE_HISTORY_RANGE):
+        """
+        Get the price history from the local price store.
+        return: history - List of (date, price) or None if the store does not cover the range
+        """
+        if self.price_store is None:
+            return None
+
+        today = get_last_friday()
+        # Look a week back to find the price of a window starting on a non business day,
+        # PRICE_HISTORY_RANGE already has that week and is all the store is synced for
+        start_date = today - timedelta(days=min(date_range + 7, PRICE_HISTORY_RANGE))
+
+        if not self.price_store.is_covered(fund_id, class_id, start_date, today):
+            return None
+
+        return self.price_store.get_history(fund_id, class_id, start_date, today)
+
+    def sync_price_store(self, fund_codes: list, concurrency: int = DEFAULT_CONCURRENCY, backfill: bool = False):
+        """
+        Download the missing daily prices of every fund into the price store.
+        param: fund_codes - List of [class_id, fund_id]
+        param: concurrency - Max amount of cafci requests in flight
+        param: backfill - Download the whole PRICE_HISTORY_RANGE even for funds already synced
+        return: synced - Amount of funds synced
+        """
+        from .fetch_engine import AsyncFetchEngine
+
+        today = get_last_friday()
+        backfill_start = today - timedelta(days=PRICE_HISTORY_RANGE)
+        coverages = self.price_store.get_all_coverages()
+
+        pending = []
+        for class_id, fund_id in fund_codes:
+            start_date = backfill_start
+            _, covered_end = coverages.get((fund_id, class_id), (None, None))
+
+            if not backfill and covered_end is not None:
+                # Delta sync, only the days after the last stored one
+                start_date = covered_end + timedelta(days=1)
+
+            if start_date > today:
+                continue
+
+            pending.append((class_id, fund_id, start_date, today))
+
+        logger.info("Syncing %s of %s funds into the price store", len(pending), len(fund_codes))
+        engine = AsyncFetchEngine(parser=self, concurrency=concurrency)
+        histories = engine.fetch_price_histories(pending)
+
+        synced = 0
+        for (class_id, fund_id, start_date, end_date), history in zip(pending, histories):
+            if history is None:
+                # Network error, keep the previous coverage and retry on the next sync
+                continue
+
+            self.price_store.save_history(fund_id, class_id, history, start_date, end_date)
+            synced += 1
+
+        return synced
+
+    def get_price_at(self, history: list, day):
+        """
+        Get the last known price at or before the given day, like cafci does for non business days.
+        """
+        dates = [history_day for history_day, _ in history]
+        index = bisect_right(dates, day)
+
+        if index == 0:
+            return None
+
+        return history[index - 1][1]
+
+    def get_prices_from_history(self, history: list, date_range: int):
+        """
+        Local version of get_prices_by_range using a price history.
+        return: first_price, last_price - Prices in pesos
+        """
+        if history is None:
+            return None, None
+
+        today = get_last_friday()
+        first_price = self.get_price_at(history, today - timedelta(days=date_range))
+        last_price = self.get_price_at(history, today)
+
+        if first_price is None or last_price is None:
+            # Same answer as the 'wrong-dates' error of the rendimiento endpoint
+            return 0, 0
+
+        return first_price, last_price
+
+    def get_performance_from_history(self, history: list, date_range: int) -> Optional[Decimal]:
+        """
+        Local version of get_performance_by_range using a price history.
+
+        Cafci rounds the rendimiento on its side and we truncate it to 2 decimals,
+        so both values can differ by up to 0.01 percentage points.
+        """
+        if history is None:
+            return None
+
+        first_price, last_price = self.get_prices_from_history(history, date_range)
+        if first_price == 0 or last_price == 0:
+            return DECIMAL_ZERO
+
+        return proportion_of(last_price, first_price)
+
+    def build_calc_data_from_history(self, history: list) -> list:
+        """
+        Build the CALC_DATE_RANGE row of a fund from a single price history.
+
+        tna, tea and tem are the same as the ones of build_calc_data when the edge prices
+        match, performances follow get_performance_from_history tolerance.
+        """
+        return self.build_calc_data(*self.get_fund_data_from_history(history))
+
+    def get_fund_data_from_history(self, history: list) -> tuple:
+        """
+        Get the prices and performances of a fund from a single price history.
+        return: first_price, last_price, monthly_performance, six_month_performance, year_performance
+        """
+        first_price, last_price = self.get_prices_from_history(history, PRICES_RANGE)
+        performances = [
+            self.get_performance_from_history(history, date_range) for date_range in PERFORMANCE_RANGES
+        ]
+
+        return (first_price, last_price, *performances)
+
+    def build_calc_data(self, first_price, last_price, monthly_performance, six_month_performance,
+                        year_performance) -> list:
+        """
+        Build the row written on the CALC_DATE_RANGE columns of the sheet.
+        return: [tna, tea, tem, monthly_performance, six_month_performance, year_performance, updated]
+        """
+        now = get_current_time().strftime("%d-%m-%Y")
+
+        if first_price == 0 or last_price == 0:
+            tem = 0
+            tna = 0
+            tea = 0
+        else:
+            tem, tna, tea = self.get_proyection(
+                initial_price=Decimal(str(first_price)),
+                final_price=Decimal(str(last_price))
+            )
+
+        return [
+            str(tna),
+            str(tea),
+            str(tem),
+            str(monthly_performance),
+            str(six_month_performance),
+            str(year_performance),
+            now
+        ]
+
+    def build_calc_data_many(self, funds_data: list) -> list:
+        """
+        Build the CALC_DATE_RANGE rows of many funds, calculating every proyection in one pass.
+        param: funds_data - List of (first_price, last_price, monthly_performance, six_month_performance,
+            year_performance), None for the funds that were not fetched
+        return: rows - One row per fund, same layout as build_calc_data, None for the funds not fetched or
+            without prices
+        """
+        with get_metrics().stage("compute"):
+            rows = self.calc_rows(funds_data)
+
+        built_rows = get_metrics().counter("calc_data_rows_total", "Rows built from the fetched fund data")
+        built_rows.inc(len(rows) - rows.count(None))
+
+        return rows
+
+    def calc_rows(self, funds_data: list) -> list:
+        """
+        Same as build_calc_data_many, without recording the metrics.
+        """
+        now = get_current_time().strftime("%d-%m-%Y")
+
+        # Every price request of these funds failed, their rows are not built and the sheet keeps its values
+        funds_data = [
+            None if fund_data is None or fund_data[0] is None or fund_data[1] is None else fund_data
+            for fund_data in funds_data
+        ]
+
+        # Funds without prices have a zero proyection, the rest are calculated together
+        to_calculate = [
+            index for index, fund_data in enumerate(funds_data)
+            if fund_data is not None and not (fund_data[0] == 0 or fund_data[1] == 0)
+        ]
+        proyections = dict(zip(to_calculate, self.get_proyections(
+            [funds_data[index][0] for index in to_calculate],
+            [funds_data[index][1] for index in to_calculate],
+        )))
+
+        rows: list = []
+        for index, fund_data in enumerate(funds_data):
+            if fund_data is None:
+                rows.append(None)
+                continue
+
+            _, _, monthly_performance, six_month_performance, year_performance = fund_data
+            tem, tna, tea = proyections.get(index, (0, 0, 0))
+            rows.append([
+                str(tna),
+                str(tea),
+                str(tem),
+                str(monthly_performance),
+                str(six_month_performance),
+                str(year_performance),
+                now
+            ])
+
+        return rows
+
+    def calc_data_by_funds(self, fund_codes: list, concurrency: int = DEFAULT_CONCURRENCY,
+                           single_fetch: bool = False, fund_budget: float = DEFAULT_FUND_BUDGET,
+                           deadline: Optional[float] = None) -> list:
+        """
+        Calculate the CALC_DATE_RANGE rows for every fund concurrently.
+        param: fund_codes - List of [class_id, fund_id]
+        param: concurrency - Max amount of cafci requests in flight
+        param: single_fetch - Download one price history per fund instead of one request per range
+        param: fund_budget - Max seconds to get the data of a fund
+        param: deadline - time.monotonic() value when the unfinished funds are given up
+        return: rows - One row per fund, in the same order as fund_codes, None for the funds not finished
+        """
+        from .fetch_engine import AsyncFetchEngine
+
+        engine = AsyncFetchEngine(
+            parser=self,
+            concurrency=concurrency,
+            single_fetch=single_fetch,
+            item_budget=fund_budget,
+            deadline=deadline,
+        )
+        return engine.calc_data_by_funds(fund_codes)
+
+    def stream_calc_data_by_funds(self, fund_codes: list, write_chunk, concurrency: int = DEFAULT_CONCURRENCY,
+                                  single_fetch: bool = False, fund_budget: float = DEFAULT_FUND_BUDGET,
+                                  deadline: Optional[float] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                                  max_pending_chunks: int = MAX_PENDING_CHUNKS):
+        """
+        Calculate the CALC_DATE_RANGE rows for every fund concurrently, writing them in chunks while fetching.
+        param: fund_codes - List of [class_id, fund_id]
+        param: write_chunk - Called with (start, rows) in the order of fund_codes, rows are None for the funds
+            not finished
+        param: chunk_size - Max amount of rows of every chunk
+        param: max_pending_chunks - Chunks fetched ahead of the writes before the fetching waits
+        The rest of the params are the same as calc_data_by_funds.
+        """
+        from .fetch_engine import AsyncFetchEngine
+
+        engine = AsyncFetchEngine(
+            parser=self,
+            concurrency=concurrency,
+            single_fetch=single_fetch,
+            item_budget=fund_budget,
+            deadline=deadline,
+        )
+        engine.stream_calc_data_by_funds(fund_codes, write_chunk, chunk_size, max_pending_chunks)
+
+    def add_engine_stats(self, stats):
+        self.engine_stats.requests_count += stats.requests_count
+        self.engine_stats.new_connections += stats.new_connections
+        self.engine_stats.retries += stats.retries
+        self.engine_stats.timeouts += stats.timeouts
 
     def get_fund_class_by_class_and_fund(self, class_id, fund_id):
         """
@@ -347,6 +929,7 @@ class FundClassParser():
             tea,
             tem,
             monthly_performance,
+            six_month_performance,
             year_performance,
             updated,
             logo_url
@@ -394,6 +977,7 @@ class FundClassParser():
             None,
             None,
             None,
+            None,
             updated,
             None
         ]
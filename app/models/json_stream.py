@@ -0,0 +1,118 @@
+import codecs
+import json
+from typing import Optional
+
+
+WHITESPACE = " \t\n\r"
+NUMBER_CHARACTERS = "0123456789+-.eE"
+
+
+class JSONStreamError(ValueError):
+    """The streamed document is not the json object expected."""
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def iter_array_items(chunks, key: str, fields: Optional[dict] = None):
+    """
+    Decode the items of the `key` array of a json object while its chunks arrive.
+
+    Only the item being decoded and the current chunk are kept in memory, not
+    the whole document, example: iter_array_items(response.iter_content(65536), "data").
+    param: chunks - Iterable of str or utf-8 bytes with the parts of the document, in order
+    param: key - Top level key of the array
+    param: fields - Dict filled with the rest of the top level fields, example: error
+    return: generator of the decoded items
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+
+    def fill() -> bool:
+        """
+        Add the next chunk to the buffer, dropping the text already decoded.
+        return: False at the end of the document
+        """
+        nonlocal buffer, position
+        for chunk in chunks:
+            if isinstance(chunk, bytes):
+                chunk = utf8_decoder.decode(chunk)
+            if chunk:
+                buffer = buffer[position:] + chunk
+                position = 0
+                return True
+
+        return False
+
+    def peek() -> str:
+        """
+        Skip the whitespace and get the next character, empty at the end of the document.
+        """
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in WHITESPACE:
+                position += 1
+
+            if position < len(buffer) or not fill():
+                return buffer[position:position + 1]
+
+    def expect(character: str):
+        nonlocal position
+        if peek() != character:
+            raise JSONStreamError(f"Expected {character!r}, got {buffer[position:position + 20]!r}")
+
+        position += 1
+
+    def decode_value():
+        nonlocal position
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                # The value continues in the next chunk
+                if fill():
+                    continue
+                raise JSONStreamError(f"Truncated json document: {e}") from e
+
+            # Numbers don't have a closing character, "12" or "-0." may continue in the next chunk
+            if is_number(value) and not buffer[end:].strip(NUMBER_CHARACTERS) and fill():
+                continue
+
+            position = end
+            return value
+
+    expect("{")
+    if peek() == "}":
+        return
+
+    while True:
+        name = decode_value()
+        expect(":")
+
+        if name == key and peek() == "[":
+            position += 1
+            if peek() == "]":
+                position += 1
+            else:
+                while True:
+                    yield decode_value()
+                    if peek() != ",":
+                        break
+                    position += 1
+
+                expect("]")
+        else:
+            value = decode_value()
+            if fields is not None:
+                fields[name] = value
+
+        if peek() != ",":
+            break
+        position += 1
+
+    expect("}")
@@ -0,0 +1,132 @@
+import sqlite3
+from datetime import (
+    date,
+    timedelta,
+)
+from decimal import Decimal
+
+from ..common.utils import (
+    get_logger,
+    get_data_path,
+)
+
+
+logger = get_logger(__name__)
+
+
+class PriceStore():
+    """Local store of the daily prices of every fund class.
+
+    Prices are keyed by (fund_cafci_code, class_cafci_code, date). The
+    coverage table keeps the contiguous range of days already synced for each
+    class, non business days have no price but are still covered.
+    """
+    DB_PATH = "prices.sqlite3"
+
+    def __init__(self, path=None):
+        self.path = path or get_data_path(self.DB_PATH)
+        self.connection = sqlite3.connect(self.path)
+        self.create_tables()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS prices (
+                    fund_cafci_code TEXT NOT NULL,
+                    class_cafci_code TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    price TEXT NOT NULL,
+                    PRIMARY KEY (fund_cafci_code, class_cafci_code, date)
+                ) WITHOUT ROWID
+                """
+            )
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS coverage (
+                    fund_cafci_code TEXT NOT NULL,
+                    class_cafci_code TEXT NOT NULL,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL,
+                    PRIMARY KEY (fund_cafci_code, class_cafci_code)
+                ) WITHOUT ROWID
+                """
+            )
+
+    def get_coverage(self, fund_id: str, class_id: str):
+        """
+        Get the range of days synced for a fund class.
+        return: start_date, end_date - None, None if never synced
+        """
+        row = self.connection.execute(
+            "SELECT start_date, end_date FROM coverage WHERE fund_cafci_code = ? AND class_cafci_code = ?",
+            (fund_id, class_id),
+        ).fetchone()
+
+        if row is None:
+            return None, None
+
+        return date.fromisoformat(row[0]), date.fromisoformat(row[1])
+
+    def get_all_coverages(self) -> dict:
+        """
+        Get the synced range of every fund class.
+        return: {(fund_id, class_id): (start_date, end_date)}
+        """
+        rows = self.connection.execute("SELECT fund_cafci_code, class_cafci_code, start_date, end_date FROM coverage")
+
+        return {
+            (fund_id, class_id): (date.fromisoformat(start_date), date.fromisoformat(end_date))
+            for fund_id, class_id, start_date, end_date in rows
+        }
+
+    def is_covered(self, fund_id: str, class_id: str, start_date: date, end_date: date) -> bool:
+        covered_start, covered_end = self.get_coverage(fund_id, class_id)
+
+        if covered_start is None:
+            return False
+
+        return covered_start <= start_date and end_date <= covered_end
+
+    def save_history(self, fund_id: str, class_id: str, history: list, start_date: date, end_date: date):
+        """
+        Save the prices of a synced range and extend the coverage of the fund class.
+        param: history - List of (date, price)
+        param: start_date, end_date - Range requested to cafci, covered even if there are no prices
+        """
+        covered_start, covered_end = self.get_coverage(fund_id, class_id)
+
+        if covered_start is not None and start_date <= covered_end + timedelta(days=1) \
+                and covered_start <= end_date + timedelta(days=1):
+            # The ranges overlap or are contiguous, keep a single coverage range
+            start_date = min(start_date, covered_start)
+            end_date = max(end_date, covered_end)
+        elif covered_start is not None:
+            logger.warning("Dropping previous coverage of %s/%s, there is a gap with the new range", fund_id, class_id)
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO prices (fund_cafci_code, class_cafci_code, date, price) VALUES (?, ?, ?, ?)",
+                [(fund_id, class_id, day.isoformat(), str(price)) for day, price in history],
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO coverage (fund_cafci_code, class_cafci_code, start_date, end_date) "
+                "VALUES (?, ?, ?, ?)",
+                (fund_id, class_id, start_date.isoformat(), end_date.isoformat()),
+            )
+
+    def get_history(self, fund_id: str, class_id: str, start_date: date, end_date: date) -> list:
+        """
+        Get the stored prices of a fund class between two dates.
+        return: history - List of (date, price) sorted by date
+        """
+        rows = self.connection.execute(
+            "SELECT date, price FROM prices WHERE fund_cafci_code = ? AND class_cafci_code = ? "
+            "AND date BETWEEN ? AND ? ORDER BY date",
+            (fund_id, class_id, start_date.isoformat(), end_date.isoformat()),
+        )
+
+        return [(date.fromisoformat(day), Decimal(price)) for day, price in rows]
+
+    def close(self):
+        self.connection.close()
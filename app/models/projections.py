@@ -0,0 +1,87 @@
+from decimal import Decimal
+
+import numpy as np
+
+
+DECIMAL_PLACES = 2
+# Float results closer than this (relative) to a cent boundary could be truncated to a different
+# cent than the Decimal calculation, those funds are calculated again with the exact function.
+BOUNDARY_EPSILON = 1e-9
+
+
+def to_float_array(values, size):
+    """
+    Transforms a value or a list of values into a float array, None values are NaN.
+    """
+    if not isinstance(values, (list, tuple, np.ndarray)):
+        values = [values] * size
+
+    return np.array([np.nan if value is None else float(value) for value in values], dtype=np.float64)
+
+
+def near_boundary(values: np.ndarray) -> np.ndarray:
+    """
+    Get which values are too close to a cent boundary to be truncated from a float.
+    """
+    scaled = values * 10 ** DECIMAL_PLACES
+    distance = np.abs(scaled - np.round(scaled))
+
+    return distance <= BOUNDARY_EPSILON * np.maximum(np.abs(scaled), 1)
+
+
+def quantize_down(values: np.ndarray) -> list:
+    """
+    Vectorized version of normalize_decimals(value, 2) with ROUND_DOWN.
+    return: list of Decimal, None for the values that could not be calculated
+    """
+    cents = np.trunc(values * 10 ** DECIMAL_PLACES)
+    negatives = np.signbit(values)
+    valid = np.isfinite(cents)
+
+    result: list = []
+    for cent, negative, is_valid in zip(cents.tolist(), negatives.tolist(), valid.tolist()):
+        if not is_valid:
+            result.append(None)
+            continue
+
+        value = Decimal(int(cent)).scaleb(-DECIMAL_PLACES)
+        # ROUND_DOWN keeps the sign of small negative values, example: -0.001 -> -0.00
+        result.append(value.copy_negate() if negative and value == 0 else value)
+
+    return result
+
+
+def get_proyections(initial_prices, final_prices, intervals=7, exact_proyection=None) -> list:
+    """
+    Calculate tem, tna and tea of many funds in a single vectorized pass.
+    param: initial_prices - List of Decimal
+    param: final_prices - List of Decimal
+    param: intervals - Interval in days, a single value or one per fund
+    param: exact_proyection - Function(initial_price, final_price, interval) used for the funds near a
+        cent boundary, like FundClassParser.get_proyection. Without it those funds may differ by 0.01
+    return: [[tem, tna, tea], ...] with the same values as FundClassParser.get_proyection
+    """
+    size = len(initial_prices)
+    initial = to_float_array(initial_prices, size)
+    final = to_float_array(final_prices, size)
+    interval = to_float_array(intervals, size)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = final / initial
+        tem = (ratio ** (30 / interval) - 1) * 100
+        tna = (ratio - 1) * 100 * (365 / interval)
+        tea = (ratio ** (365 / interval) - 1) * 100
+
+    proyections = [list(proyection) for proyection in zip(quantize_down(tem), quantize_down(tna), quantize_down(tea))]
+
+    if exact_proyection is not None:
+        ambiguous = near_boundary(tem) | near_boundary(tna) | near_boundary(tea)
+        for index in np.flatnonzero(ambiguous).tolist():
+            interval_value = intervals[index] if isinstance(intervals, (list, tuple, np.ndarray)) else intervals
+            proyections[index] = exact_proyection(
+                Decimal(str(initial_prices[index])),
+                Decimal(str(final_prices[index])),
+                interval_value,
+            )
+
+    return proyections
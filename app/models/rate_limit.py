@@ -0,0 +1,159 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from ..common.utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+DEFAULT_RATE_LIMIT = 50  # Max cafci requests per second, 0 disables the limit
+BACKOFF_BASE = 1  # Seconds of the first retry window
+BACKOFF_CAP = 60  # Max seconds between retries
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+THROTTLED_STATUS = 429
+
+_rate_limiters: dict = {}  # pid: RateLimiter
+
+
+class RateLimitError(Exception):
+    """Cafci answered with a status that should be retried."""
+
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"Cafci answered {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """
+    Parse a Retry-After header, either seconds or an http date.
+    return: seconds - Seconds to wait or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        retry_date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_date.timestamp() - time.time(), 0)
+
+
+def get_backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Exponential backoff with full jitter, so the retries of many workers don't line up.
+    param: attempt - Number of the failed attempt, starting at 0
+    param: retry_after - Seconds asked by the server, used as the minimum delay
+    return: delay - Seconds to wait before the next attempt
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+
+    return delay
+
+
+class RateLimiter():
+    """Token bucket shared by every request made to cafci from the current process.
+
+    Sync requests and async tasks take a token before every attempt, so the
+    whole process never goes over `rate` requests per second. A throttled
+    answer pauses the bucket, every worker waits for the Retry-After instead
+    of only the one that got it.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE_LIMIT, burst: Optional[int] = None):
+        self.lock = threading.Lock()
+        self.tokens: float = 0
+        self.updated = time.monotonic()
+        self.set_rate(rate, burst)
+        self.tokens = self.capacity
+        self.waited_time: float = 0
+        self.throttled_count = 0
+
+    def set_rate(self, rate: float, burst: Optional[int] = None):
+        with self.lock:
+            self.rate = rate or 0
+            self.capacity = burst or max(int(self.rate), 1)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self) -> float:
+        """
+        Take a token.
+        return: delay - Seconds to wait before using it
+        """
+        if not self.rate:
+            return 0
+
+        with self.lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+            # Tokens go negative, every caller waits its turn in order
+            self.tokens -= 1
+            delay = self.updated - now + max(-self.tokens, 0) / self.rate
+            self.waited_time += delay
+
+        return delay
+
+    def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        import asyncio
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """
+        Stop handing tokens for some seconds, used when cafci throttles us.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.tokens, 0)
+            self.updated = max(self.updated, now + seconds)
+            self.throttled_count += 1
+
+        logger.warning("Cafci throttled the requests, pausing for %.1f seconds", seconds)
+
+    def __repr__(self):
+        return (
+            f"{self.rate} requests/s, {self.waited_time:.1f}s waited by all requests, "
+            f"throttled {self.throttled_count} times"
+        )
+
+
+def get_rate_limiter(rate: Optional[float] = None) -> RateLimiter:
+    """
+    Get the rate limiter shared by every call made in the current process.
+    param: rate - Change the requests per second of the shared limiter
+    """
+    pid = os.getpid()
+    rate_limiter = _rate_limiters.get(pid)
+
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(rate=DEFAULT_RATE_LIMIT if rate is None else rate)
+        _rate_limiters[pid] = rate_limiter
+    elif rate is not None and rate != rate_limiter.rate:
+        rate_limiter.set_rate(rate)
+
+    return rate_limiter
@@ -0,0 +1,156 @@
+from typing import Optional
+
+from ..common.utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+# Columns of the funds sheet, used when the header row is not available
+DEFAULT_HEADER = [
+    "class",
+    "name",
+    "trading_currency",
+    "class_cafci_code",
+    "fund_cafci_code",
+    "rescue_time",
+    "risk_level",
+    "tna",
+    "tea",
+    "tem",
+    "monthly_performance",
+    "six_month_performance",
+    "year_performance",
+    "updated",
+    "logo_url",
+]
+
+# Columns read by the services, logo_url is not part of the funds ranges
+REQUIRED_COLUMNS = DEFAULT_HEADER[:-1]
+
+# Other names used in the code for the same columns
+COLUMN_ALIASES = {
+    "fund_class_cafci_code": "class_cafci_code",
+}
+
+# Names that can be read as attributes of a record even if the sheet doesn't have the column
+KNOWN_COLUMNS = frozenset(DEFAULT_HEADER) | frozenset(COLUMN_ALIASES)
+
+
+def get_column_index(columns: dict, name: str):
+    index = columns.get(name)
+    if index is None and name in COLUMN_ALIASES:
+        index = columns.get(COLUMN_ALIASES[name])
+
+    return index
+
+
+class FundRecord():
+    """A row of the funds sheet.
+
+    The record keeps the row list returned by the sheets api and reads its
+    cells by the column positions of the table header. Cells missing at the
+    end of short rows are returned as None, any other attribute raises
+    AttributeError so typos are not read as empty cells.
+    """
+    __slots__ = ("row", "columns", "row_number")
+
+    def __init__(self, row: list, columns: dict, row_number: Optional[int] = None):
+        self.row = row
+        self.columns = columns
+        self.row_number = row_number
+
+    def get(self, name: str, default=None):
+        index = get_column_index(self.columns, name)
+
+        if index is None or index >= len(self.row):
+            return default
+
+        return self.row[index]
+
+    def __getitem__(self, name: str):
+        return self.get(name)
+
+    def __getattr__(self, name: str):
+        # Only called for names that are not set slots, example: record.name
+        if name.startswith("__") or name in FundRecord.__slots__:
+            raise AttributeError(name)
+
+        if name not in KNOWN_COLUMNS and name not in self.columns:
+            raise AttributeError(f"FundRecord has no column {name!r}")
+
+        return self.get(name)
+
+    def to_dict(self) -> dict:
+        return {name: self.get(name) for name in self.columns}
+
+    def __repr__(self):
+        return f"FundRecord({self.row_number}, {self.get('class_cafci_code')}, {self.get('name')})"
+
+
+class FundTable():
+    """The rows of the funds sheet with the column positions taken from its header.
+
+    param: header - First row of the sheet, DEFAULT_HEADER if None
+    param: rows - Rows after the header as returned by the sheets api
+    param: first_row - Sheet row number of the first row, used to build ranges
+    """
+
+    def __init__(self, header: Optional[list], rows: list, first_row: int = 2):
+        self.header = [str(name).strip() for name in (header or DEFAULT_HEADER)]
+        self.columns = {name: index for index, name in enumerate(self.header) if name}
+        self.rows = rows or []
+        self.first_row = first_row
+
+    @classmethod
+    def from_response(cls, response: list, first_row: int = 2):
+        """
+        Build the table from a response that includes the header row, example: the A1:N range.
+        """
+        if not response:
+            return cls(None, [], first_row=first_row)
+
+        table = cls(response[0], response[1:], first_row=first_row)
+
+        missing_columns = [name for name in REQUIRED_COLUMNS if name not in table.columns]
+        if missing_columns:
+            logger.warning("Sheet header is missing the columns %s", missing_columns)
+
+        return table
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        columns = self.columns
+        for index, row in enumerate(self.rows):
+            yield FundRecord(row, columns, self.first_row + index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            # Keep the sheet row numbers of the sliced rows
+            start = index.indices(len(self.rows))[0]
+            return FundTable(self.header, self.rows[index], first_row=self.first_row + start)
+
+        return FundRecord(self.rows[index], self.columns, self.first_row + index)
+
+    def column(self, name: str, default=None) -> list:
+        """
+        Get every value of a column, short rows are filled with default.
+        """
+        index = get_column_index(self.columns, name)
+        if index is None:
+            return [default] * len(self.rows)
+
+        return [row[index] if index < len(row) else default for row in self.rows]
+
+    def columns_view(self, names: list, default=None) -> dict:
+        """
+        Get many columns at once for bulk validations.
+        return: {name: [values]}
+        """
+        return {name: self.column(name, default) for name in names}
+
+    def get_codes(self) -> set:
+        return set(self.column("class_cafci_code"))
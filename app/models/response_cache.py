@@ -0,0 +1,180 @@
+import json
+import math
+import sqlite3
+import time
+from urllib.parse import (
+    parse_qsl,
+    urlencode,
+    urlsplit,
+    urlunsplit,
+)
+
+from ..common.utils import (
+    get_logger,
+    get_last_friday,
+    get_data_path,
+)
+
+
+logger = get_logger(__name__)
+
+MAX_CACHE_SIZE = 50 * 1024 * 1024  # 50MB of cached responses
+EVICTION_TARGET = 0.9  # Fraction of max_size left by an eviction, a full cache is not evicted on every set
+TOUCH_BATCH_SIZE = 100  # Hits whose last access is written at once
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize an url so equivalent urls share the same cache entry.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+class ResponseCache():
+    """On disk cache of cafci json responses.
+
+    Rendimiento urls are anchored on the last friday, so a cached response is
+    valid until the anchor moves. Entries of older anchors are evicted when the
+    cache is opened and the least recently used ones when it grows over
+    `max_size` bytes. The last access of the hits is written in batches, call
+    close or flush at the end of a run.
+    """
+    DB_PATH = "responses.sqlite3"
+
+    def __init__(self, path=None, max_size: int = MAX_CACHE_SIZE):
+        self.path = path or get_data_path(self.DB_PATH)
+        self.max_size = max_size
+        self.anchor = get_last_friday().isoformat()
+        self.hits = 0
+        self.misses = 0
+        self.touches: dict = {}  # url: last access of the hits not written yet
+
+        self.connection = sqlite3.connect(self.path)
+        # Hits and sets are written from the event loop, WAL commits don't wait for the disk
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+        self.evict_expired()
+        self.size, self.count = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses"
+        ).fetchone()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    anchor TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+
+    def evict_expired(self):
+        with self.connection:
+            deleted = self.connection.execute("DELETE FROM responses WHERE anchor != ?", (self.anchor, )).rowcount
+
+        if deleted:
+            logger.info("Evicted %s cached responses of previous weeks", deleted)
+
+    def evict_least_recently_used(self):
+        if self.size <= self.max_size:
+            return
+
+        self.flush()
+        target_size = self.max_size * EVICTION_TARGET
+        while self.size > target_size and self.count:
+            # Oldest entries expected to free enough space, using the average size of the entries
+            limit = math.ceil((self.size - target_size) * self.count / self.size)
+            oldest = "SELECT url FROM responses ORDER BY last_access LIMIT ?"
+
+            with self.connection:
+                freed, deleted = self.connection.execute(
+                    f"SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses WHERE url IN ({oldest})", (limit, )
+                ).fetchone()
+                self.connection.execute(f"DELETE FROM responses WHERE url IN ({oldest})", (limit, ))
+
+            self.size -= freed
+            self.count -= deleted
+
+    def flush(self):
+        """
+        Write the last access of the pending hits.
+        """
+        if not self.touches:
+            return
+
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE responses SET last_access = ? WHERE url = ?",
+                [(last_access, key) for key, last_access in self.touches.items()],
+            )
+        self.touches = {}
+
+    def get(self, url: str):
+        """
+        Get the cached response of an url.
+        return: response - Decoded json response or None if not cached
+        """
+        key = normalize_url(url)
+        row = self.connection.execute(
+            "SELECT body FROM responses WHERE url = ? AND anchor = ?", (key, self.anchor)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.touches[key] = time.time()
+        if len(self.touches) >= TOUCH_BATCH_SIZE:
+            self.flush()
+
+        return json.loads(row[0])
+
+    def set(self, url: str, response):
+        """
+        Cache the decoded json response of an url, failed requests (None) are never cached.
+        """
+        if response is None:
+            return
+
+        key = normalize_url(url)
+        body = json.dumps(response)
+
+        previous = self.connection.execute("SELECT size FROM responses WHERE url = ?", (key, )).fetchone()
+        if previous is None:
+            self.count += 1
+        else:
+            self.size -= previous[0]
+        # The access of the set is newer than the pending one
+        self.touches.pop(key, None)
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (url, anchor, body, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, self.anchor, body, len(body), time.time()),
+            )
+        self.size += len(body)
+
+        self.evict_least_recently_used()
+
+    def get_stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self.flush()
+        self.connection.close()
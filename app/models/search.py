@@ -0,0 +1,130 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+
+from ..common.utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+DEFAULT_RESULTS = 5
+MIN_SCORE = 0.3  # Fuzzy matches below this score are not returned
+PREFIX_BONUS = 0.5  # Added to the score of names with a word starting with the query
+NON_ALPHANUMERIC_REGEX = re.compile(r"[^a-z0-9]+")
+
+
+def fold_text(text) -> str:
+    """
+    Normalize a text for searching, example: "Fondo Acción  PESOS" -> "fondo accion pesos".
+    """
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+
+    return NON_ALPHANUMERIC_REGEX.sub(" ", text.lower()).strip()
+
+
+def get_trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class FundSearchIndex():
+    """In memory index to search funds by name.
+
+    Names are accent folded, prefixes are resolved with a sorted list of
+    words and typos with a trigram index ranked by jaccard similarity.
+    """
+
+    def __init__(self, records, name_column: str = "name"):
+        self.records: list = []
+        self.names: list = []  # Folded name of every record
+        self.exact: defaultdict = defaultdict(list)  # Folded name: record indexes
+        self.words: list = []  # Sorted (word, record index)
+        self.trigrams: defaultdict = defaultdict(set)  # Trigram: record indexes
+        self.trigram_counts: list = []
+
+        for record in records:
+            name = fold_text(record.get(name_column))
+            if not name:
+                continue
+
+            index = len(self.records)
+            self.records.append(record)
+            self.names.append(name)
+            self.exact[name].append(index)
+
+            self.words.extend((word, index) for word in set(name.split(" ")))
+
+            trigrams = get_trigrams(name)
+            self.trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self.trigrams[trigram].add(index)
+
+        self.words.sort()
+
+    def __len__(self):
+        return len(self.records)
+
+    def find_exact(self, name: str) -> list:
+        return [self.records[index] for index in self.exact.get(fold_text(name), [])]
+
+    def find_prefix(self, prefix: str) -> set:
+        """
+        Get the indexes of the records with a word starting with the last word of the prefix
+        and containing the previous ones.
+        """
+        query_words = fold_text(prefix).split(" ")
+        last_word = query_words[-1]
+        if not last_word:
+            return set()
+
+        indexes = set()
+        position = bisect_left(self.words, (last_word, -1))
+        while position < len(self.words) and self.words[position][0].startswith(last_word):
+            indexes.add(self.words[position][1])
+            position += 1
+
+        other_words = [word for word in query_words[:-1] if word]
+        return {index for index in indexes if all(word in self.names[index] for word in other_words)}
+
+    def search(self, query: str, results: int = DEFAULT_RESULTS, min_score: float = MIN_SCORE) -> list:
+        """
+        Search the funds most similar to the query.
+        return: [(score, record), ...] sorted by score, exact matches have the highest score
+        """
+        name = fold_text(query)
+        if not name:
+            return []
+
+        scores = defaultdict(float)
+
+        # Count the shared trigrams of every candidate
+        query_trigrams = get_trigrams(name)
+        shared: defaultdict = defaultdict(int)  # Record index: trigrams shared with the query
+        for trigram in query_trigrams:
+            for index in self.trigrams.get(trigram, ()):
+                shared[index] += 1
+
+        for index, shared_count in shared.items():
+            union = len(query_trigrams) + self.trigram_counts[index] - shared_count
+            scores[index] = shared_count / union
+
+        for index in self.find_prefix(name):
+            scores[index] += PREFIX_BONUS
+
+        for index in self.exact.get(name, []):
+            scores[index] = 2  # Above any fuzzy or prefix score
+
+        best = heapq.nlargest(results, scores.items(), key=lambda index_score: index_score[1])
+        return [(score, self.records[index]) for index, score in best if score >= min_score]
+
+    def search_many(self, queries: list, results: int = DEFAULT_RESULTS, min_score: float = MIN_SCORE) -> dict:
+        """
+        Search many names with the same index.
+        return: {query: [(score, record), ...]}
+        """
+        return {query: self.search(query, results, min_score) for query in queries}
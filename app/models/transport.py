@@ -0,0 +1,160 @@
+import os
+import re
+from urllib.parse import urlsplit
+
+from ..common.metrics import (
+    get_metrics,
+)
+from ..common.utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+DEFAULT_POOL_SIZE = 10  # Keep-alive connections kept per host
+CONNECT_TIMEOUT = 10  # Seconds to open a connection to cafci
+READ_TIMEOUT = 30  # Max seconds between two reads of the same response
+ACCEPT_ENCODING = "gzip, deflate"
+
+# Path segments that change on every fund or day, replaced so every endpoint is a single metric label
+ID_SEGMENT = re.compile(r"^\d+$")
+DATE_SEGMENT = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_transports: dict = {}  # pid: CafciTransport
+
+
+def get_endpoint(url: str) -> str:
+    """
+    Get the endpoint of a cafci url without the ids and dates,
+    example: /fondo/1222/clase/3924/ficha -> /fondo/:id/clase/:id/ficha
+    """
+    segments = []
+    for segment in urlsplit(url).path.split("/"):
+        if ID_SEGMENT.match(segment):
+            segment = ":id"
+        elif DATE_SEGMENT.match(segment):
+            segment = ":date"
+        segments.append(segment)
+
+    return "/".join(segments).rstrip("/") or "/"
+
+
+def record_request(endpoint: str, status, elapsed_time: float):
+    """
+    Record an attempt of a cafci request.
+    param: status - Http status or the kind of error, example: timeout
+    """
+    metrics = get_metrics()
+    metrics.counter(
+        "cafci_requests_total", "Cafci request attempts by endpoint and status", ("endpoint", "status")
+    ).inc(endpoint=endpoint, status=status)
+    metrics.histogram(
+        "cafci_request_seconds", "Seconds of every cafci request attempt", ("endpoint", )
+    ).observe(elapsed_time, endpoint=endpoint)
+
+
+def record_retry(endpoint: str, reason):
+    get_metrics().counter(
+        "cafci_retries_total", "Cafci requests retried by endpoint and reason", ("endpoint", "reason")
+    ).inc(endpoint=endpoint, reason=reason)
+
+
+class TransportStats():
+    """Connection usage of a transport during a run."""
+
+    def __init__(self, requests_count=0, new_connections=0, retries=0, timeouts=0):
+        self.requests_count = requests_count
+        self.new_connections = new_connections
+        self.retries = retries
+        self.timeouts = timeouts
+
+    @property
+    def reused_connections(self):
+        return max(self.requests_count - self.new_connections, 0)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests_count,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+        }
+
+    def __repr__(self):
+        return (
+            f"{self.requests_count} requests, {self.new_connections} new connections, "
+            f"{self.reused_connections} reused connections, {self.retries} retries, "
+            f"{self.timeouts} timeouts"
+        )
+
+
+class CafciTransport():
+    """Keep-alive http transport shared by every request made to cafci.
+
+    Connections are pooled per host, the pool size should match the amount
+    of concurrent workers doing requests through this transport.
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE):
+        # Imported here so the commands that never reach cafci don't load requests
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.pool_size = pool_size
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding": ACCEPT_ENCODING})
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def request(self, method, url, **kwargs):
+        # Without a timeout a hung socket blocks the caller forever
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        return self.session.request(method=method, url=url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def get_stats(self) -> TransportStats:
+        """
+        Get the connection usage of every host pool of this transport.
+        """
+        stats = TransportStats()
+        pools = self.adapter.poolmanager.pools
+
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+
+            stats.requests_count += pool.num_requests
+            stats.new_connections += pool.num_connections
+
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+def get_transport(pool_size: int = DEFAULT_POOL_SIZE) -> CafciTransport:
+    """
+    Get the transport shared by every call made in the current process.
+
+    Transports are never shared between processes, a forked worker creates its
+    own pool the first time it asks for it.
+    """
+    pid = os.getpid()
+    transport = _transports.get(pid)
+
+    if transport is None or transport.pool_size < pool_size:
+        if transport is not None:
+            transport.close()
+
+        transport = CafciTransport(pool_size=pool_size)
+        _transports[pid] = transport
+        logger.debug("Created cafci transport with %s connections per host", pool_size)
+
+    return transport
@@ -0,0 +1,129 @@
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+
+# Sanity bounds of the calculated columns, in percentage, values outside them are surely wrong
+COLUMN_BOUNDS = {
+    "tna": (-100, 1000),
+    "tea": (-100, 100000),
+    "tem": (-100, 1000),
+    "monthly_performance": (-100, 1000),
+    "six_month_performance": (-100, 10000),
+    "year_performance": (-100, 100000),
+}
+UPDATED_COLUMN = "updated"
+MAX_UPDATED_AGE = 8  # Days since the last update, funds are updated every week
+REPORT_ROWS = 10  # Row numbers shown of every problem in the report summary
+NAT_DAYS = np.iinfo(np.int64).min  # Int value of a NaT datetime64
+
+
+def parse_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def to_numbers(values: list) -> np.ndarray:
+    """
+    Transforms a column into floats, the values that are not numbers are NaN.
+    """
+    try:
+        # Fast path, the column only has numbers
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.fromiter((parse_float(value) for value in values), dtype=np.float64, count=len(values))
+
+
+def parse_day(value) -> int:
+    """
+    Parse a DD-MM-YYYY date into days since 1970-01-01, NaT for the invalid dates.
+    The separator is not checked, google can show the written dates as DD/MM/YYYY.
+    """
+    if not isinstance(value, str) or len(value) != 10:
+        return NAT_DAYS
+
+    try:
+        return int(np.datetime64(f"{value[6:]}-{value[3:5]}-{value[:2]}", "D").astype(np.int64))
+    except ValueError:
+        return NAT_DAYS
+
+
+def to_dates(values: list) -> np.ndarray:
+    """
+    Transforms a column of DD-MM-YYYY dates into datetime64, the invalid dates are NaT.
+    """
+    # Most funds share the same few dates, every distinct one is parsed once
+    days = {value: parse_day(value) for value in set(values)}
+
+    return np.array([days[value] for value in values], dtype=np.int64).view("datetime64[D]")
+
+
+class ValidationReport():
+    """Sheet rows of the funds with problems, grouped by column and problem."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.problems: dict = {}  # (column, problem): [row numbers]
+
+    def add(self, column: str, problem: str, row_numbers: list):
+        if row_numbers:
+            self.problems[(column, problem)] = row_numbers
+
+    def get_row_numbers(self) -> list:
+        """
+        Get the sheet row numbers with at least one problem, sorted.
+        """
+        return sorted(set().union(*self.problems.values()))
+
+    def __bool__(self):
+        return bool(self.problems)
+
+    def __repr__(self):
+        if not self.problems:
+            return f"{self.total} funds without problems"
+
+        lines = [f"{len(self.get_row_numbers())} of {self.total} funds with problems"]
+        for (column, problem), row_numbers in self.problems.items():
+            shown = ", ".join(str(row_number) for row_number in row_numbers[:REPORT_ROWS])
+            more = f" and {len(row_numbers) - REPORT_ROWS} more" if len(row_numbers) > REPORT_ROWS else ""
+            lines.append(f"{column} {problem}: {len(row_numbers)} rows ({shown}{more})")
+
+        return "\n".join(lines)
+
+
+def validate_funds(funds, today: Optional[date] = None, bounds: dict = COLUMN_BOUNDS,
+                   max_updated_age: int = MAX_UPDATED_AGE) -> ValidationReport:
+    """
+    Validate whole columns of a FundTable at once.
+    Checks the calculated columns are numbers inside their bounds and the updated date is recent.
+    param: funds - FundTable
+    param: today - Date used for the staleness, the current date if None
+    return: report - ValidationReport with the sheet row numbers of the funds with problems
+    """
+    report = ValidationReport(len(funds))
+    if not len(funds):
+        return report
+
+    row_numbers = np.arange(funds.first_row, funds.first_row + len(funds))
+    columns = funds.columns_view(list(bounds) + [UPDATED_COLUMN])
+
+    for column, (lower, upper) in bounds.items():
+        values = to_numbers(columns[column])
+        invalid = np.isnan(values) | np.isinf(values)
+        out_of_range = ~invalid & ((values < lower) | (values > upper))
+
+        report.add(column, "invalid", row_numbers[invalid].tolist())
+        report.add(column, "out of range", row_numbers[out_of_range].tolist())
+
+    oldest_updated = np.datetime64(today or date.today(), "D") - np.timedelta64(max_updated_age, "D")
+    updated = to_dates(columns[UPDATED_COLUMN])
+    invalid = np.isnat(updated)
+    stale = ~invalid & (updated < oldest_updated)
+
+    report.add(UPDATED_COLUMN, "invalid", row_numbers[invalid].tolist())
+    report.add(UPDATED_COLUMN, "stale", row_numbers[stale].tolist())
+
+    return report
@@ -3,15 +3,41 @@ from decimal import (
     InvalidOperation,
 )
 import time
+from typing import Optional
 
 from .models import FundClassParser
-from .sheets import APISpreadsheet
+from .common.metrics import (
+    get_metrics,
+    record_run,
+)
+from .common.exceptions import SheetWriteError
+from .common.constants import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_FUND_BUDGET,
+)
+from .models.checkpoint import UpdateCheckpoint
+from .models.price_store import PriceStore
+from .models.rate_limit import get_rate_limiter
+from .models.records import (
+    DEFAULT_HEADER,
+    FundTable,
+)
+from .models.response_cache import ResponseCache
+from .models.search import (
+    DEFAULT_RESULTS,
+    FundSearchIndex,
+)
+from .sheets import (
+    APISpreadsheet,
+    get_sheet_mirror,
+)
 from .common.utils import (
+    SAMPLED,
     get_logger,
     get_current_time,
+    emojize,
 )
-from multiprocessing import Pool
-from emoji import emojize
 
 
 logger = get_logger(__name__)
@@ -31,38 +57,99 @@ def start_debug_mode():
     return None
 
 
-def create_initial_funds_database():
+def get_spreadsheet() -> APISpreadsheet:
+    """
+    Get a spreadsheet whose reads are answered by the local mirror when it is fresh.
+    """
+    return APISpreadsheet(mirror=get_sheet_mirror())
+
+
+def record_transport_stats(parser: FundClassParser):
+    """
+    Add the connection usage of a parser to the metrics of the run.
+    """
+    stats = parser.get_transport_stats()
+    connections = get_metrics().counter("cafci_connections_total", "Cafci requests by connection used", ("kind", ))
+    connections.inc(stats.new_connections, kind="new")
+    connections.inc(stats.reused_connections, kind="reused")
+
+
+@record_run("create")
+def create_initial_funds_database(dry_run: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
     """
     Create the initial funds database.
+    The funds are appended to the sheet in chunks while the cafci listing is downloaded.
+    A creation that failed half way is resumed, the funds already in the sheet are not appended again.
+    param: dry_run - Get the funds from cafci without writing the sheet
+    param: chunk_size - Rows appended to the sheet on every call
     """
     start_time = time.time()  # Start time annotation
 
     # Create the initial funds database
     logger.info("Starting to create the initial funds database")
     logger.info("Checking if the database is empty")
-    # Check if the database is empty
-    sheet = APISpreadsheet()
+    # Check if the database is empty, always from google: a stale mirror could duplicate every fund
+    metrics = get_metrics()
+    sheet = get_spreadsheet()
     parser = FundClassParser()
-    data = sheet.get_data(sheet_name=parser.get_sheet(), _range=parser.get_max_range())
+    with metrics.stage("read_sheet"):
+        data = sheet.get_data(sheet_name=parser.get_sheet(), _range=parser.get_table_range(), refresh=True)
 
-    if len(data) > 1:
-        logger.info("The database is not empty")
-        logger.info("Aborting")
+    if data is None:
+        logger.error("Error reading the database, aborting")
         return
 
-    logger.info("The database is empty")
+    created_codes = {str(code) for code in FundTable.from_response(data).get_codes() if code is not None}
+    if created_codes:
+        logger.info("The database has %s funds, resuming the creation", len(created_codes))
+    else:
+        logger.info("The database is empty")
+
     logger.info("Getting all funds from cafci")
 
-    # Get all funds from cafci
-    all_fund_classes = parser.get_all_funds()
+    # Get all funds from cafci, every chunk is written as soon as it is full
+    funds_count = metrics.counter("funds_total", "Funds of the run by result", ("result", ))
+    code_index = DEFAULT_HEADER.index("class_cafci_code")
+    listed = 0
+    chunk: list = []  # Rows not written yet
+
+    def write_chunk() -> bool:
+        if dry_run or not chunk:
+            return True
+
+        logger.info("Writing %s funds to the database", len(chunk))
+        with metrics.stage("write"):
+            written = sheet.post_data(
+                values=chunk,
+                sheet_name=parser.get_sheet(),
+            )
+        chunk.clear()
+
+        return written is not None
+
+    with metrics.stage("fetch"):
+        for fund_class in parser.iter_all_funds():
+            listed += 1
+            if str(fund_class[code_index]) in created_codes:
+                funds_count.inc(result="existing")
+                continue
+
+            chunk.append(fund_class)
+            if len(chunk) >= chunk_size and not write_chunk():
+                logger.error("Error writing the funds, aborting with %s funds listed", listed)
+                funds_count.inc(listed, result="listed")
+                return
+
+    funds_count.inc(listed, result="listed")
+    if not write_chunk():
+        logger.error("Error writing the funds, aborting with %s funds listed", listed)
+        return
 
-    # Create the initial database
-    logger.info("Creating the initial database")
+    if dry_run:
+        logger.info("Dry run, %s funds not written", listed)
+        return
 
-    sheet.post_data(
-        values=all_fund_classes,
-        sheet_name=parser.get_sheet(),
-    )
+    record_transport_stats(parser)
 
     end_time = time.time()  # End time annotation
     elapsed_time = end_time - start_time
@@ -71,118 +158,294 @@ def create_initial_funds_database():
     logger.info(f"Elapsed time: {elapsed_time} seconds")
 
 
-def update_funds_database():
+@record_run("update")
+def update_funds_database(concurrency: int = DEFAULT_CONCURRENCY, single_fetch: bool = False,
+                          use_price_store: bool = False, use_response_cache: bool = True,
+                          limit: Optional[int] = None, dry_run: bool = False, rate_limit: Optional[float] = None,
+                          fund_budget: float = DEFAULT_FUND_BUDGET, deadline: Optional[float] = None,
+                          resume: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE, refresh_sheet: bool = False):
     """
     Update the database.
+    param: concurrency - Max amount of cafci requests in flight
+    param: single_fetch - Calculate every range from one price history per fund
+    param: use_price_store - Calculate the funds covered by the local price store without requests
+    param: use_response_cache - Reuse the cafci responses already fetched this week
+    param: limit - Only update the first funds of the sheet
+    param: dry_run - Calculate the funds without writing the sheet
+    param: rate_limit - Max cafci requests per second, 0 disables the limit
+    param: fund_budget - Max seconds to get the data of a fund
+    param: deadline - Max seconds of the whole run, the funds not finished by then keep their values
+    param: resume - Skip the funds already fetched this week by a run that did not finish
+    param: chunk_size - Rows written to the sheet at once, while the next funds are fetched
+    param: refresh_sheet - Read the funds from google even if the local mirror is fresh
     """
     start_time = time.time()  # Start time annotation
+    deadline_time = time.monotonic() + deadline if deadline else None
 
     # Update the database
 
     logger.info(emojize(":rocket: Initializing database update"))
 
     # Get all funds from our database
-    sheet = APISpreadsheet()
-    parser = FundClassParser()
+    metrics = get_metrics()
+    sheet = get_spreadsheet()
+    checkpoint = UpdateCheckpoint()
+    if not resume:
+        checkpoint.clear()
+
+    parser = FundClassParser(
+        price_store=PriceStore() if use_price_store else None,
+        response_cache=ResponseCache() if use_response_cache else None,
+        rate_limiter=get_rate_limiter(rate_limit),
+        checkpoint=checkpoint,
+    )
     # now = get_current_time().strftime("%d-%m-%Y")
 
     # Get all fund groups from sheet
-    funds_cafci_codes = sheet.get_data(sheet_name=parser.get_sheet(), _range=parser.get_fund_codes_range())
-    logger.info(f"Got {len(funds_cafci_codes)} funds from sheet")
-
-    new_data = []
-
-    # Create a pool of worker processes
-    with Pool(processes=8) as pool:
-        # Use the map method to distribute the work among the workers
-        new_data = pool.map(calc_data_by_fund, funds_cafci_codes)
-
-    # Update the sheet database
-    logger.info(emojize(":rocket: Updating sheet database"))
-    try:
-        sheet.reload()
-        sheet.update_data(
-            values=new_data,
+    with metrics.stage("read_sheet"):
+        funds_cafci_codes = sheet.get_data(
             sheet_name=parser.get_sheet(),
-            _range=parser.get_calc_data_range(),
+            _range=parser.get_fund_codes_range(),
+            refresh=refresh_sheet,
+        )
+        if funds_cafci_codes is None:
+            logger.error("Error reading the database, aborting")
+            checkpoint.close()
+            return
+
+        logger.info(f"Got {len(funds_cafci_codes)} funds from sheet")
+        funds_cafci_codes = funds_cafci_codes[:limit]
+
+        # Current values of the sheet, every chunk only writes the cells that changed
+        current_values = []
+        if not dry_run:
+            current_values = sheet.get_data(
+                sheet_name=parser.get_sheet(),
+                _range=parser.get_calc_data_range(),
+                value_render_option="UNFORMATTED_VALUE",
+            )
+            if current_values is None:
+                logger.warning(emojize(":warning: Could not read the current values, writing every cell"))
+                current_values = []
+
+    # Funds failed, over their budget or unfinished at the deadline, their rows are not written
+    stragglers: list = []
+    write_stats = {"updated_cells": 0, "skipped_cells": 0, "failed_chunks": 0}
+
+    def write_chunk(start, rows):
+        stragglers.extend(
+            fund_code for fund_code, row in zip(funds_cafci_codes[start:start + len(rows)], rows) if row is None
+        )
+        if dry_run:
+            return
+
+        with metrics.stage("write"):
+            chunk_stats = sheet.diff_update_rows(
+                current_values[start:start + len(rows)],
+                rows,
+                sheet_name=parser.get_sheet(),
+                _range=parser.get_calc_data_rows_range(start, len(rows)),
+            )
+        write_stats["updated_cells"] += chunk_stats["updated_cells"]
+        write_stats["skipped_cells"] += chunk_stats["skipped_cells"]
+        if chunk_stats["failed_ranges"]:
+            logger.error(emojize(
+                f":warning: Error updating the funds {start} to {start + len(rows)}, "
+                f"{chunk_stats['failed_ranges']} ranges not written"
+            ))
+            write_stats["failed_chunks"] += 1
+
+    # Fetch every fund concurrently from a single process, the sheet is updated while fetching
+    logger.info(emojize(":rocket: Fetching funds and updating the sheet database"))
+    with metrics.stage("fetch"):
+        parser.stream_calc_data_by_funds(
+            funds_cafci_codes,
+            write_chunk,
+            concurrency=concurrency,
+            single_fetch=single_fetch,
+            fund_budget=fund_budget,
+            deadline=deadline_time,
+            chunk_size=chunk_size,
         )
-    except Exception as e:
-        logger.error(emojize(f":warning: Error updating sheet database: {e}"))
-        import ipdb
-        ipdb.set_trace()
+    funds_count = metrics.counter("funds_total", "Funds of the run by result", ("result", ))
+    funds_count.inc(len(funds_cafci_codes) - len(stragglers), result="updated")
+    funds_count.inc(len(stragglers), result="unfinished")
+    record_transport_stats(parser)
+    logger.info(emojize(f":floppy_disk: Checkpoint: {checkpoint.get_stats()}"))
+    checkpoint.close()
+    if parser.response_cache is not None:
+        parser.response_cache.close()
+
+    if dry_run:
+        logger.info("Dry run, %s funds calculated and not written", len(funds_cafci_codes) - len(stragglers))
+        return
+
+    logger.info(
+        f"{write_stats['updated_cells']} cells updated, {write_stats['skipped_cells']} unchanged cells skipped, "
+        f"{write_stats['failed_chunks']} chunks failed"
+    )
 
     end_time = time.time()  # End time annotation
     elapsed_time = end_time - start_time
     logger.info(emojize(":check_mark_button: Database updated"))
+    logger.info(emojize(f":globe_with_meridians: Cafci connections: {parser.get_transport_stats()}"))
+    logger.info(emojize(f":card_file_box: Cafci response cache: {parser.get_cache_stats()}"))
+    logger.info(emojize(f":mirror: Sheet mirror: {sheet.mirror.get_stats()}"))
+    logger.info(emojize(f":vertical_traffic_light: Cafci rate limit: {parser.rate_limiter}"))
+    logger.info(emojize(
+        f":bar_chart: {len(funds_cafci_codes) - len(stragglers)} funds updated, {len(stragglers)} failed or not "
+        "finished in time"
+    ))
+    if stragglers:
+        logger.warning(emojize(f":warning: Funds not updated: {stragglers}"))
     logger.info(emojize(f":stopwatch: Elapsed time: {elapsed_time} seconds"))
 
+    if deadline_time is not None and time.monotonic() >= deadline_time:
+        logger.warning(emojize(":warning: Deadline reached, skipping the integrity check"))
+        return
+
     # Check the database integrity
-    check_database_integrity()
+    check_database_integrity(
+        use_response_cache=use_response_cache,
+        limit=limit,
+        rate_limit=rate_limit,
+        concurrency=concurrency,
+        fund_budget=fund_budget,
+    )
 
 
-def calc_data_by_fund(fund_code: list) -> list:
+@record_run("sync_prices")
+def sync_price_store(concurrency: int = DEFAULT_CONCURRENCY, backfill: bool = False,
+                     rate_limit: Optional[float] = None):
+    """
+    Download into the local price store the daily prices missing since the last sync.
+    param: concurrency - Max amount of cafci requests in flight
+    param: backfill - Download the whole history of every fund, not only the missing days
+    param: rate_limit - Max cafci requests per second, 0 disables the limit
+    """
+    start_time = time.time()  # Start time annotation
+    logger.info(emojize(":rocket: Initializing price store sync"))
+
+    sheet = get_spreadsheet()
+    price_store = PriceStore()
+    parser = FundClassParser(price_store=price_store, rate_limiter=get_rate_limiter(rate_limit))
+
+    funds_cafci_codes = sheet.get_data(sheet_name=parser.get_sheet(), _range=parser.get_fund_codes_range())
+    logger.info(f"Got {len(funds_cafci_codes)} funds from sheet")
+
+    with get_metrics().stage("fetch"):
+        synced = parser.sync_price_store(funds_cafci_codes, concurrency=concurrency, backfill=backfill)
+    price_store.close()
+    record_transport_stats(parser)
+
+    end_time = time.time()  # End time annotation
+    elapsed_time = end_time - start_time
+    logger.info(emojize(f":check_mark_button: {synced} funds synced into the price store"))
+    logger.info(emojize(f":stopwatch: Elapsed time: {elapsed_time} seconds"))
+
+
+def backfill_price_store(concurrency: int = DEFAULT_CONCURRENCY):
+    """
+    Download into the local price store the whole history of every fund.
+    """
+    sync_price_store(concurrency=concurrency, backfill=True)
+
+
+def calc_data_by_fund(fund_code: list, parser: Optional[FundClassParser] = None) -> list:
     """
     Calculate the data for a fund.
     """
-    parser = FundClassParser()
+    parser = parser or FundClassParser()
     class_id = fund_code[0]
     fund_id = fund_code[1]
-    now = get_current_time().strftime("%d-%m-%Y")
 
-    logger.info(emojize(f":hourglass_not_done: Getting cafci data from class id {class_id} and fund id {fund_id}"))
-    # Get the TEM for the fund
+    logger.info("Getting cafci data from class id %s and fund id %s", class_id, fund_id, extra=SAMPLED)
+    # Get the prices used for the TEM
     first_price, last_price = parser.get_prices_by_range(class_id=class_id, fund_id=fund_id, date_range=7)
 
-    # Append the TEM to the new data
-    if first_price == 0 or last_price == 0:
-        tem = 0
-        tna = 0
-        tea = 0
-    else:
-        tem, tna, tea = parser.get_proyection(
-            initial_price=Decimal(str(first_price)),
-            final_price=Decimal(str(last_price))
-        )
-
     # Now get the monthly performance
     monthly_performance = parser.get_performance_by_range(class_id=class_id, fund_id=fund_id, date_range=30)
     six_month_performance = parser.get_performance_by_range(class_id=class_id, fund_id=fund_id, date_range=180)
     year_performance = parser.get_performance_by_range(class_id=class_id, fund_id=fund_id, date_range=365)
 
     # Return the tem and monthly performance
-    return [
-        str(tna),
-        str(tea),
-        str(tem),
-        str(monthly_performance),
-        str(six_month_performance),
-        str(year_performance),
-        now
-    ]
-
-
-def search_fund_by_name():
+    return parser.build_calc_data(
+        first_price,
+        last_price,
+        monthly_performance,
+        six_month_performance,
+        year_performance,
+    )
+
+
+def get_search_index(sheet: Optional[APISpreadsheet] = None, refresh_sheet: bool = False) -> FundSearchIndex:
     """
-    Search a fund by name.
+    Build the search index with every fund of our database.
     """
-    fund_name = input("Ingrese el nombre del fondo: ")  # Santander Ahorro PESOS
+    sheet = sheet or get_spreadsheet()
+    funds = sheet.get_fund_table(refresh=refresh_sheet)
+
+    return FundSearchIndex(funds or [])
+
+
+def search_fund_by_name(fund_name: Optional[str] = None, results: int = DEFAULT_RESULTS, refresh_sheet: bool = False):
+    """
+    Search a fund by name, accents and typos are allowed.
+    return: fund - Data of the best match or None
+    """
+    if fund_name is None:
+        fund_name = input("Ingrese el nombre del fondo: ")  # Santander Ahorro PESOS
     logger.info("Searching fund by name %s", fund_name)
-    sheet = APISpreadsheet()
 
     # Get all funds from our database
-    funds = sheet.get_all_rows_formated()  # {"2942": {"name": "Santander"}}
-    # search the fund by name
-    logger.info("Searching fund by name %s", fund_name)
-    fund_name = fund_name.lower()
+    index = get_search_index(refresh_sheet=refresh_sheet)
 
-    for fund in funds:
-        if fund_name == funds[fund]["name"].lower():
-            logger.info("Fund %s found", fund_name)
-            logger.info("Fund data: %s", funds[fund])
-            return funds[fund]
+    start_time = time.time()
+    matches = index.search(fund_name, results=results)
+    elapsed_time = (time.time() - start_time) * 1000
 
-    logger.info("Fund %s not found", fund_name)
-    return None
+    logger.info("Searched %s funds in %.2f ms", len(index), elapsed_time)
+
+    if not matches:
+        logger.info("Fund %s not found", fund_name)
+        return None
+
+    for score, fund in matches:
+        logger.info("%.2f %s (%s)", score, fund.get("name"), fund.get("class_cafci_code"))
+
+    best_match = matches[0][1].to_dict()
+    logger.info("Fund data: %s", best_match)
+    return best_match
+
+
+def search_funds_from_file(path: Optional[str] = None, results: int = 1, refresh_sheet: bool = False):
+    """
+    Search every name of a file, one per line, with a single index.
+    return: {name: [fund data of the matches]}
+    """
+    if path is None:
+        path = input("Ingrese la ruta del archivo con los nombres: ")
+
+    with open(path, encoding="utf-8") as names_file:
+        names = [line.strip() for line in names_file if line.strip()]
+
+    index = get_search_index(refresh_sheet=refresh_sheet)
+
+    start_time = time.time()
+    matches = index.search_many(names, results=results)
+    elapsed_time = (time.time() - start_time) * 1000
+    logger.info("Searched %s names in %s funds in %.2f ms", len(names), len(index), elapsed_time)
+
+    found = {}
+    for name, name_matches in matches.items():
+        found[name] = [fund.to_dict() for _, fund in name_matches]
+
+        if name_matches:
+            logger.info("%s -> %s", name, name_matches[0][1].get("name"))
+        else:
+            logger.info("%s -> not found", name)
+
+    return found
 
 
 def check_field_is_decimal(field: str) -> bool:
@@ -192,84 +455,122 @@ def check_field_is_decimal(field: str) -> bool:
     try:
         Decimal(field)
         return True
-    except InvalidOperation:
+    except (InvalidOperation, TypeError):
+        # TypeError for the missing cells of short rows
         return False
 
 
-def check_database_integrity():
+@record_run("check")
+def check_database_integrity(use_response_cache: bool = True, limit: Optional[int] = None, dry_run: bool = False,
+                             rate_limit: Optional[float] = None, refresh_sheet: bool = False,
+                             concurrency: int = DEFAULT_CONCURRENCY, max_repairs: Optional[int] = None,
+                             fund_budget: float = DEFAULT_FUND_BUDGET):
     """
     Check the database integrity.
+    param: use_response_cache - Reuse the cafci responses already fetched this week
+    param: limit - Only check the first funds of the sheet
+    param: dry_run - Report the funds with errors without repairing them
+    param: rate_limit - Max cafci requests per second, 0 disables the limit
+    param: refresh_sheet - Read the funds from google even if the local mirror is fresh
+    param: concurrency - Max amount of cafci requests in flight while repairing
+    param: max_repairs - Max amount of funds repaired, the rest wait for the next check
+    param: fund_budget - Max seconds to get the data of a fund
     """
     logger.info(emojize(":rocket: Initializing database integrity check"))
     start_time = time.time()  # Start time annotation
-    sheet = APISpreadsheet()
-    parser = FundClassParser()
-    list_start = 2
+    metrics = get_metrics()
+    sheet = get_spreadsheet()
+    parser = FundClassParser(
+        response_cache=ResponseCache() if use_response_cache else None,
+        rate_limiter=get_rate_limiter(rate_limit),
+    )
 
-    # Get all funds from our database
-    funds = sheet.get_data(sheet_name=parser.get_sheet(), _range=parser.get_max_range())
-    funds_formatted = sheet.response_to_dicctionary(funds)
-    logger.info("Got %s funds from sheet", len(funds_formatted))
-
-    # Check every fund fields are not empty or have the incorrect format
-    # loop the fund and the index
-    for index, fund in enumerate(funds_formatted):
-        has_error = False
-        fund_name = fund.get("name")
-        fund_class_code = fund.get("fund_class_cafci_code")
-        fund_code = fund.get("fund_cafci_code")
-        tna = fund.get("tna")  # Need to be a float or Decimal
-        tea = fund.get("tea")  # Need to be a float or Decimal
-        tem = fund.get("tem")  # Need to be a float or Decimal
-        monthly_performance = fund.get("monthly_performance")  # Need to be a float or Decimal
-        six_month_performance = fund.get("six_month_performance")  # Need to be a float or Decimal
-        year_performance = fund.get("year_performance")  # Need to be a float or Decimal
-
-        if not check_field_is_decimal(tna):
-            logger.info("Fund %s has incorrect tna field", fund_name)
-            has_error = True
-
-        if not check_field_is_decimal(tea):
-            logger.info("Fund %s has incorrect tea field", fund_name)
-            has_error = True
-
-        if not check_field_is_decimal(tem):
-            logger.info("Fund %s has incorrect tem field", fund_name)
-            has_error = True
-
-        if not check_field_is_decimal(monthly_performance):
-            logger.info("Fund %s has incorrect monthly_performance field", fund_name)
-            has_error = True
-
-        if not check_field_is_decimal(six_month_performance):
-            logger.info("Fund %s has incorrect six_month_performance field", fund_name)
-            has_error = True
-
-        if not check_field_is_decimal(year_performance):
-            logger.info("Fund %s has incorrect year_performance field", fund_name)
-            has_error = True
-
-        if has_error:
-            real_index = index + list_start
-            logger.info("Fund %s has errors", fund_name)
-            logger.info("Updating fund %s", fund_name)
-            new_data = calc_data_by_fund([fund_class_code, fund_code])
-            logger.info("Updating sheet database")
-            try:
-                sheet.update_data(
-                    values=[new_data, ],
-                    sheet_name=parser.get_sheet(),
-                    _range=f"{parser.TNA_COLUMN}{real_index}:{parser.END_COLUMN}{real_index}",
-                )
-            except Exception as e:
-                logger.error(emojize(f":warning: Error updating sheet database: {e}"))
-                import ipdb
-                ipdb.set_trace()
-
-            logger.info(emojize(f":check_mark_button: Fund {fund_name} updated"))
+    # Get all funds from our database, columns are mapped from the header row
+    with metrics.stage("read_sheet"):
+        funds = sheet.get_fund_table(
+            sheet_name=parser.get_sheet(),
+            _range=parser.get_table_range(),
+            refresh=refresh_sheet,
+        )
+
+    if funds is None:
+        logger.error("Error reading the database, aborting")
+        return
+
+    logger.info("Got %s funds from sheet", len(funds))
+    funds = funds[:limit]
+
+    # Check whole columns at once: numbers inside their bounds and a recent updated date
+    from .models.validation import validate_funds
+
+    with metrics.stage("validate"):
+        report = validate_funds(funds, today=get_current_time().date())
+    logger.info("Validation report:\n%s", report)
+
+    broken_rows = set(report.get_row_numbers())
+    broken_funds = [fund for fund in funds if fund.row_number in broken_rows]
+    checked_funds = metrics.counter("integrity_funds_total", "Funds of the integrity check by result", ("result", ))
+    checked_funds.inc(len(funds), result="checked")
+    checked_funds.inc(len(broken_funds), result="broken")
+
+    logger.info("%s of %s funds have errors", len(broken_funds), len(funds))
+    if max_repairs is not None and len(broken_funds) > max_repairs:
+        logger.warning(emojize(
+            f":warning: Repairing only {max_repairs} funds, {len(broken_funds) - max_repairs} left for the next check"
+        ))
+        broken_funds = broken_funds[:max_repairs]
+
+    if broken_funds and not dry_run:
+        # Every broken fund is fetched concurrently, like the full update
+        logger.info("Updating %s funds", len(broken_funds))
+        fund_codes = [[fund.get("fund_class_cafci_code"), fund.get("fund_cafci_code")] for fund in broken_funds]
+        with metrics.stage("repair"):
+            new_data = parser.calc_data_by_funds(
+                fund_codes,
+                concurrency=concurrency,
+                fund_budget=fund_budget,
+            )
+
+        # Ranges and values of the funds repaired, funds failed or over their budget keep their values
+        repaired_codes = [fund_code for fund_code, row in zip(fund_codes, new_data) if row is not None]
+        not_repaired = [fund_code for fund_code, row in zip(fund_codes, new_data) if row is None]
+        repairs = [
+            (parser.get_calc_data_rows_range(fund.row_number - parser.FIRST_DATA_ROW, 1), [row])
+            for fund, row in zip(broken_funds, new_data) if row is not None
+        ]
+
+        # Write every repaired fund at once
+        written = 0
+        if repairs:
+            logger.info("Updating %s funds in the sheet database", len(repairs))
+            written = len(repairs)
+            with metrics.stage("write"):
+                try:
+                    sheet.batch_update_data(
+                        ranges_values=repairs,
+                        sheet_name=parser.get_sheet(),
+                    )
+                except SheetWriteError as error:
+                    # Every repair is a range, the ones before the failed call were written
+                    written = error.written_ranges
+                    logger.error(emojize(f":warning: Error updating sheet database: {error}"))
+            not_repaired.extend(repaired_codes[written:])
+
+        checked_funds.inc(written, result="repaired")
+        checked_funds.inc(len(not_repaired), result="not_repaired")
+        logger.info(emojize(f":check_mark_button: {written} of {len(broken_funds)} funds repaired"))
+        if not_repaired:
+            logger.warning(emojize(f":warning: {len(not_repaired)} funds not repaired: {not_repaired}"))
+
+    if parser.response_cache is not None:
+        parser.response_cache.close()
 
     end_time = time.time()  # End time annotation
     elapsed_time = end_time - start_time
+    record_transport_stats(parser)
     logger.info(emojize(":check_mark_button: Database integrity checked"))
+    logger.info(emojize(f":globe_with_meridians: Cafci connections: {parser.get_transport_stats()}"))
+    logger.info(emojize(f":card_file_box: Cafci response cache: {parser.get_cache_stats()}"))
+    logger.info(emojize(f":mirror: Sheet mirror: {sheet.mirror.get_stats()}"))
     logger.info(emojize(f":stopwatch: Elapsed time: {elapsed_time} seconds"))
     return None
@@ -1 +1,2 @@
 from .sheet_api import *
+from .sheet_mirror import *
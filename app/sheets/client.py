@@ -0,0 +1,90 @@
+import os
+import threading
+
+from ..common.utils import (
+    get_logger,
+)
+
+
+logger = get_logger(__name__)
+
+GOOGLE_API = "sheets"
+GOOGLE_API_VERSION = "v4"
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
+KEY = 'key.json'
+TIMEOUT = 60  # Seconds to wait for every google api response, then the call raises TimeoutError
+
+_services: dict = {}  # (pid, key): service
+_spreadsheets: dict = {}  # (pid, key): spreadsheets resource of the service
+_lock = threading.RLock()  # Reentrant, get_spreadsheets builds the service while holding it
+
+
+def build_sheets_service(key: str = KEY, scopes: list = SCOPES, timeout: float = TIMEOUT):
+    """
+    Build a google sheets client, slow: reads the key and loads the discovery document.
+    """
+    # Imported here, the discovery client is only loaded by the commands that use the sheet
+    import httplib2
+    from google.oauth2 import service_account
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.discovery import build
+
+    # The token is refreshed by AuthorizedHttp when it expires
+    credentials = service_account.Credentials.from_service_account_file(key, scopes=scopes)
+    # The default http client never times out, its connections are reused by every call
+    http = AuthorizedHttp(credentials, http=httplib2.Http(timeout=timeout))
+
+    # The discovery document shipped with the library, without asking google for it
+    service = build(GOOGLE_API, GOOGLE_API_VERSION, http=http, static_discovery=True, cache_discovery=False)
+    logger.debug("Built google sheets client for %s", key)
+
+    return service
+
+
+def get_sheets_service(key: str = KEY, scopes: list = SCOPES, timeout: float = TIMEOUT):
+    """
+    Get the google sheets client shared by every APISpreadsheet of the current process.
+
+    Clients are never shared between processes, a forked worker builds its
+    own the first time it asks for it.
+    """
+    cache_key = (os.getpid(), key)
+
+    with _lock:
+        service = _services.get(cache_key)
+        if service is None:
+            service = build_sheets_service(key=key, scopes=scopes, timeout=timeout)
+            _services[cache_key] = service
+
+    return service
+
+
+def get_spreadsheets(key: str = KEY, scopes: list = SCOPES, timeout: float = TIMEOUT):
+    """
+    Get the spreadsheets resource of the shared client, building it parses the discovery document.
+    """
+    cache_key = (os.getpid(), key)
+
+    # Executor threads of the streamed updates can ask for it at the same time, only one builds it
+    with _lock:
+        spreadsheets = _spreadsheets.get(cache_key)
+        if spreadsheets is None:
+            spreadsheets = get_sheets_service(key=key, scopes=scopes, timeout=timeout).spreadsheets()
+            _spreadsheets[cache_key] = spreadsheets
+
+    return spreadsheets
+
+
+def set_sheets_service(service, key: str = KEY):
+    """
+    Use another client in the current process, example: the fake sheet of the benchmarks.
+    None goes back to the google client.
+    """
+    cache_key = (os.getpid(), key)
+
+    with _lock:
+        _spreadsheets.pop(cache_key, None)
+        if service is None:
+            _services.pop(cache_key, None)
+        else:
+            _services[cache_key] = service
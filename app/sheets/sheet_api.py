@@ -1,113 +1,448 @@
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google.oauth2 import service_account
-from googleapiclient.errors import HttpError
-
+from decimal import (
+    Decimal,
+    InvalidOperation,
+)
+import re
+import time
 
+from ..common.exceptions import (
+    SheetWriteError,
+)
+from ..common.metrics import (
+    get_metrics,
+)
 from ..common.utils import (
     get_logger,
 )
+from ..models.records import (
+    FundTable,
+)
+from . import client
+from .sheet_mirror import (
+    MIRROR_RANGE,
+    read_grid,
+)
 
 logger = get_logger(__name__)
 
+# Keys of the dictionaries returned by response_to_dicctionary
+DICTIONARY_KEYS = [
+    "class",
+    "name",
+    "trading_currency",
+    "fund_class_cafci_code",
+    "fund_cafci_code",
+    "rescue_time",
+    "risk_level",
+    "tna",
+    "tea",
+    "tem",
+    "monthly_performance",
+    "six_month_performance",
+    "year_performance",
+    "updated",
+]
+
+CELL_REGEX = re.compile(r"^([A-Z]+)(\d*)$")
+SERVER_ERROR_STATUS = 500
+
+
+def column_to_index(column):
+    """Transforms a column letter into a zero based index, example: "A" -> 0, "AA" -> 26."""
+    index = 0
+    for letter in column:
+        index = index * 26 + ord(letter) - ord("A") + 1
+
+    return index - 1
+
+
+def index_to_column(index):
+    """Transforms a zero based index into a column letter, example: 0 -> "A", 26 -> "AA"."""
+    column = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        column = chr(ord("A") + remainder) + column
+
+    return column
+
+
+def split_cell(cell):
+    """Split a cell into its column and row, example: "H2" -> ("H", 2), "N" -> ("N", None)."""
+    match = CELL_REGEX.match(cell.upper())
+    if match is None:
+        raise ValueError(f"Invalid cell {cell}")
+
+    column, row = match.groups()
+    return column, int(row) if row else None
+
+
+def range_to_indexes(_range):
+    """
+    Transforms a range into zero based indexes, example: "H2:N" -> (7, 1, 13, None), None is an open end row.
+    return: first_column, first_row, last_column, last_row
+    """
+    start_cell, _, end_cell = _range.partition(":")
+    start_column, start_row = split_cell(start_cell)
+    end_column, end_row = split_cell(end_cell or start_cell)
+
+    return (
+        column_to_index(start_column),
+        (start_row or 1) - 1,
+        column_to_index(end_column),
+        end_row - 1 if end_row else None,
+    )
+
+
+def write_may_be_applied(error) -> bool:
+    """
+    Check if a failed write could have reached the sheet anyway.
+    Google rejects the invalid requests without writing them, a timeout or a server error may be applied or not.
+    """
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return status is None or int(status) >= SERVER_ERROR_STATUS
+
+
+def cells_are_equal(old, new):
+    """Compare a sheet value with a new one, numbers are compared by value."""
+    if old == new:
+        return True
+
+    if old is None or new is None:
+        return old in (None, "") and new in (None, "")
+
+    try:
+        return Decimal(str(old)) == Decimal(str(new))
+    except InvalidOperation:
+        return str(old) == str(new)
+
 
 class APISpreadsheet:
 
-    SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-    KEY = 'key.json'
+    SCOPES = client.SCOPES
+    KEY = client.KEY
     SPREADSHEET_ID = '1EDfxFQA4ncCaRl6G45oyufY8KNhiuFuGRbTb-JGsLzg'
-    GOOGLE_API = "sheets"
-    GOOGLE_API_VERSION = "v4"
+    GOOGLE_API = client.GOOGLE_API
+    GOOGLE_API_VERSION = client.GOOGLE_API_VERSION
     FIST_CELL = "A1"
     APPEND_CONST = "USER_ENTERED"
+    MAX_BATCH_RANGES = 500  # Ranges sent on every batchUpdate call
+    TIMEOUT = client.TIMEOUT
 
-    def __init__(self):
-        self.creds = service_account.Credentials.from_service_account_file(self.KEY, scopes=self.SCOPES)
-        self.service = build(self.GOOGLE_API, self.GOOGLE_API_VERSION, credentials=self.creds)
-        self.sheet = self.service.spreadsheets()
+    def __init__(self, service=None, mirror=None):
+        # Optional SheetMirror that answers the formatted reads and follows the writes
+        self.mirror = mirror
+        self.service = service
+        self.injected = service is not None
+        self.reload()
 
     def reload(self):
-        self.creds = service_account.Credentials.from_service_account_file(self.KEY, scopes=self.SCOPES)
-        self.service = build(self.GOOGLE_API, self.GOOGLE_API_VERSION, credentials=self.creds)
-        self.sheet = self.service.spreadsheets()
+        if self.injected:
+            self.sheet = self.service.spreadsheets()
+            return
 
-    def get_data(self, sheet_name="funds", _range="A1:L"):
+        # Built once per process, later calls reuse the client, its credentials and connections
+        self.service = client.get_sheets_service(key=self.KEY, scopes=self.SCOPES, timeout=self.TIMEOUT)
+        self.sheet = client.get_spreadsheets(key=self.KEY, scopes=self.SCOPES, timeout=self.TIMEOUT)
+
+    def execute(self, request, operation: str):
+        """
+        Execute a google api request, recording its result and seconds.
+        param: operation - Name of the request in the metrics, example: batch_update
+        """
+        metrics = get_metrics()
+        result = "error"
+        start_time = time.perf_counter()
         try:
-            result = self.sheet.values().get(
-                spreadsheetId=self.SPREADSHEET_ID,
-                range=f'{sheet_name}!{_range}'
-            ).execute()
+            response = request.execute()
+            result = "ok"
+            return response
+        finally:
+            metrics.counter(
+                "sheets_requests_total", "Google sheets requests by operation and result", ("operation", "result")
+            ).inc(operation=operation, result=result)
+            metrics.histogram(
+                "sheets_request_seconds", "Seconds of every google sheets request", ("operation", )
+            ).observe(time.perf_counter() - start_time, operation=operation)
+
+    def get_data(self, sheet_name="funds", _range="A1:L", value_render_option="FORMATTED_VALUE", refresh=False):
+        """
+        Get the values of a range, formatted values are read from the mirror when it is fresh.
+        param: refresh - Read the sheet from google even if the mirror is fresh
+        return: rows - List of rows or None if the sheet could not be read
+        """
+        if self.mirror is None or value_render_option != "FORMATTED_VALUE":
+            return self.fetch_data(sheet_name, _range, value_render_option)
+
+        first_column, first_row, last_column, last_row = range_to_indexes(_range)
+        if last_column > range_to_indexes(MIRROR_RANGE)[2]:
+            # Columns out of the mirror
+            return self.fetch_data(sheet_name, _range, value_render_option)
+
+        rows = None if refresh else self.mirror.get_rows(self.SPREADSHEET_ID, sheet_name)
+        if rows is None:
+            rows = self.fetch_data(sheet_name, MIRROR_RANGE, value_render_option)
+            if rows is None:
+                return
+
+            self.mirror.set_rows(self.SPREADSHEET_ID, sheet_name, rows)
+
+        return read_grid(rows, first_column, first_row, last_column, last_row)
+
+    def fetch_data(self, sheet_name="funds", _range="A1:L", value_render_option="FORMATTED_VALUE"):
+        from googleapiclient.errors import HttpError
+
+        try:
+            result = self.execute(
+                self.sheet.values().get(
+                    spreadsheetId=self.SPREADSHEET_ID,
+                    range=f'{sheet_name}!{_range}',
+                    valueRenderOption=value_render_option,
+                ),
+                "get",
+            )
 
             array_rows = result.get('values', [])
-            logger.info(f"Obtenidos {len(array_rows)} datos de la hoja {sheet_name}")
+            logger.info("Obtenidos %s datos de la hoja %s", len(array_rows), sheet_name)
 
-        except HttpError as error:
+        except (HttpError, TimeoutError) as error:
             logger.error("Error al obtener los datos de la hoja: %s", error)
             return
 
         return array_rows
 
+    def mirror_write(self, values, sheet_name, _range):
+        """
+        Apply a successful write to the mirror.
+        """
+        if self.mirror is None:
+            return
+
+        first_column, first_row, _, _ = range_to_indexes(_range)
+        self.mirror.write(self.SPREADSHEET_ID, sheet_name, first_column, first_row, values)
+
+    def mirror_invalidate(self, sheet_name):
+        """
+        Forget the mirror of a sheet after a failed write, it may be partially written.
+        """
+        if self.mirror is not None:
+            self.mirror.invalidate(self.SPREADSHEET_ID, sheet_name)
+
     def post_data(self, values, sheet_name="funds", _range=FIST_CELL):
+        from googleapiclient.errors import HttpError
+
         try:
             body = {'values': values}
-            response = self.sheet.values().append(
-                spreadsheetId=self.SPREADSHEET_ID,
-                range=f'{sheet_name}!{_range}',
-                valueInputOption=self.APPEND_CONST,
-                body=body
-            ).execute()
+            response = self.execute(
+                self.sheet.values().append(
+                    spreadsheetId=self.SPREADSHEET_ID,
+                    range=f'{sheet_name}!{_range}',
+                    valueInputOption=self.APPEND_CONST,
+                    body=body
+                ),
+                "append",
+            )
 
-            logger.info(f"{response.get('updates').get('updatedCells')} celdas añadidas")
+            logger.info("%s celdas añadidas", response.get('updates').get('updatedCells'))
 
-        except HttpError as error:
+        except (HttpError, TimeoutError) as error:
             logger.error("Error al actualizar la hoja: %s", error)
+            self.mirror_invalidate(sheet_name)
             return
 
+        if self.mirror is not None:
+            first_column = range_to_indexes(_range)[0]
+            self.mirror.append(self.SPREADSHEET_ID, sheet_name, first_column, values)
+
         return response.get('updates').get('updatedCells')
 
     def update_data(self, values, sheet_name="funds", _range=FIST_CELL):
+        from googleapiclient.errors import HttpError
+
         try:
-            body = {'values': values}
-            response = self.sheet.values().update(
-                spreadsheetId=self.SPREADSHEET_ID,
-                range=f'{sheet_name}!{_range}',
-                valueInputOption=self.APPEND_CONST,
-                body=body
-            ).execute()
+            # Empty rows leave the cells of the sheet untouched
+            body = {'values': [row if row is not None else [] for row in values]}
+            response = self.execute(
+                self.sheet.values().update(
+                    spreadsheetId=self.SPREADSHEET_ID,
+                    range=f'{sheet_name}!{_range}',
+                    valueInputOption=self.APPEND_CONST,
+                    body=body
+                ),
+                "update",
+            )
 
-            logger.info(f"{response.get('updatedCells')} cells updated.")
+            logger.info("%s cells updated.", response.get('updatedCells'))
 
-        except HttpError as error:
+        except (HttpError, TimeoutError) as error:
             logger.error("Error al actualizar la hoja: %s", error)
+            self.mirror_invalidate(sheet_name)
             return
 
+        self.mirror_write(values, sheet_name, _range)
+
         return response.get('updatedCells')
 
-    def response_to_dicctionary(self, response):
-        data = []
-
-        # Exclude the first row
-        for fund in response:
-            new = {
-                "class": fund[0],
-                "name": fund[1],
-                "trading_currency": fund[2],
-                "fund_class_cafci_code": fund[3],
-                "fund_cafci_code": fund[4],
-                "rescue_time": fund[5],
-                "risk_level": fund[6],
-                "tna": fund[7],
-                "tea": fund[8],
-                "tem": fund[9],
-                "monthly_performance": fund[10],
-                "six_month_performance": fund[11],
-                "year_performance": fund[12],
-                "updated": fund[13],
+    def batch_update_data(self, ranges_values, sheet_name="funds", batch_size=MAX_BATCH_RANGES):
+        """
+        Update many ranges of a sheet with as few api calls as possible.
+        param: ranges_values - List of (range, values), example: [("H2:N2", [[...]]), ("H7:N7", [[...]])]
+        param: batch_size - Max amount of ranges sent on each batchUpdate call
+        return: updated_cells - Total amount of updated cells
+        raise: SheetWriteError with the amount of ranges written, in order, before the call that failed
+        """
+        from googleapiclient.errors import HttpError
+
+        updated_cells = 0
+
+        for start in range(0, len(ranges_values), batch_size):
+            batch = ranges_values[start:start + batch_size]
+            body = {
+                'valueInputOption': self.APPEND_CONST,
+                'data': [
+                    {'range': f'{sheet_name}!{_range}', 'values': values}
+                    for _range, values in batch
+                ],
             }
 
-            data.append(new)
+            try:
+                response = self.execute(
+                    self.sheet.values().batchUpdate(
+                        spreadsheetId=self.SPREADSHEET_ID,
+                        body=body
+                    ),
+                    "batch_update",
+                )
+
+            except (HttpError, TimeoutError) as error:
+                logger.error("Error al actualizar la hoja: %s", error)
+                if write_may_be_applied(error):
+                    self.mirror_invalidate(sheet_name)
+                raise SheetWriteError(
+                    f"{start} of {len(ranges_values)} ranges written: {error}",
+                    written_ranges=start,
+                    updated_cells=updated_cells,
+                ) from error
+
+            for _range, values in batch:
+                self.mirror_write(values, sheet_name, _range)
+
+            updated_cells += response.get('totalUpdatedCells', 0)
+            logger.info("%s cells updated in %s ranges.", response.get('totalUpdatedCells'), len(batch))
+
+        return updated_cells
+
+    def get_changed_ranges(self, current_values, values, _range):
+        """
+        Compare the values of a range with the new ones and get the ranges that changed.
+        Contiguous changed cells of a row are written together, and equal spans of consecutive rows are merged.
+        return: changed_ranges, skipped_cells - List of (range, values) and amount of unchanged cells
+        """
+        start_cell = _range.split(":")[0]
+        start_column, start_row = split_cell(start_cell)
+        start_index = column_to_index(start_column)
+        start_row = start_row or 1
+
+        runs = []  # (first_column, last_column, row, values)
+        skipped_cells = 0
+
+        for row_offset, row in enumerate(values):
+            if row is None:
+                # Rows without new values, example: funds not fetched before the deadline
+                continue
+
+            current_row = current_values[row_offset] if row_offset < len(current_values) else []
+            run_start = None
 
-        return data
+            for column_offset in range(len(row) + 1):
+                changed = False
+                if column_offset < len(row):
+                    current_value = current_row[column_offset] if column_offset < len(current_row) else None
+                    changed = not cells_are_equal(current_value, row[column_offset])
+                    skipped_cells += not changed
+
+                if changed and run_start is None:
+                    run_start = column_offset
+                elif not changed and run_start is not None:
+                    runs.append((run_start, column_offset - 1, start_row + row_offset, row[run_start:column_offset]))
+                    run_start = None
+
+        # Merge the runs with the same columns on consecutive rows
+        merged_runs: list = []  # [first_column, last_column, first_row, last_row, [values of every row]]
+        runs.sort(key=lambda run: (run[0], run[1], run[2]))
+        for first_column, last_column, row, run_values in runs:
+            last = merged_runs[-1] if merged_runs else None
+
+            if last and last[0] == first_column and last[1] == last_column and last[3] == row - 1:
+                last[3] = row
+                last[4].append(run_values)
+            else:
+                merged_runs.append([first_column, last_column, row, row, [run_values]])
+
+        changed_ranges = [
+            (
+                f"{index_to_column(start_index + first_column)}{first_row}:"
+                f"{index_to_column(start_index + last_column)}{last_row}",
+                run_values,
+            )
+            for first_column, last_column, first_row, last_row, run_values in merged_runs
+        ]
+
+        return changed_ranges, skipped_cells
+
+    def diff_update_data(self, values, sheet_name="funds", _range=FIST_CELL):
+        """
+        Update a range writing only the cells that are different from the current sheet values.
+        return: {"updated_cells": int, "skipped_cells": int} or None if the sheet could not be read
+        """
+        current_values = self.get_data(
+            sheet_name=sheet_name,
+            _range=_range,
+            value_render_option="UNFORMATTED_VALUE",
+        )
+        if current_values is None:
+            return
+
+        return self.diff_update_rows(current_values, values, sheet_name=sheet_name, _range=_range)
+
+    def diff_update_rows(self, current_values, values, sheet_name="funds", _range=FIST_CELL):
+        """
+        Update a range writing only the cells that are different from current_values, read before.
+        return: {"updated_cells": int, "skipped_cells": int, "failed_ranges": int}
+        """
+        changed_ranges, skipped_cells = self.get_changed_ranges(current_values, values, _range)
+        logger.info("%s changed ranges, %s unchanged cells skipped", len(changed_ranges), skipped_cells)
+
+        updated_cells = 0
+        failed_ranges = 0
+        if changed_ranges:
+            try:
+                updated_cells = self.batch_update_data(changed_ranges, sheet_name=sheet_name)
+            except SheetWriteError as error:
+                updated_cells = error.updated_cells
+                failed_ranges = len(changed_ranges) - error.written_ranges
+
+        return {
+            "updated_cells": updated_cells,
+            "skipped_cells": skipped_cells,
+            "failed_ranges": failed_ranges,
+        }
+
+    def response_to_dicctionary(self, response):
+        # Short rows get None on their missing cells
+        table = FundTable(DICTIONARY_KEYS, response)
+        return [record.to_dict() for record in table]
+
+    def get_fund_table(self, sheet_name="funds", _range="A1:N", refresh=False):
+        """
+        Get the funds of a sheet as a FundTable, the range must start on the header row.
+        """
+        response = self.get_data(sheet_name=sheet_name, _range=_range, refresh=refresh)
+        if response is None:
+            return
+
+        first_row = split_cell(_range.split(":")[0])[1] or 1
+        return FundTable.from_response(response, first_row=first_row + 1)
 
     def get_all_rows_formated(self):
         response = self.get_data()
@@ -117,6 +452,9 @@ class APISpreadsheet:
     def find_new_funds(self, array_row, dictionary):
         new_funds_array = []
 
+        if isinstance(dictionary, FundTable):
+            dictionary = dictionary.get_codes()
+
         for x in array_row:
 
             if x[3] in dictionary:
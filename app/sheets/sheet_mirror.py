@@ -0,0 +1,227 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from ..common.metrics import (
+    get_metrics,
+)
+from ..common.utils import (
+    get_logger,
+    get_data_path,
+)
+
+
+logger = get_logger(__name__)
+
+MIRROR_MAX_AGE = 10 * 60  # Seconds a mirrored sheet is used before reading it again from google
+MIRROR_RANGE = "A1:O"  # Every column of the funds sheet, logo_url included
+
+_mirrors: dict = {}  # pid: SheetMirror
+
+
+def read_grid(rows: list, first_column: int, first_row: int, last_column: int,
+              last_row: Optional[int] = None) -> list:
+    """
+    Get the values of a range from a grid of rows, like google does: without the empty cells and rows at the end.
+    Indexes are zero based and inclusive, last_row None reads until the last row.
+    """
+    values = []
+    for row in rows[first_row:None if last_row is None else last_row + 1]:
+        row = list(row[first_column:last_column + 1])
+        while row and row[-1] in ("", None):
+            row.pop()
+
+        values.append(row)
+
+    while values and not values[-1]:
+        values.pop()
+
+    return values
+
+
+def write_grid(rows: list, first_column: int, first_row: int, values: list):
+    """
+    Write values into a grid of rows starting on a cell, None and empty rows are skipped.
+    """
+    for row_offset, row_values in enumerate(values):
+        if not row_values:
+            continue
+
+        row_index = first_row + row_offset
+        while len(rows) <= row_index:
+            rows.append([])
+
+        row = rows[row_index]
+        for column_offset, value in enumerate(row_values):
+            if value is None:
+                continue
+
+            column_index = first_column + column_offset
+            while len(row) <= column_index:
+                row.append("")
+
+            row[column_index] = str(value)
+
+
+class SheetMirror():
+    """Local copy of the formatted values of the sheets, shared by every APISpreadsheet.
+
+    A sheet is downloaded once and the reads are answered from the copy
+    while it is younger than `max_age` seconds. Successful writes are applied
+    to the copy too, so it keeps matching the sheet. The values written are
+    kept as sent, not with the format google would apply.
+    """
+    DB_PATH = "sheets.sqlite3"
+
+    def __init__(self, path=None, max_age: float = MIRROR_MAX_AGE):
+        self.path = path or get_data_path(self.DB_PATH)
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.sheets: dict = {}  # (spreadsheet_id, sheet_name): (fetched_at, rows)
+        self.dirty: set = set()  # Sheets written since the last flush
+
+        # Writes can come from the thread of the streamed updates
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.create_tables()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sheets (
+                    spreadsheet_id TEXT NOT NULL,
+                    sheet_name TEXT NOT NULL,
+                    rows TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (spreadsheet_id, sheet_name)
+                )
+                """
+            )
+
+    def load(self, spreadsheet_id: str, sheet_name: str):
+        """
+        Get the mirrored rows of a sheet.
+        return: fetched_at, rows - None, None if the sheet was never mirrored
+        """
+        key = (spreadsheet_id, sheet_name)
+        if key not in self.sheets:
+            row = self.connection.execute(
+                "SELECT fetched_at, rows FROM sheets WHERE spreadsheet_id = ? AND sheet_name = ?", key
+            ).fetchone()
+            if row is None:
+                return None, None
+
+            self.sheets[key] = (row[0], json.loads(row[1]))
+
+        return self.sheets[key]
+
+    def save(self, spreadsheet_id: str, sheet_name: str, rows: list, fetched_at: float):
+        self.sheets[(spreadsheet_id, sheet_name)] = (fetched_at, rows)
+        self.dirty.discard((spreadsheet_id, sheet_name))
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO sheets (spreadsheet_id, sheet_name, rows, fetched_at) VALUES (?, ?, ?, ?)",
+                (spreadsheet_id, sheet_name, json.dumps(rows), fetched_at),
+            )
+
+    def get_rows(self, spreadsheet_id: str, sheet_name: str):
+        """
+        Get the rows of a sheet if the mirror is fresh.
+        return: rows or None if the sheet has to be read again from google
+        """
+        with self.lock:
+            fetched_at, rows = self.load(spreadsheet_id, sheet_name)
+
+        reads = get_metrics().counter("sheets_mirror_reads_total", "Sheet reads answered by the mirror", ("result", ))
+        if rows is None or time.time() - fetched_at > self.max_age:
+            self.misses += 1
+            reads.inc(result="miss")
+            return None
+
+        self.hits += 1
+        reads.inc(result="hit")
+        return rows
+
+    def set_rows(self, spreadsheet_id: str, sheet_name: str, rows: list):
+        """
+        Replace the mirror of a sheet with the rows just read from google.
+        """
+        with self.lock:
+            self.save(spreadsheet_id, sheet_name, [[str(value) for value in row] for row in rows], time.time())
+
+    def write(self, spreadsheet_id: str, sheet_name: str, first_column: int, first_row: int, values: list):
+        """
+        Apply a successful write to the mirror, sheets never mirrored are ignored.
+        """
+        with self.lock:
+            fetched_at, rows = self.load(spreadsheet_id, sheet_name)
+            if rows is None:
+                return
+
+            # Saved on flush, the streamed updates write the same sheet many times
+            write_grid(rows, first_column, first_row, values)
+            self.dirty.add((spreadsheet_id, sheet_name))
+
+    def append(self, spreadsheet_id: str, sheet_name: str, first_column: int, values: list):
+        with self.lock:
+            fetched_at, rows = self.load(spreadsheet_id, sheet_name)
+            if rows is None:
+                return
+
+            write_grid(rows, first_column, len(rows), values)
+            self.dirty.add((spreadsheet_id, sheet_name))
+
+    def invalidate(self, spreadsheet_id: str, sheet_name: str):
+        """
+        Forget a sheet, the next read goes to google.
+        """
+        with self.lock:
+            self.sheets.pop((spreadsheet_id, sheet_name), None)
+            self.dirty.discard((spreadsheet_id, sheet_name))
+            with self.connection:
+                self.connection.execute(
+                    "DELETE FROM sheets WHERE spreadsheet_id = ? AND sheet_name = ?", (spreadsheet_id, sheet_name)
+                )
+
+    def flush(self):
+        """
+        Save the sheets written since the last flush.
+        """
+        with self.lock:
+            for spreadsheet_id, sheet_name in list(self.dirty):
+                fetched_at, rows = self.sheets[(spreadsheet_id, sheet_name)]
+                self.save(spreadsheet_id, sheet_name, rows, fetched_at)
+
+    def get_stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+def get_sheet_mirror(max_age: Optional[float] = None) -> SheetMirror:
+    """
+    Get the mirror shared by every APISpreadsheet of the current process.
+    param: max_age - Change the seconds a mirrored sheet is used
+    """
+    pid = os.getpid()
+    mirror = _mirrors.get(pid)
+
+    if mirror is None:
+        mirror = SheetMirror(max_age=MIRROR_MAX_AGE if max_age is None else max_age)
+        _mirrors[pid] = mirror
+        atexit.register(mirror.flush)
+    elif max_age is not None:
+        mirror.max_age = max_age
+
+    return mirror
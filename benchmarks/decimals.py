@@ -0,0 +1,104 @@
+"""
+Microbenchmark of normalize_decimals and normalize_many against the previous implementation.
+
+usage: python -m benchmarks.decimals [values]
+"""
+import logging
+import random
+import sys
+import time
+from decimal import (
+    Decimal,
+    InvalidOperation,
+    localcontext,
+    ROUND_DOWN,
+)
+
+from app.common.constants import DECIMAL_ZERO
+from app.common.utils import (
+    normalize_decimals,
+    normalize_many,
+)
+
+
+DEFAULT_VALUES = 200000
+
+
+def legacy_normalize_decimals(value, decimals_to_round=8, method=ROUND_DOWN):
+    """normalize_decimals before the quantum cache, used as reference."""
+    new_value = value
+    try:
+        if value is None:
+            return DECIMAL_ZERO
+
+        if not isinstance(value, str) and not isinstance(value, Decimal):
+            value = str(value)
+
+        if not isinstance(value, Decimal):
+            new_value = Decimal(value)
+
+        decimals = Decimal(f'0.{"0" * decimals_to_round}')
+        with localcontext() as ctx:
+            ctx.rounding = method
+            new_value = new_value.quantize(decimals)
+    except InvalidOperation:
+        new_value = DECIMAL_ZERO
+
+    return new_value
+
+
+def get_random_values(amount: int) -> list:
+    random.seed(amount)
+    values = []
+
+    for _ in range(amount):
+        kind = random.random()
+        if kind < 0.5:
+            values.append(Decimal(random.randint(-10 ** 12, 10 ** 12)) / 10 ** random.randint(0, 9))
+        elif kind < 0.7:
+            values.append(str(round(random.uniform(-1000, 1000), random.randint(0, 10))))
+        elif kind < 0.85:
+            values.append(random.uniform(-1000, 1000))
+        elif kind < 0.95:
+            values.append(random.randint(-10 ** 6, 10 ** 6))
+        else:
+            values.append(random.choice([None, "", "abc", "NaN", True, "1e5"]))
+
+    return values
+
+
+def measure(function, values) -> float:
+    start_time = time.perf_counter()
+    function(values)
+    return time.perf_counter() - start_time
+
+
+def main(amount: int = DEFAULT_VALUES):
+    # Invalid values log a warning, keep the logging out of the measurements
+    logging.disable(logging.WARNING)
+    values = get_random_values(amount)
+
+    for decimals in (2, 8):
+        legacy = [legacy_normalize_decimals(value, decimals) for value in values]
+        single = [normalize_decimals(value, decimals) for value in values]
+        bulk = normalize_many(values, decimals)
+
+        # Compare the representation so sign, exponent and NaN are checked too
+        mismatches = sum(
+            1 for expected, *results in zip(legacy, single, bulk)
+            if any(repr(result) != repr(expected) for result in results)
+        )
+
+        legacy_time = measure(lambda values: [legacy_normalize_decimals(value, decimals) for value in values], values)
+        single_time = measure(lambda values: [normalize_decimals(value, decimals) for value in values], values)
+        bulk_time = measure(lambda values: normalize_many(values, decimals), values)
+
+        print(f"values: {amount}, decimals: {decimals}")
+        print(f"legacy normalize_decimals: {legacy_time / amount * 1e9:.0f}ns per value")
+        print(f"normalize_decimals: {single_time / amount * 1e9:.0f}ns per value")
+        print(f"normalize_many: {bulk_time / amount * 1e9:.0f}ns per value")
+        print(f"mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_VALUES)
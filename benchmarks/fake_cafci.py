@@ -0,0 +1,192 @@
+"""
+Local http server that answers like the cafci api, used by the throughput benchmarks.
+
+Prices are deterministic: every fund class grows at its own daily rate, so the
+same url always returns the same answer.
+"""
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+from urllib.parse import urlsplit
+
+
+BASE_DATE = date(2020, 1, 1)
+BASE_VALUE = 1000.0  # Value of 1000 shares on BASE_DATE
+HOST = "127.0.0.1"
+RATE_REGEX = re.compile(r"^/fondo/(\d+)/clase/(\d+)/(rendimiento|cuotapartes)/([\d-]+)/([\d-]+)/?$")
+
+
+def get_class_id(fund_id: int) -> int:
+    return fund_id * 10 + 1
+
+
+def get_daily_rate(class_id: int) -> float:
+    # Between -0.05% and 0.2% a day
+    return ((class_id * 7919) % 2500 - 500) / 1000000
+
+
+def get_value(class_id: int, day: date) -> float:
+    return round(BASE_VALUE * (1 + get_daily_rate(class_id)) ** (day - BASE_DATE).days, 6)
+
+
+def is_business_day(day: date) -> bool:
+    return day.weekday() < 5
+
+
+class FakeCafciState():
+    """Configuration and request counters shared by the handler threads."""
+
+    def __init__(self, fund_count: int, latency: float = 0, error_rate: float = 0, seed: int = 0):
+        self.fund_count = fund_count
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests: Counter = Counter()  # (endpoint, status): requests
+
+    def count(self, endpoint: str, status: int):
+        with self.lock:
+            self.requests[(endpoint, status)] += 1
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def get_total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    def get_fund_groups(self) -> list:
+        fund_groups = []
+        for fund_id in range(1, self.fund_count + 1):
+            class_id = get_class_id(fund_id)
+            fund_groups.append({
+                "id": str(fund_id),
+                "nombre": f"Fondo Benchmark {fund_id}",
+                "diasLiquidacion": str(fund_id % 4),
+                "monedaId": "1" if fund_id % 5 else "2",
+                "tipoRenta": {"id": str(fund_id % 8 + 1)},
+                "clase_fondos": [
+                    {"id": str(class_id), "nombre": f"Fondo Benchmark {fund_id} - Clase A"},
+                    {"id": str(class_id + 1), "nombre": f"Fondo Benchmark {fund_id} - Clase B"},
+                ],
+            })
+
+        return fund_groups
+
+
+class FakeCafciHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real api
+    state: FakeCafciState  # Set on the handler class of every server
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_server_error(self):
+        body = b"<html>Internal Server Error</html>"
+        self.send_response(500)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.state
+        path = urlsplit(self.path).path
+
+        if state.latency:
+            time.sleep(state.latency)
+
+        match = RATE_REGEX.match(path)
+        endpoint = match.group(3) if match else ("fondo" if path.rstrip("/") == "/fondo" else "other")
+
+        if state.should_fail():
+            state.count(endpoint, 500)
+            self.send_server_error()
+            return
+
+        if endpoint == "fondo":
+            state.count(endpoint, 200)
+            self.send_json(200, {"data": state.get_fund_groups()})
+            return
+
+        if match is None:
+            state.count(endpoint, 404)
+            self.send_json(404, {"error": "not-found"})
+            return
+
+        class_id = int(match.group(2))
+        start_date = date.fromisoformat(match.group(4))
+        end_date = date.fromisoformat(match.group(5))
+
+        if start_date >= end_date or start_date < BASE_DATE:
+            state.count(endpoint, 200)
+            self.send_json(200, {"error": "wrong-dates"})
+            return
+
+        state.count(endpoint, 200)
+        if endpoint == "rendimiento":
+            first_value = get_value(class_id, start_date)
+            last_value = get_value(class_id, end_date)
+            self.send_json(200, {"data": {
+                "desde": {"fecha": start_date.strftime("%d/%m/%Y"), "valor": first_value},
+                "hasta": {"fecha": end_date.strftime("%d/%m/%Y"), "valor": last_value},
+                "rendimiento": f"{(last_value / first_value - 1) * 100:.2f}",
+            }})
+        else:
+            days = (end_date - start_date).days + 1
+            self.send_json(200, {"data": [
+                {"fecha": day.isoformat(), "valor": get_value(class_id, day)}
+                for day in (date.fromordinal(start_date.toordinal() + offset) for offset in range(days))
+                if is_business_day(day)
+            ]})
+
+
+class FakeCafciHTTPServer(ThreadingHTTPServer):
+    # Bigger listen backlog, with the default of 5 concurrent clients wait for syn retransmissions
+    request_queue_size = 1024
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients cancelled by a deadline close their connections mid response
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeCafciServer():
+    """Run the fake cafci api on a local port in a background thread."""
+
+    def __init__(self, fund_count: int, latency: float = 0, error_rate: float = 0, port: int = 0):
+        self.state = FakeCafciState(fund_count, latency=latency, error_rate=error_rate)
+        handler = type("Handler", (FakeCafciHandler, ), {"state": self.state})
+
+        self.server = FakeCafciHTTPServer((HOST, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{HOST}:{self.server.server_port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
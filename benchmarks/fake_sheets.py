@@ -0,0 +1,157 @@
+"""
+In process fake of the google sheets values api, used by the throughput benchmarks.
+
+Only the calls made by APISpreadsheet are implemented:
+spreadsheets().values().get/update/append/batchUpdate(...).execute()
+"""
+from collections import Counter
+from typing import Optional
+
+from app.sheets.sheet_api import (
+    column_to_index,
+    split_cell,
+)
+
+
+def parse_range(a1_range: str):
+    """
+    Parse a range, example: "funds!H2:N" -> ("funds", 7, 1, 13, None), indexes are zero based.
+    """
+    sheet_name, cells = a1_range.split("!")
+    start_cell, _, end_cell = cells.partition(":")
+    start_column, start_row = split_cell(start_cell)
+    end_column, end_row = split_cell(end_cell or start_cell)
+
+    return (
+        sheet_name,
+        column_to_index(start_column),
+        (start_row or 1) - 1,
+        column_to_index(end_column),
+        end_row - 1 if end_row else None,
+    )
+
+
+def to_user_entered(value):
+    """Numbers written with USER_ENTERED are stored as numbers, like google does."""
+    if isinstance(value, str):
+        try:
+            return float(value) if "." in value else int(value)
+        except ValueError:
+            return value
+
+    return value
+
+
+class Request():
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def execute(self):
+        return self.function(*self.args)
+
+
+class FakeValues():
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def get(self, spreadsheetId, range, valueRenderOption="FORMATTED_VALUE", **kwargs):
+        return Request(self.spreadsheet.get, range, valueRenderOption)
+
+    def update(self, spreadsheetId, range, valueInputOption, body, **kwargs):
+        return Request(self.spreadsheet.update, range, body["values"])
+
+    def append(self, spreadsheetId, range, valueInputOption, body, **kwargs):
+        return Request(self.spreadsheet.append, range, body["values"])
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        return Request(self.spreadsheet.batch_update, body["data"])
+
+
+class FakeSpreadsheets():
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def values(self):
+        return FakeValues(self.spreadsheet)
+
+
+class FakeSheetsService():
+    """Keeps every sheet as a list of rows and counts the api calls."""
+
+    def __init__(self, sheets: Optional[dict] = None):
+        self.sheets = {name: [list(row) for row in rows] for name, rows in (sheets or {}).items()}
+        self.calls: Counter = Counter()  # Api method: calls
+        self.updated_cells = 0
+
+    def spreadsheets(self):
+        return FakeSpreadsheets(self)
+
+    def get_rows(self, sheet_name: str) -> list:
+        return self.sheets.setdefault(sheet_name, [])
+
+    def write(self, sheet_name: str, first_column: int, first_row: int, values: list) -> int:
+        rows = self.get_rows(sheet_name)
+        cells = 0
+
+        for row_offset, row_values in enumerate(values):
+            row_index = first_row + row_offset
+            while len(rows) <= row_index:
+                rows.append([])
+
+            row = rows[row_index]
+            for column_offset, value in enumerate(row_values):
+                column_index = first_column + column_offset
+                while len(row) <= column_index:
+                    row.append("")
+
+                row[column_index] = to_user_entered(value)
+                cells += 1
+
+        self.updated_cells += cells
+        return cells
+
+    def get(self, a1_range: str, value_render_option: str):
+        self.calls["get"] += 1
+        sheet_name, first_column, first_row, last_column, last_row = parse_range(a1_range)
+        rows = self.get_rows(sheet_name)[first_row:None if last_row is None else last_row + 1]
+
+        values = []
+        for row in rows:
+            row = list(row[first_column:last_column + 1])
+            while row and row[-1] in ("", None):
+                row.pop()
+
+            if value_render_option == "FORMATTED_VALUE":
+                row = ["" if value is None else str(value) for value in row]
+
+            values.append(row)
+
+        # Google doesn't return the empty rows at the end of the range
+        while values and not values[-1]:
+            values.pop()
+
+        return {"values": values} if values else {}
+
+    def update(self, a1_range: str, values: list):
+        self.calls["update"] += 1
+        sheet_name, first_column, first_row, _, _ = parse_range(a1_range)
+
+        return {"updatedCells": self.write(sheet_name, first_column, first_row, values)}
+
+    def append(self, a1_range: str, values: list):
+        self.calls["append"] += 1
+        sheet_name, first_column, _, _, _ = parse_range(a1_range)
+        first_row = len(self.get_rows(sheet_name))
+
+        return {"updates": {"updatedCells": self.write(sheet_name, first_column, first_row, values)}}
+
+    def batch_update(self, data: list):
+        self.calls["batchUpdate"] += 1
+        updated_cells = 0
+
+        for value_range in data:
+            sheet_name, first_column, first_row, _, _ = parse_range(value_range["range"])
+            updated_cells += self.write(sheet_name, first_column, first_row, value_range["values"])
+
+        return {"totalUpdatedCells": updated_cells}
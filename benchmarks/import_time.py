@@ -0,0 +1,68 @@
+"""
+Measure the time to import the cli and check it stays inside the startup budget.
+
+Every measure runs in a new interpreter so nothing is cached in sys.modules.
+usage: python -m benchmarks.import_time [runs]
+"""
+import statistics
+import subprocess
+import sys
+
+
+DEFAULT_RUNS = 5
+IMPORT_TIME_BUDGET = 0.15  # Seconds to import app.main, it was ~0.38s with the eager imports
+# Modules that only the commands using them should import
+HEAVY_MODULES = [
+    "aiohttp",
+    "emoji",
+    "google.oauth2.service_account",
+    "googleapiclient.discovery",
+    "googleapiclient.errors",
+    "numpy",
+    "requests",
+]
+
+MEASURE_CODE = """
+import sys
+import time
+start_time = time.perf_counter()
+import app.main
+elapsed_time = time.perf_counter() - start_time
+loaded = [module for module in {heavy_modules!r} if module in sys.modules]
+print(elapsed_time)
+print(",".join(loaded))
+"""
+
+
+def measure_import():
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_CODE.format(heavy_modules=HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.splitlines()
+
+    loaded = [module for module in output[1].split(",") if module] if len(output) > 1 else []
+    return float(output[0]), loaded
+
+
+def main(runs: int = DEFAULT_RUNS):
+    times = []
+    loaded = []
+    for _ in range(runs):
+        elapsed_time, loaded = measure_import()
+        times.append(elapsed_time)
+
+    median = statistics.median(times)
+    print(f"import app.main: median {median * 1000:.1f}ms, budget {IMPORT_TIME_BUDGET * 1000:.0f}ms")
+    print(f"heavy modules loaded: {loaded or 'none'}")
+
+    if median > IMPORT_TIME_BUDGET or loaded:
+        print("Import time budget exceeded")
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RUNS))
@@ -0,0 +1,58 @@
+"""
+Benchmark the vectorized proyections against the scalar FundClassParser.get_proyection.
+
+usage: python -m benchmarks.projections [funds]
+"""
+import random
+import sys
+import time
+from decimal import Decimal
+
+from app.models import FundClassParser
+
+
+DEFAULT_FUNDS = 10000
+
+
+def get_random_prices(funds: int):
+    random.seed(funds)
+    initial_prices = []
+    final_prices = []
+
+    for _ in range(funds):
+        # Cafci informs the value of 1000 shares with up to 6 decimals
+        initial_value = random.randint(1000000, 5000000000000)
+        # Weekly variations between -5% and 5%
+        final_value = int(initial_value * random.uniform(0.95, 1.05))
+        initial_prices.append(Decimal(initial_value) / 1000000000)
+        final_prices.append(Decimal(final_value) / 1000000000)
+
+    return initial_prices, final_prices
+
+
+def main(funds: int = DEFAULT_FUNDS):
+    parser = FundClassParser()
+    initial_prices, final_prices = get_random_prices(funds)
+
+    start_time = time.perf_counter()
+    scalar = [
+        parser.get_proyection(initial_price, final_price)
+        for initial_price, final_price in zip(initial_prices, final_prices)
+    ]
+    scalar_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    vectorized = parser.get_proyections(initial_prices, final_prices)
+    vectorized_time = time.perf_counter() - start_time
+
+    mismatches = sum(1 for scalar_row, vectorized_row in zip(scalar, vectorized) if scalar_row != vectorized_row)
+
+    print(f"funds: {funds}")
+    print(f"scalar: {scalar_time:.4f}s ({scalar_time / funds * 1e6:.2f}us per fund)")
+    print(f"vectorized: {vectorized_time:.4f}s ({vectorized_time / funds * 1e6:.2f}us per fund)")
+    print(f"speedup: {scalar_time / vectorized_time:.1f}x")
+    print(f"mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_FUNDS)
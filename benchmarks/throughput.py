@@ -0,0 +1,221 @@
+"""
+End to end throughput benchmark of the service entry points against local stand-ins.
+
+Every scenario runs in a new process with the fake sheets service and talks to
+a local fake cafci api, so the measures don't depend on the network.
+usage: python -m benchmarks.throughput --funds 100 1000 --latency 0.05 --scenarios update check
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from typing import Optional
+
+from app.common.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+)
+from .fake_cafci import FakeCafciServer
+
+
+SCENARIOS = ["create", "update", "check"]
+DEFAULT_FUNDS = [100, 1000]
+BROKEN_ROWS_RATE = 10  # One of every BROKEN_ROWS_RATE rows has invalid values on the check scenario
+
+
+def snapshot_metrics(registry: MetricsRegistry) -> dict:
+    """
+    Get the metrics of a scenario as plain data, it can be sent to the parent process.
+    """
+    snapshot = {}
+    for name, metric in list(registry.metrics.items()):
+        with metric.lock:
+            values = [[list(key), value] for key, value in metric.values.items()]
+
+        snapshot[name] = {
+            "type": metric.TYPE,
+            "help": metric.help,
+            "labelnames": list(metric.labelnames),
+            "buckets": list(getattr(metric, "buckets", ())),
+            "values": values,
+        }
+
+    return snapshot
+
+
+def merge_metrics(registry: MetricsRegistry, snapshot: dict):
+    """
+    Add the metrics of a scenario, counters and histograms are added and gauges keep the max.
+    """
+    for name, metric_snapshot in snapshot.items():
+        labelnames = tuple(metric_snapshot["labelnames"])
+        if metric_snapshot["type"] == Histogram.TYPE:
+            histogram = registry.histogram(
+                name, metric_snapshot["help"], labelnames, buckets=tuple(metric_snapshot["buckets"])
+            )
+            if tuple(metric_snapshot["buckets"]) != histogram.buckets:
+                raise ValueError(f"Can't merge {name}, the buckets are different")
+
+            for key, (counts, total, count) in metric_snapshot["values"]:
+                with histogram.lock:
+                    value = histogram.values.setdefault(tuple(key), histogram.new_value())
+                    value[0] = [a + b for a, b in zip(value[0], counts)]
+                    value[1] += total
+                    value[2] += count
+        elif metric_snapshot["type"] == Gauge.TYPE:
+            gauge = registry.gauge(name, metric_snapshot["help"], labelnames)
+            for key, value in metric_snapshot["values"]:
+                with gauge.lock:
+                    gauge.values[tuple(key)] = max(gauge.values.get(tuple(key), value), value)
+        elif metric_snapshot["type"] == Counter.TYPE:
+            counter = registry.counter(name, metric_snapshot["help"], labelnames)
+            for key, value in metric_snapshot["values"]:
+                counter.inc(value, **counter.get_labels(tuple(key)))
+
+
+def get_initial_sheet(scenario: str, server_state) -> dict:
+    from app.models import FundClassParser
+    from app.models.records import DEFAULT_HEADER
+
+    rows = [list(DEFAULT_HEADER)]
+    if scenario == "create":
+        return {"funds": rows}
+
+    parser = FundClassParser()
+    for fund_group in server_state.get_fund_groups():
+        rows.extend(parser.get_fund_classes_by_fund_group(fund_group))
+
+    for index, row in enumerate(rows[1:]):
+        calc_values = ["0.00"] * 6
+        if scenario == "check" and index % BROKEN_ROWS_RATE == 0:
+            calc_values[0] = "None"
+        row[7:13] = calc_values
+
+    return {"funds": rows}
+
+
+def run_scenario(scenario: str, cafci_url: str, server_state, workers: int, rate_limit: float, results,
+                 profile_dir: Optional[str] = None):
+    """
+    Run a scenario inside a child process and send its measures through results.
+    """
+    from app.models import FundClassParser
+    from app.sheets.client import set_sheets_service
+    from app import services
+    from app.common import (
+        metrics,
+        utils,
+    )
+    from app.common.profiling import get_profiler
+    from .fake_sheets import FakeSheetsService
+
+    FundClassParser.BASE_CAFCI_URL = cafci_url
+    # Every scenario starts with its own local stores: a mirror left by another run would answer the reads,
+    # and the checkpoint of an unfinished update of the user must survive the benchmark
+    utils.DATA_DIR = tempfile.mkdtemp()
+    # The run files are not kept, the metrics go back to the parent with the measures
+    metrics.METRICS_DIR = tempfile.mkdtemp()
+    service = FakeSheetsService(get_initial_sheet(scenario, server_state))
+    set_sheets_service(service)
+    if profile_dir:
+        get_profiler().enable(os.path.join(profile_dir, f"{scenario}-{server_state.fund_count}"))
+
+    start_time = time.perf_counter()
+    if scenario == "create":
+        services.create_initial_funds_database()
+    elif scenario == "update":
+        services.update_funds_database(concurrency=workers, use_response_cache=False, rate_limit=rate_limit)
+    elif scenario == "check":
+        services.check_database_integrity(use_response_cache=False, rate_limit=rate_limit)
+    wall_time = time.perf_counter() - start_time
+
+    results.put({
+        "wall_time": wall_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "sheets_calls": dict(service.calls),
+        "sheets_updated_cells": service.updated_cells,
+        "metrics": snapshot_metrics(metrics.get_metrics()),
+    })
+
+
+def run(scenario: str, fund_count: int, latency: float, error_rate: float, workers: int, rate_limit: float,
+        profile_dir: Optional[str] = None) -> dict:
+    context = multiprocessing.get_context("fork")
+
+    with FakeCafciServer(fund_count, latency=latency, error_rate=error_rate) as server:
+        results = context.Queue()
+        process = context.Process(
+            target=run_scenario,
+            args=(scenario, server.url, server.state, workers, rate_limit, results, profile_dir),
+        )
+        process.start()
+        measures = results.get()
+        process.join()
+
+        cafci_requests = server.state.get_total_requests()
+        errors = sum(count for (_, status), count in server.state.requests.items() if status >= 500)
+
+    measures.update({
+        "scenario": scenario,
+        "funds": fund_count,
+        "cafci_requests": cafci_requests,
+        "cafci_errors": errors,
+        "requests_per_second": cafci_requests / measures["wall_time"] if measures["wall_time"] else 0,
+        "sheets_api_calls": sum(measures["sheets_calls"].values()),
+    })
+    return measures
+
+
+def main():
+    arguments_parser = argparse.ArgumentParser(description=__doc__)
+    arguments_parser.add_argument("--funds", type=int, nargs="+", default=DEFAULT_FUNDS)
+    arguments_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    arguments_parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every response")
+    arguments_parser.add_argument("--error-rate", type=float, default=0, help="Fraction of 500 responses")
+    arguments_parser.add_argument("--workers", type=int, default=100, help="Max cafci requests in flight")
+    arguments_parser.add_argument("--rate-limit", type=float, default=0, help="Max cafci requests per second")
+    arguments_parser.add_argument("--output", help="Write the measures to this json file")
+    arguments_parser.add_argument("--profile", metavar="DIR", help="Profile every scenario into DIR/<scenario>-<funds>")
+    arguments_parser.add_argument("--metrics-dir", help="Write the metrics of every scenario added together here")
+    arguments_parser.add_argument("--verbose", action="store_true", help="Keep the service logs")
+    args = arguments_parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    all_measures = []
+    all_metrics = MetricsRegistry()
+    all_metrics.command = "benchmark"
+    all_metrics.started_at = time.time()
+    print(f"{'scenario':<10}{'funds':>8}{'wall s':>10}{'req/s':>10}{'cafci':>10}{'errors':>8}"
+          f"{'sheets':>8}{'rss MB':>10}")
+
+    for fund_count in args.funds:
+        for scenario in args.scenarios:
+            measures = run(
+                scenario, fund_count, args.latency, args.error_rate, args.workers, args.rate_limit, args.profile
+            )
+            merge_metrics(all_metrics, measures.pop("metrics"))
+            all_measures.append(measures)
+            print(
+                f"{scenario:<10}{fund_count:>8}{measures['wall_time']:>10.2f}"
+                f"{measures['requests_per_second']:>10.1f}{measures['cafci_requests']:>10}"
+                f"{measures['cafci_errors']:>8}{measures['sheets_api_calls']:>8}{measures['peak_rss_mb']:>10.1f}"
+            )
+
+    if args.metrics_dir:
+        all_metrics.write(args.metrics_dir)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(all_measures, output_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
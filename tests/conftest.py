@@ -0,0 +1,74 @@
+from typing import Optional
+
+import pytest
+
+from app.common import utils
+from app.models import FundClassParser
+from app.models.rate_limit import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """
+    Local stores of every test inside its own directory, the ones of the user are never touched.
+    """
+    from app.common import metrics
+
+    monkeypatch.setattr(utils, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path / "metrics"))
+    return tmp_path
+
+
+@pytest.fixture
+def sheets_service(data_dir, monkeypatch):
+    """
+    Install an in memory sheets service with a mirror of its own, call it with the sheets: {name: rows}.
+    """
+    from app.sheets import sheet_mirror
+    from app.sheets.client import set_sheets_service
+    from benchmarks.fake_sheets import FakeSheetsService
+
+    monkeypatch.setattr(sheet_mirror, "_mirrors", {})
+
+    def install(sheets: dict) -> FakeSheetsService:
+        service = FakeSheetsService(sheets)
+        set_sheets_service(service)
+        return service
+
+    yield install
+    set_sheets_service(None)
+
+
+@pytest.fixture
+def cafci_server(monkeypatch):
+    """
+    Local fake cafci api with 20 funds, the parsers of the test ask it instead of cafci.
+    """
+    from benchmarks.fake_cafci import FakeCafciServer
+
+    with FakeCafciServer(20) as server:
+        monkeypatch.setattr(FundClassParser, "BASE_CAFCI_URL", server.url)
+        yield server
+
+
+@pytest.fixture
+def parser():
+    """
+    Parser without rate limit, the tests never reach cafci.
+    """
+    return FundClassParser(rate_limiter=RateLimiter(rate=0))
+
+
+def make_fund_row(index: int, calc_values: Optional[list] = None) -> list:
+    """
+    Row of the funds sheet, DEFAULT_HEADER layout.
+    """
+    calc_values = calc_values or ["1.00", "1.00", "1.00", "1.00", "1.00", "1.00", "01-01-2024"]
+    return ["A", f"Fondo {index}", "ARS", str(index * 10), str(index), 24, 1, *calc_values, ""]
+
+
+def make_fund_data(index: int) -> tuple:
+    """
+    Fetched data of a fund: first_price, last_price, monthly, six month and year performance.
+    """
+    return (100, 100 + index % 7, index, index * 2, index * 3)
@@ -0,0 +1,49 @@
+import requests
+
+from benchmarks import throughput
+from benchmarks.fake_cafci import FakeCafciServer
+from benchmarks.fake_sheets import (
+    FakeSheetsService,
+    parse_range,
+)
+
+
+def test_parse_range():
+    assert parse_range("funds!H2:N") == ("funds", 7, 1, 13, None)
+    assert parse_range("funds!B3") == ("funds", 1, 2, 1, 2)
+
+
+def test_fake_sheets_reads_like_google():
+    service = FakeSheetsService({"funds": [["class", "name"], ["A", "Fondo 1", ""], [], [""]]})
+    values = service.spreadsheets().values()
+
+    assert values.get(spreadsheetId="", range="funds!A2:C").execute() == {"values": [["A", "Fondo 1"]]}
+    assert values.get(spreadsheetId="", range="funds!A5:C").execute() == {}
+
+    values.append(spreadsheetId="", range="funds!A1", valueInputOption="USER_ENTERED",
+                  body={"values": [["B", "1.5", "2"]]}).execute()
+    values.batchUpdate(spreadsheetId="", body={"data": [{"range": "funds!B2", "values": [["Fondo 2"]]}]}).execute()
+
+    assert service.sheets["funds"][1][1] == "Fondo 2"
+    # Numbers written as user entered are stored as numbers
+    assert service.sheets["funds"][4] == ["B", 1.5, 2]
+    assert service.calls == {"get": 2, "append": 1, "batchUpdate": 1}
+    assert service.updated_cells == 4
+
+
+def test_fake_cafci_counts_the_requests_by_status():
+    with FakeCafciServer(3, error_rate=1) as server:
+        response = requests.get(f"{server.url}/fondo")
+
+        assert response.status_code == 500
+        assert server.state.requests == {("fondo", 500): 1}
+
+
+def test_update_scenario_runs_in_a_child_process():
+    measures = throughput.run("update", fund_count=3, latency=0, error_rate=0, workers=5, rate_limit=0)
+
+    assert measures["scenario"] == "update"
+    assert measures["cafci_requests"] > 0
+    assert measures["cafci_errors"] == 0
+    assert measures["sheets_calls"]["get"] >= 1
+    assert "funds_total" in measures["metrics"]
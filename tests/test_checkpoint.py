@@ -0,0 +1,56 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+from app.models.checkpoint import UpdateCheckpoint
+
+
+FUND_DATA = (Decimal("100.5"), Decimal("101"), Decimal("1.2"), Decimal("-3"), Decimal("12.34"))
+
+
+def test_checkpoint_is_created_inside_the_data_dir(data_dir):
+    checkpoint = UpdateCheckpoint()
+    checkpoint.close()
+
+    assert checkpoint.path == os.path.join(str(data_dir), UpdateCheckpoint.DB_PATH)
+    assert os.path.exists(checkpoint.path)
+
+
+def test_saved_funds_are_resumed():
+    checkpoint = UpdateCheckpoint()
+    checkpoint.save("10", "1", FUND_DATA)
+    checkpoint.close()
+
+    checkpoint = UpdateCheckpoint()
+    assert checkpoint.get("10", "1") == FUND_DATA
+    assert checkpoint.get("11", "1") is None
+    assert checkpoint.get_stats() == {"resumed": 1, "saved": 0}
+
+    checkpoint.clear()
+    assert checkpoint.get("10", "1") is None
+
+
+def test_incomplete_funds_are_not_saved():
+    checkpoint = UpdateCheckpoint()
+    checkpoint.save("10", "1", None)
+    checkpoint.save("11", "1", (Decimal("1"), None, 0, 0, 0))
+
+    assert checkpoint.get("10", "1") is None
+    assert checkpoint.get("11", "1") is None
+    assert checkpoint.get_stats()["saved"] == 0
+
+
+def test_funds_of_previous_weeks_are_evicted(monkeypatch):
+    from app.models import checkpoint as checkpoint_module
+
+    monkeypatch.setattr(checkpoint_module, "get_last_friday", lambda: date(2024, 1, 5))
+    checkpoint = UpdateCheckpoint()
+    checkpoint.save("10", "1", FUND_DATA)
+    checkpoint.close()
+
+    monkeypatch.setattr(checkpoint_module, "get_last_friday", lambda: date(2024, 1, 12))
+    checkpoint = UpdateCheckpoint()
+    count = checkpoint.connection.execute("SELECT COUNT(*) FROM funds").fetchone()[0]
+
+    assert count == 0
+    assert checkpoint.get("10", "1") is None
@@ -0,0 +1,177 @@
+import asyncio
+import random
+
+import pytest
+
+from app.models.fetch_engine import AsyncFetchEngine
+from app.models.funds import PERFORMANCE_RANGES
+
+from .conftest import make_fund_data
+
+
+STREAM_TIMEOUT = 10  # Seconds, a stream that hangs fails the test instead of blocking the suite
+
+
+def make_engine(monkeypatch, parser, fetch, **kwargs) -> AsyncFetchEngine:
+    """
+    Engine whose funds are got by fetch(fund_code) instead of cafci.
+    """
+    engine = AsyncFetchEngine(parser=parser, concurrency=kwargs.pop("concurrency", 20), **kwargs)
+
+    async def get_fund_data(session, fund_code):
+        return await fetch(fund_code)
+
+    monkeypatch.setattr(engine, "get_fund_data", get_fund_data)
+    return engine
+
+
+def run_stream(engine, fund_codes: list, chunk_size: int, max_pending_chunks: int = 2) -> list:
+    """
+    Stream every fund and return the (start, rows) chunks written, in order of writing.
+    """
+    chunks = []
+
+    def write_chunk(start, rows):
+        chunks.append((start, rows))
+
+    asyncio.run(asyncio.wait_for(
+        engine.stream(fund_codes, write_chunk, chunk_size, max_pending_chunks), timeout=STREAM_TIMEOUT
+    ))
+    return chunks
+
+
+def test_stream_writes_chunks_in_order(parser, monkeypatch):
+    fund_codes = [[str(index), str(index)] for index in range(230)]
+
+    async def fetch(fund_code):
+        # Funds finish in any order
+        await asyncio.sleep(random.random() / 1000)
+        return make_fund_data(int(fund_code[0]))
+
+    chunks = run_stream(make_engine(monkeypatch, parser, fetch), fund_codes, chunk_size=50)
+
+    assert [start for start, _ in chunks] == [0, 50, 100, 150, 200]
+    assert [len(rows) for _, rows in chunks] == [50, 50, 50, 50, 30]
+    rows = [row for _, chunk_rows in chunks for row in chunk_rows]
+    assert rows == parser.build_calc_data_many([make_fund_data(index) for index in range(230)])
+
+
+def test_stream_failed_fund_does_not_block_the_run(parser, monkeypatch):
+    fund_codes = [[str(index), str(index)] for index in range(500)]
+
+    async def fetch(fund_code):
+        await asyncio.sleep(0)
+        if fund_code[0] == "123":
+            raise ValueError("Malformed prices response")
+        return make_fund_data(int(fund_code[0]))
+
+    engine = make_engine(monkeypatch, parser, fetch)
+    chunks = run_stream(engine, fund_codes, chunk_size=50, max_pending_chunks=1)
+
+    rows = [row for _, chunk_rows in chunks for row in chunk_rows]
+    assert len(rows) == 500
+    assert rows[123] is None
+    assert rows.count(None) == 1
+    assert engine.failed == [["123", "123"]]
+
+
+def test_stream_writer_error_is_raised(parser, monkeypatch):
+    fund_codes = [[str(index), str(index)] for index in range(100)]
+
+    async def fetch(fund_code):
+        return make_fund_data(int(fund_code[0]))
+
+    engine = make_engine(monkeypatch, parser, fetch)
+
+    def write_chunk(write_chunk, start, funds_data):
+        raise OSError("Writer thread died")
+
+    # The writer stops on its first chunk, the fetching waits for its slots
+    monkeypatch.setattr(engine, "write_chunk", write_chunk)
+    with pytest.raises(OSError):
+        run_stream(engine, fund_codes, chunk_size=10, max_pending_chunks=1)
+
+
+def test_stream_deadline_leaves_funds_unfinished(parser, monkeypatch):
+    import time
+
+    fund_codes = [[str(index), str(index)] for index in range(20)]
+
+    async def fetch(fund_code):
+        if int(fund_code[0]) >= 10:
+            await asyncio.sleep(60)
+        return make_fund_data(int(fund_code[0]))
+
+    engine = make_engine(monkeypatch, parser, fetch, deadline=time.monotonic() + 0.2)
+    chunks = run_stream(engine, fund_codes, chunk_size=5)
+
+    rows = [row for _, chunk_rows in chunks for row in chunk_rows]
+    assert rows[:10] == parser.build_calc_data_many([make_fund_data(index) for index in range(10)])
+    assert rows[10:] == [None] * 10
+    assert engine.unfinished == fund_codes[10:]
+
+
+def test_gather_keeps_the_order_of_the_items(parser, monkeypatch):
+    async def fetch(fund_code):
+        await asyncio.sleep(random.random() / 1000)
+        if fund_code[0] == "3":
+            raise KeyError("data")
+        return make_fund_data(int(fund_code[0]))
+
+    engine = make_engine(monkeypatch, parser, fetch)
+    fund_codes = [[str(index), str(index)] for index in range(10)]
+    results = asyncio.run(engine.gather(engine.get_fund_data, [(fund_code, ) for fund_code in fund_codes]))
+
+    assert results[:3] == [make_fund_data(index) for index in range(3)]
+    assert results[3] is None
+    assert results[4:] == [make_fund_data(index) for index in range(4, 10)]
+    assert engine.failed == [(["3", "3"], )]
+
+
+@pytest.mark.parametrize("rate", [0, 400])
+def test_budget_does_not_count_the_wait_for_admission(parser, rate, monkeypatch):
+    from app.models.rate_limit import RateLimiter
+
+    parser.rate_limiter = RateLimiter(rate=rate)
+    fund_codes = [[str(index), str(index)] for index in range(300)]
+
+    async def fetch(fund_code):
+        # One token and one request slot for every request of the fund, like perform_request
+        async def request():
+            await parser.rate_limiter.acquire_async()
+            async with engine.semaphore:
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request() for _ in range(1 + len(PERFORMANCE_RANGES))))
+        return make_fund_data(int(fund_code[0]))
+
+    # 1200 requests take 3 seconds at 400 per second, or 0.3 seconds with 40 in flight
+    engine = make_engine(monkeypatch, parser, fetch, concurrency=40, item_budget=0.5)
+    results = engine.calc_data_by_funds(fund_codes)
+
+    assert engine.over_budget == []
+    assert None not in results
+
+
+def test_admission_window(parser):
+    from app.models.rate_limit import RateLimiter
+
+    engine = AsyncFetchEngine(parser=parser, concurrency=100)
+    assert engine.create_admission(engine.get_requests_per_fund())._value == 25
+    assert engine.create_admission(1)._value == 100
+
+    parser.rate_limiter = RateLimiter(rate=10)
+    engine = AsyncFetchEngine(parser=parser, concurrency=100, single_fetch=True)
+    assert engine.create_admission(engine.get_requests_per_fund())._value == 20
+
+
+def test_calc_data_matches_the_sync_requests(cafci_server, parser):
+    from app.services import calc_data_by_fund
+
+    fund_codes = [[str(fund_id * 10 + 1), str(fund_id)] for fund_id in range(1, 6)]
+
+    rows = parser.calc_data_by_funds(fund_codes, concurrency=5)
+
+    assert rows == [calc_data_by_fund(fund_code, parser) for fund_code in fund_codes]
+    # One prices request and one per performance range for every fund, twice
+    assert cafci_server.state.get_total_requests() == 2 * 5 * (1 + len(PERFORMANCE_RANGES))
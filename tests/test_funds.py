@@ -0,0 +1,79 @@
+from datetime import (
+    date,
+    timedelta,
+)
+from decimal import Decimal
+
+from app.common.utils import get_last_friday
+from app.models import funds
+from app.models.records import DEFAULT_HEADER
+
+
+FUND_GROUP = {
+    "id": "7",
+    "nombre": "Fondo Test",
+    "diasLiquidacion": "1",
+    "monedaId": "1",
+    "tipoRenta": {"id": "3"},
+    "clase_fondos": [
+        {"id": "70", "nombre": "Fondo Test - Clase A"},
+        {"id": "71", "nombre": "Fondo Test - Clase B"},
+    ],
+}
+FUND_CLASS = {
+    "id": "70",
+    "nombre": "Fondo Test - Clase A",
+    "diasLiquidacion": "1",
+    "fondo": {"id": "7", "nombre": "Fondo Test", "monedaId": "1", "tipoRentaId": "3"},
+}
+
+
+def test_fund_rows_match_the_sheet_header(parser):
+    (listed_row, ) = parser.get_fund_classes_by_fund_group(FUND_GROUP)
+    ficha_row = parser.format_fund_class_data(FUND_CLASS)
+
+    assert len(listed_row) == len(DEFAULT_HEADER)
+    assert listed_row == ficha_row
+    assert listed_row[DEFAULT_HEADER.index("updated")] is not None
+    assert listed_row[DEFAULT_HEADER.index("year_performance")] is None
+
+
+def test_price_at_a_non_business_day_is_the_last_known_one(parser):
+    history = [(date(2024, 1, 4), Decimal("1.1")), (date(2024, 1, 5), Decimal("1.2")), (date(2024, 1, 8), 1.3)]
+
+    assert parser.get_price_at(history, date(2024, 1, 7)) == Decimal("1.2")
+    assert parser.get_price_at(history, date(2024, 1, 8)) == 1.3
+    assert parser.get_price_at(history, date(2024, 1, 3)) is None
+
+
+def test_single_fetch_matches_the_requests_by_range(cafci_server, parser):
+    fund_codes = [[str(fund_id * 10 + 1), str(fund_id)] for fund_id in range(1, 6)]
+
+    rows = parser.calc_data_by_funds(fund_codes, concurrency=5)
+    single_fetch_rows = parser.calc_data_by_funds(fund_codes, concurrency=5, single_fetch=True)
+
+    # One price history request per fund
+    assert cafci_server.state.requests[("cuotapartes", 200)] == len(fund_codes)
+    for row, single_fetch_row in zip(rows, single_fetch_rows):
+        # tna, tea and tem come from the same edge prices
+        assert single_fetch_row[:3] == row[:3]
+        # Cafci rounds the performances, they are truncated locally. The fake api doesn't move the windows
+        # starting on weekends to the last business day like cafci does, those are not compared
+        for date_range, performance, single_fetch_performance in zip(
+            funds.PERFORMANCE_RANGES, row[3:6], single_fetch_row[3:6]
+        ):
+            if (get_last_friday() - timedelta(days=date_range)).weekday() < 5:
+                assert abs(Decimal(performance) - Decimal(single_fetch_performance)) <= Decimal("0.01")
+
+
+def test_price_history_covers_every_range():
+    assert funds.PRICE_HISTORY_RANGE > max(funds.PRICES_RANGE, *funds.PERFORMANCE_RANGES)
+
+
+def test_performance_of_a_short_history_is_zero(parser):
+    friday = get_last_friday()
+    history = [(friday - timedelta(days=days), Decimal("1.5")) for days in range(10)]
+
+    assert parser.get_performance_from_history(history, 365) == Decimal("0.00")
+    assert isinstance(parser.get_performance_from_history(history, 365), Decimal)
+    assert parser.get_performance_from_history(None, 365) is None
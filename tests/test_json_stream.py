@@ -0,0 +1,78 @@
+import json
+import random
+
+import pytest
+
+from app.models.json_stream import (
+    JSONStreamError,
+    iter_array_items,
+)
+
+
+DOCUMENT = {
+    "success": True,
+    "data": [
+        {"id": 1, "nombre": "Fondo Ñandú", "tna": -0.5, "clases": [{"id": 10}, {"id": 11}]},
+        {"id": 2, "nombre": "Renta \"fija\"", "tna": 12, "clases": []},
+        {"id": 3, "nombre": "Acciones", "tna": 1.25e-3, "clases": None},
+    ],
+    "total": 3,
+}
+
+
+def split(text, sizes) -> list:
+    chunks = []
+    position = 0
+    for size in sizes:
+        chunks.append(text[position:position + size])
+        position += size
+
+    return chunks + [text[position:]]
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("as_bytes", [False, True])
+def test_items_do_not_depend_on_the_chunk_boundaries(seed, as_bytes):
+    document = json.dumps(DOCUMENT, ensure_ascii=False, indent=seed % 3 or None)
+    text = document.encode() if as_bytes else document
+    generator = random.Random(seed)
+    chunks = split(text, [generator.randint(1, 8) for _ in range(len(text))])
+    fields: dict = {}
+
+    assert list(iter_array_items(chunks, "data", fields)) == DOCUMENT["data"]
+    assert fields == {"success": True, "total": 3}
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    (['{"data": [-0.', '5]}'], [-0.5]),
+    (['{"data": [12', "34, 5", "e3]}"], [1234, 5000.0]),
+    (['{"data": [1', "", "2]}"], [12]),
+    (['{"data": [1]', "}"], [1]),
+])
+def test_numbers_split_between_chunks(chunks, expected):
+    assert list(iter_array_items(chunks, "data")) == expected
+
+
+@pytest.mark.parametrize("document", ["{}", '{"data": []}', '{"error": "none"}'])
+def test_documents_without_items(document):
+    assert list(iter_array_items([document], "data")) == []
+
+
+@pytest.mark.parametrize("chunks", [
+    ['{"data": [1, 2'],
+    ['{"data": [{"id": 1'],
+    ['["data"]'],
+    ['{"data": [1 2]}'],
+    [""],
+])
+def test_broken_documents(chunks):
+    with pytest.raises(JSONStreamError):
+        list(iter_array_items(chunks, "data"))
+
+
+def test_items_are_yielded_before_the_document_ends():
+    def chunks():
+        yield '{"data": [{"id": 1}, '
+        raise AssertionError("The first item must be yielded before the next chunk is read")
+
+    assert next(iter_array_items(chunks(), "data")) == {"id": 1}
@@ -0,0 +1,79 @@
+import io
+import logging
+
+import pytest
+
+from app.common.log_handlers import (
+    SAMPLED,
+    QueueLogHandler,
+    SampleFilter,
+    parse_log_levels,
+    set_log_levels,
+)
+
+
+def make_record(msg: str, level: int = logging.INFO, sampled: bool = True) -> logging.LogRecord:
+    record = logging.LogRecord("test", level, __file__, 1, msg, None, None)
+    if sampled:
+        record.__dict__.update(SAMPLED)
+    return record
+
+
+def test_sample_filter_lets_one_of_every_rate_through():
+    sample_filter = SampleFilter(rate=3)
+
+    passed = [record.msg for record in (make_record("Fund %s") for _ in range(7)) if sample_filter.filter(record)]
+
+    assert passed == ["Fund %s", "Fund %s (4 times so far)", "Fund %s (7 times so far)"]
+
+
+def test_sample_filter_never_drops_warnings_or_unsampled_records():
+    sample_filter = SampleFilter(rate=100)
+    sample_filter.filter(make_record("Fund %s"))
+
+    assert sample_filter.filter(make_record("Fund %s", level=logging.WARNING))
+    assert sample_filter.filter(make_record("Fund %s", sampled=False))
+    assert not sample_filter.filter(make_record("Fund %s"))
+    # Every message template is counted on its own
+    assert sample_filter.filter(make_record("Other %s"))
+
+
+def test_queue_handler_writes_from_the_listener():
+    stream = io.StringIO()
+    handler = QueueLogHandler(stream)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+    logger = logging.getLogger("tests.queue_handler")
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    try:
+        logger.warning("Fund %s failed", 7)
+        handler.stop()
+        # Once stopped the caller writes the records
+        logger.warning("Fund %s failed", 8)
+    finally:
+        logger.removeHandler(handler)
+
+    assert stream.getvalue() == "WARNING Fund 7 failed\nWARNING Fund 8 failed\n"
+
+
+def test_parse_log_levels():
+    assert parse_log_levels("app.sheets=debug, app.models.fetch_engine=WARNING,") == {
+        "app.sheets": "DEBUG",
+        "app.models.fetch_engine": "WARNING",
+    }
+    assert parse_log_levels(None) == {}
+
+    with pytest.raises(ValueError):
+        parse_log_levels("app.sheets")
+
+
+def test_set_log_levels():
+    root_level = logging.getLogger().level
+    try:
+        set_log_levels("debug", {"tests.levels": "ERROR"})
+
+        assert logging.getLogger().level == logging.DEBUG
+        assert logging.getLogger("tests.levels").level == logging.ERROR
+    finally:
+        logging.getLogger().setLevel(root_level)
@@ -0,0 +1,56 @@
+from app import main
+from benchmarks.import_time import measure_import
+
+
+def test_import_does_not_load_the_heavy_modules():
+    _, loaded = measure_import()
+
+    assert loaded == []
+
+
+def test_update_command_arguments(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "update_funds_database", lambda **kwargs: calls.append(kwargs))
+
+    main.main(["update", "--workers", "10", "--rate-limit", "0", "--resume", "--no-cache", "--limit", "5"])
+
+    assert len(calls) == 1
+    assert calls[0]["concurrency"] == 10
+    assert calls[0]["rate_limit"] == 0
+    assert calls[0]["resume"] is True
+    assert calls[0]["use_response_cache"] is False
+    assert calls[0]["limit"] == 5
+    assert calls[0]["deadline"] is None
+
+
+def test_search_joins_the_name(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "search_fund_by_name", lambda **kwargs: calls.append(kwargs))
+
+    main.main(["search", "renta", "fija", "--results", "3"])
+
+    assert calls == [{"fund_name": "renta fija", "results": 3, "refresh_sheet": False}]
+
+
+def test_log_levels_of_some_modules():
+    args = main.get_arguments_parser().parse_args(["--log-levels", "app.sheets=DEBUG", "debug"])
+
+    assert args.log_levels == {"app.sheets": "DEBUG"}
+    assert args.func is main.debug_command
+
+
+def test_check_command_arguments(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "check_database_integrity", lambda **kwargs: calls.append(kwargs))
+
+    main.main(["check", "--limit", "20", "--max-repairs", "5", "--dry-run"])
+
+    assert calls == [{
+        "use_response_cache": True,
+        "limit": 20,
+        "dry_run": True,
+        "rate_limit": None,
+        "refresh_sheet": False,
+        "concurrency": main.DEFAULT_CONCURRENCY,
+        "max_repairs": 5,
+    }]
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from app.common.metrics import (
+    MetricsRegistry,
+    get_metrics,
+    record_run,
+)
+from benchmarks.throughput import (
+    merge_metrics,
+    snapshot_metrics,
+)
+
+
+def test_counter_adds_by_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("status", ))
+    requests.inc(status=200)
+    requests.inc(2, status=200)
+    requests.inc(status=500)
+
+    assert requests.values == {("200", ): 3, ("500", ): 1}
+
+
+def test_a_name_keeps_its_type():
+    registry = MetricsRegistry()
+    registry.counter("requests_total")
+
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total")
+
+
+def test_histogram_prometheus_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    for amount in (0.05, 0.5, 0.5, 3):
+        latency.observe(amount)
+
+    lines = registry.to_prometheus().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert lines[2:] == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 4.05",
+        "latency_seconds_count 4",
+    ]
+
+
+def test_histogram_quantiles_interpolate_inside_the_bucket():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", buckets=(1, 2))
+    for amount in (0.5, 1.5, 1.5, 1.5, 5):
+        latency.observe(amount)
+
+    summary = registry.get_summary()["latency_seconds"]["values"][0]["value"]
+    assert summary["count"] == 5
+    assert summary["mean"] == pytest.approx(2)
+    assert summary["p50"] == pytest.approx(1.5)
+    # Over the last bucket the quantile is its upper bound
+    assert summary["p99"] == 2
+
+
+def test_finish_run_without_start():
+    registry = MetricsRegistry()
+
+    assert registry.finish_run() == 0
+    assert registry.metrics["run_seconds"].values == {("None", ): 0}
+
+
+def test_record_run_writes_the_metrics(tmp_path):
+    @record_run("command", directory=str(tmp_path))
+    def run():
+        get_metrics().counter("funds_total").inc(3)
+
+    run()
+
+    assert "funds_total 3" in (tmp_path / "command.prom").read_text()
+    summary = json.loads((tmp_path / "command.json").read_text())
+    assert summary["command"] == "command"
+    assert summary["metrics"]["funds_total"]["values"] == [{"value": 3}]
+    assert get_metrics().command is None
+
+
+def test_benchmark_merges_the_metrics_of_every_scenario():
+    scenarios = []
+    for amount in (1, 4):
+        registry = MetricsRegistry()
+        registry.counter("requests_total").inc(amount)
+        registry.gauge("run_seconds").set(amount)
+        registry.histogram("latency_seconds", buckets=(1, 2)).observe(amount)
+        # The snapshot is sent from the scenario process as json like data
+        scenarios.append(json.loads(json.dumps(snapshot_metrics(registry))))
+
+    merged = MetricsRegistry()
+    for snapshot in scenarios:
+        merge_metrics(merged, snapshot)
+
+    assert merged.metrics["requests_total"].values == {(): 5}
+    assert merged.metrics["run_seconds"].values == {(): 4}
+    assert merged.metrics["latency_seconds"].values == {(): [[1, 0, 1], 5, 2]}
@@ -0,0 +1,63 @@
+from datetime import date
+from decimal import Decimal
+
+from app.common.utils import get_last_friday
+from app.models.price_store import PriceStore
+
+
+JANUARY = [(date(2024, 1, day), Decimal(f"1.{day:02}")) for day in range(1, 11)]
+
+
+def test_store_is_created_inside_the_data_dir(data_dir):
+    store = PriceStore()
+    store.close()
+
+    assert (data_dir / PriceStore.DB_PATH).exists()
+
+
+def test_contiguous_ranges_keep_a_single_coverage():
+    store = PriceStore()
+    store.save_history("1", "11", JANUARY[:5], date(2024, 1, 1), date(2024, 1, 5))
+    store.save_history("1", "11", JANUARY[5:], date(2024, 1, 6), date(2024, 1, 10))
+
+    assert store.get_coverage("1", "11") == (date(2024, 1, 1), date(2024, 1, 10))
+    assert store.is_covered("1", "11", date(2024, 1, 3), date(2024, 1, 8))
+    assert not store.is_covered("1", "11", date(2024, 1, 3), date(2024, 1, 11))
+    assert store.get_history("1", "11", date(2024, 1, 4), date(2024, 1, 6)) == JANUARY[3:6]
+    assert store.get_all_coverages() == {("1", "11"): (date(2024, 1, 1), date(2024, 1, 10))}
+
+
+def test_a_gap_drops_the_previous_coverage():
+    store = PriceStore()
+    store.save_history("1", "11", JANUARY[:3], date(2024, 1, 1), date(2024, 1, 3))
+    store.save_history("1", "11", JANUARY[7:], date(2024, 1, 8), date(2024, 1, 10))
+
+    assert store.get_coverage("1", "11") == (date(2024, 1, 8), date(2024, 1, 10))
+    assert store.get_coverage("2", "21") == (None, None)
+
+
+def test_synced_funds_are_answered_by_the_store(cafci_server, parser):
+    parser.price_store = PriceStore()
+    fund_codes = [[str(fund_id * 10 + 1), str(fund_id)] for fund_id in range(1, 4)]
+
+    assert parser.sync_price_store(fund_codes) == 3
+    requests = cafci_server.state.get_total_requests()
+
+    # Already synced up to the last friday, nothing to download
+    assert parser.sync_price_store(fund_codes) == 0
+    first_price, last_price = parser.get_prices_by_range("11", "1", 7)
+    assert cafci_server.state.get_total_requests() == requests
+    assert 0 < first_price and 0 < last_price
+    assert parser.price_store.get_coverage("1", "11")[1] == get_last_friday()
+
+
+def test_backfilled_funds_are_calculated_without_requests(cafci_server, parser):
+    parser.price_store = PriceStore()
+    fund_codes = [[str(fund_id * 10 + 1), str(fund_id)] for fund_id in range(1, 4)]
+    assert parser.sync_price_store(fund_codes, backfill=True) == 3
+    requests = cafci_server.state.get_total_requests()
+
+    rows = parser.calc_data_by_funds(fund_codes)
+
+    assert cafci_server.state.get_total_requests() == requests
+    assert all(row is not None for row in rows)
@@ -0,0 +1,105 @@
+import os
+import time
+
+import pytest
+
+from app.common import profiling
+from app.common.profiling import (
+    StageProfiler,
+    collapse_stats,
+    format_frame,
+    get_profiler,
+)
+
+
+MAIN = ("main.py", 1, "main")
+FETCH = ("funds.py", 10, "fetch")
+PARSE = ("funds.py", 20, "parse")
+
+
+def busy_wait(seconds: float):
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        pass
+
+
+def test_format_frame():
+    assert format_frame(FETCH) == "funds.py:fetch:10"
+    assert format_frame(("~", 0, "<method 'poll' of 'a;b'>")) == "<method 'poll' of 'a,b'>"
+
+
+def test_collapse_stats_splits_the_callee_between_its_callers():
+    # function: (calls, primitive calls, own time, total time, {caller: (calls, primitive calls, own, total)})
+    stats = {
+        MAIN: (1, 1, 1.0, 5.0, {}),
+        FETCH: (2, 2, 1.0, 4.0, {MAIN: (2, 2, 1.0, 4.0)}),
+        PARSE: (4, 4, 3.0, 3.0, {MAIN: (1, 1, 1.0, 1.0), FETCH: (3, 3, 2.0, 2.0)}),
+    }
+
+    stacks = collapse_stats(stats, "update")
+
+    assert stacks == pytest.approx({
+        "update;main.py:main:1": 1.0,
+        "update;main.py:main:1;funds.py:fetch:10": 1.0,
+        "update;main.py:main:1;funds.py:fetch:10;funds.py:parse:20": 2.0,
+        "update;main.py:main:1;funds.py:parse:20": 1.0,
+    })
+
+
+def test_nested_stages_count_the_time_once(tmp_path):
+    profiler = StageProfiler()
+    profiler.enable(str(tmp_path), trace_memory=False)
+    profiler.start_run()
+
+    with profiler.stage("update"):
+        busy_wait(0.01)
+        with profiler.stage("fetch"):
+            busy_wait(0.02)
+
+    assert set(profiler.stats) == {"update", "fetch"}
+    fetch_functions = {name for _, _, name in profiler.stats["fetch"].stats}
+    update_functions = {name for _, _, name in profiler.stats["update"].stats}
+    assert "busy_wait" in fetch_functions and "busy_wait" in update_functions
+
+    paths = profiler.write("update")
+
+    assert [os.path.basename(path) for path in paths] == ["update.pstats", "update.collapsed", "update.txt"]
+    assert os.path.exists(tmp_path / "update.fetch.pstats")
+    assert "busy_wait" in (tmp_path / "update.collapsed").read_text()
+
+
+def test_memory_report_of_the_stages(tmp_path):
+    profiler = StageProfiler()
+    profiler.enable(str(tmp_path))
+    profiler.start_run()
+
+    with profiler.stage("create"):
+        data = [str(number) for number in range(10000)]
+
+    paths = profiler.write("create")
+
+    assert len(data) == 10000
+    assert os.path.join(str(tmp_path), "create.memory.txt") in paths
+    assert "=== create:" in (tmp_path / "create.memory.txt").read_text()
+
+
+def test_disabled_profiler_does_nothing():
+    profiler = StageProfiler()
+
+    with profiler.stage("update"):
+        pass
+
+    assert profiler.stats == {}
+
+
+def test_forked_workers_profile_into_their_own_directory(monkeypatch):
+    parent = StageProfiler()
+    parent.enable("profile", trace_memory=False)
+    monkeypatch.setattr(profiling, "_profilers", {1: parent})
+
+    profiler = get_profiler()
+
+    assert profiler is not parent
+    assert profiler.enabled
+    assert profiler.directory == os.path.join("profile", str(os.getpid()))
+    assert get_profiler() is profiler
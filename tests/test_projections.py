@@ -0,0 +1,50 @@
+import random
+from decimal import Decimal
+
+import numpy as np
+
+from app.models.projections import (
+    get_proyections,
+    quantize_down,
+)
+
+
+def get_prices(count: int, seed: int = 0) -> tuple:
+    generator = random.Random(seed)
+    initial_prices = [Decimal(f"{generator.uniform(0.5, 5000):.6f}") for _ in range(count)]
+    final_prices = [price * Decimal(f"{generator.uniform(0.9, 1.1):.6f}") for price in initial_prices]
+
+    return initial_prices, final_prices
+
+
+def test_proyections_match_the_decimal_calculation(parser):
+    initial_prices, final_prices = get_prices(2000)
+    # Equal prices land exactly on a cent boundary
+    initial_prices[:5] = final_prices[:5]
+
+    proyections = parser.get_proyections(initial_prices, final_prices)
+
+    assert proyections == [
+        parser.get_proyection(initial, final) for initial, final in zip(initial_prices, final_prices)
+    ]
+
+
+def test_funds_near_a_cent_boundary_use_the_exact_proyection(parser):
+    initial_prices, final_prices = get_prices(100, seed=1)
+    initial_prices[7] = final_prices[7]
+    exact_calls = []
+
+    def exact_proyection(initial_price, final_price, interval):
+        exact_calls.append(initial_price)
+        return parser.get_proyection(initial_price, final_price, interval)
+
+    get_proyections(initial_prices, final_prices, [7] * 100, exact_proyection=exact_proyection)
+
+    assert Decimal(str(initial_prices[7])) in exact_calls
+
+
+def test_quantize_down_keeps_the_sign_and_skips_invalid_values():
+    values = np.array([1.239, -0.001, -2.5, np.nan, np.inf])
+
+    assert quantize_down(values) == [Decimal("1.23"), Decimal("-0.00"), Decimal("-2.50"), None, None]
+    assert str(quantize_down(np.array([-0.001]))[0]) == "-0.00"
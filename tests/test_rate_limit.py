@@ -0,0 +1,162 @@
+import asyncio
+import time
+from email.utils import format_datetime
+from datetime import (
+    datetime,
+    timedelta,
+    timezone,
+)
+from typing import Optional
+
+import pytest
+
+from app.models import (
+    funds,
+    rate_limit,
+)
+from app.models.rate_limit import (
+    BACKOFF_CAP,
+    RateLimiter,
+    get_backoff_delay,
+    get_rate_limiter,
+    parse_retry_after,
+)
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeResponse():
+    def __init__(self, status_code: int, headers: Optional[dict] = None, data: Optional[dict] = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.data = data
+
+    def json(self) -> Optional[dict]:
+        return self.data
+
+
+class FakeTransport():
+    """Answers the requests with the given responses, in order."""
+
+    def __init__(self, responses: list):
+        self.responses = list(responses)
+        self.requests_count = 0
+
+    def request(self, method: str, url: str, **kwargs) -> FakeResponse:
+        self.requests_count += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock.monotonic)
+    return clock
+
+
+@pytest.mark.parametrize("value, seconds", [
+    (None, None),
+    ("", None),
+    ("3", 3),
+    ("-2", 0),
+    ("not a date", None),
+])
+def test_parse_retry_after(value, seconds):
+    assert parse_retry_after(value) == seconds
+
+
+def test_parse_retry_after_http_date():
+    retry_date = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    seconds = parse_retry_after(format_datetime(retry_date, usegmt=True))
+    assert seconds is not None
+    assert 25 < seconds <= 30
+
+
+def test_backoff_is_capped_and_waits_the_retry_after():
+    delays = [get_backoff_delay(attempt) for attempt in range(20)]
+
+    assert all(0 <= delay <= BACKOFF_CAP for delay in delays)
+    assert get_backoff_delay(0, retry_after=5) >= 5
+
+
+def test_tokens_are_handed_at_the_rate(clock):
+    limiter = RateLimiter(rate=10, burst=2)
+
+    delays = [limiter.reserve() for _ in range(5)]
+
+    # The burst is free, the rest wait their turn in order
+    assert delays == pytest.approx([0, 0, 0.1, 0.2, 0.3])
+    assert limiter.waited_time == pytest.approx(0.6)
+
+    clock.now += 10
+    assert limiter.reserve() == 0
+
+
+def test_pause_delays_every_caller(clock):
+    limiter = RateLimiter(rate=10, burst=5)
+
+    limiter.pause(2)
+
+    assert limiter.reserve() == pytest.approx(2.1)
+    assert limiter.throttled_count == 1
+
+
+def test_async_and_sync_requests_share_the_tokens():
+    # Real clock, the event loop sleeps on it
+    limiter = RateLimiter(rate=50, burst=1)
+    limiter.acquire()
+    limiter.reserve()
+
+    start_time = time.perf_counter()
+    asyncio.run(asyncio.wait_for(limiter.acquire_async(), timeout=1))
+
+    assert time.perf_counter() - start_time >= 0.03
+    assert limiter.waited_time == pytest.approx(0.06, abs=0.01)
+
+
+def test_without_rate_nothing_waits():
+    limiter = RateLimiter(rate=0)
+
+    assert [limiter.reserve() for _ in range(1000)] == [0] * 1000
+
+
+def test_shared_limiter_of_the_process(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_rate_limiters", {})
+
+    limiter = get_rate_limiter()
+    assert limiter.rate == rate_limit.DEFAULT_RATE_LIMIT
+    assert get_rate_limiter(rate=5) is limiter
+    assert limiter.rate == 5
+    assert get_rate_limiter().rate == 5
+
+
+def test_throttled_requests_wait_the_retry_after(monkeypatch, parser):
+    sleeps: list = []
+    monkeypatch.setattr(funds.time, "sleep", sleeps.append)
+    parser.transport = FakeTransport([
+        FakeResponse(429, {"Retry-After": "7"}),
+        FakeResponse(503),
+        FakeResponse(200, data={"data": []}),
+    ])
+
+    assert parser.perform_request("https://api.cafci.org.ar/fondo") == {"data": []}
+
+    assert parser.transport.requests_count == 3
+    assert sleeps[0] >= 7
+    assert parser.engine_stats.retries == 2
+    assert parser.rate_limiter.throttled_count == 1
+
+
+def test_requests_give_up_after_the_max_retries(monkeypatch, parser):
+    monkeypatch.setattr(funds.time, "sleep", lambda seconds: None)
+    parser.transport = FakeTransport([FakeResponse(500) for _ in range(funds.MAX_RETRIES)])
+
+    assert parser.perform_request("https://api.cafci.org.ar/fondo") is None
+    assert parser.transport.requests_count == funds.MAX_RETRIES
@@ -0,0 +1,56 @@
+import copy
+import pickle
+
+import pytest
+
+from app.models.records import (
+    DEFAULT_HEADER,
+    FundTable,
+)
+
+from .conftest import make_fund_row
+
+
+HEADER = ["name", "class_cafci_code", "custom"]
+
+
+def test_cells_are_read_by_the_header_position():
+    table = FundTable.from_response([HEADER, ["Fondo", "10", "x"], ["Corto"]])
+
+    record, short = table
+    assert (record.name, record["class_cafci_code"], record.custom) == ("Fondo", "10", "x")
+    # Aliases read the same column
+    assert record.fund_class_cafci_code == "10"
+    assert short.class_cafci_code is None
+    assert short.row_number == 3
+
+
+def test_known_columns_missing_from_the_sheet_are_none():
+    record = FundTable.from_response([HEADER, ["Fondo", "10", "x"]])[0]
+
+    assert record.tna is None
+
+
+def test_unknown_attributes_raise():
+    record = FundTable(None, [make_fund_row(1)])[0]
+
+    with pytest.raises(AttributeError):
+        record.nmae
+
+    assert not hasattr(record, "custom")
+    assert getattr(record, "other", "default") == "default"
+
+
+def test_records_can_be_copied_and_pickled():
+    record = FundTable(None, [make_fund_row(1)])[0]
+
+    for other in (copy.copy(record), pickle.loads(pickle.dumps(record))):
+        assert other.to_dict() == record.to_dict()
+
+
+def test_slices_keep_the_row_numbers():
+    table = FundTable(None, [make_fund_row(index) for index in range(1, 6)])
+
+    assert [record.row_number for record in table[2:4]] == [4, 5]
+    assert table.column("fund_cafci_code") == ["1", "2", "3", "4", "5"]
+    assert len(table.columns_view(DEFAULT_HEADER)) == len(DEFAULT_HEADER)
@@ -0,0 +1,94 @@
+from datetime import date
+from itertools import count
+
+from app.models import response_cache
+from app.models.response_cache import (
+    ResponseCache,
+    normalize_url,
+)
+
+
+def test_equivalent_urls_share_the_entry():
+    assert normalize_url(" HTTPS://Api.Cafci.org.ar/fondo/1/?b=2&a=1 ") == "https://api.cafci.org.ar/fondo/1?a=1&b=2"
+
+
+def test_hits_and_misses():
+    cache = ResponseCache()
+    cache.set("https://api.cafci.org.ar/fondo/1", {"data": [1]})
+    cache.set("https://api.cafci.org.ar/fondo/2", None)
+
+    assert cache.get("https://api.cafci.org.ar/fondo/1/") == {"data": [1]}
+    assert cache.get("https://api.cafci.org.ar/fondo/2") is None
+    assert cache.get_stats() == {"hits": 1, "misses": 1}
+
+
+def test_responses_of_previous_weeks_are_evicted(monkeypatch):
+    monkeypatch.setattr(response_cache, "get_last_friday", lambda: date(2024, 1, 5))
+    cache = ResponseCache()
+    cache.set("https://api.cafci.org.ar/fondo/1", {"data": [1]})
+    cache.close()
+
+    monkeypatch.setattr(response_cache, "get_last_friday", lambda: date(2024, 1, 12))
+    cache = ResponseCache()
+
+    assert cache.size == 0
+    assert cache.get("https://api.cafci.org.ar/fondo/1") is None
+
+
+def test_least_recently_used_responses_are_evicted(monkeypatch):
+    clock = count()
+    monkeypatch.setattr(response_cache.time, "time", lambda: next(clock))
+    response = {"data": "x" * 100}
+    cache = ResponseCache(max_size=250)
+
+    cache.set("https://api.cafci.org.ar/fondo/1", response)
+    cache.set("https://api.cafci.org.ar/fondo/2", response)
+    cache.get("https://api.cafci.org.ar/fondo/1")
+    cache.set("https://api.cafci.org.ar/fondo/3", response)
+
+    assert cache.size <= 250
+    assert cache.get("https://api.cafci.org.ar/fondo/2") is None
+    assert cache.get("https://api.cafci.org.ar/fondo/1") == response
+    assert cache.get("https://api.cafci.org.ar/fondo/3") == response
+
+
+def test_cached_requests_are_not_repeated(cafci_server, parser):
+    parser.response_cache = ResponseCache()
+    url = parser.get_performance_url("11", "1", 30)
+
+    first_response = parser.perform_cached_request(url)
+
+    assert parser.perform_cached_request(url) == first_response
+    assert cafci_server.state.get_total_requests() == 1
+    assert parser.get_cache_stats() == {"hits": 1, "misses": 1}
+
+
+def test_hits_are_written_in_batches(monkeypatch):
+    monkeypatch.setattr(response_cache, "TOUCH_BATCH_SIZE", 3)
+    cache = ResponseCache()
+    for fund_id in range(3):
+        cache.set(f"https://api.cafci.org.ar/fondo/{fund_id}", {"data": [fund_id]})
+
+    cache.get("https://api.cafci.org.ar/fondo/1")
+    cache.get("https://api.cafci.org.ar/fondo/1/")
+    assert len(cache.touches) == 1
+
+    cache.get("https://api.cafci.org.ar/fondo/0")
+    cache.get("https://api.cafci.org.ar/fondo/2")
+    assert cache.touches == {}
+
+    cache.get("https://api.cafci.org.ar/fondo/1")
+    cache.close()
+    assert cache.touches == {}
+
+
+def test_eviction_leaves_room_for_the_next_responses():
+    response = {"data": "x" * 100}
+    cache = ResponseCache(max_size=1000)
+    for fund_id in range(20):
+        cache.set(f"https://api.cafci.org.ar/fondo/{fund_id}", response)
+
+    stored = cache.connection.execute("SELECT COALESCE(SUM(size), 0), COUNT(*) FROM responses").fetchone()
+    assert stored == (cache.size, cache.count)
+    assert cache.size <= 1000 * response_cache.EVICTION_TARGET
+    assert cache.get("https://api.cafci.org.ar/fondo/19") == response
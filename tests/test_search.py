@@ -0,0 +1,59 @@
+from app.models.records import FundTable
+from app.models.search import (
+    FundSearchIndex,
+    fold_text,
+)
+
+
+NAMES = [
+    "Fondo Acción Pesos",
+    "Renta Fija Dólares",
+    "Renta Fija Pesos - Clase A",
+    "Acciones Argentinas",
+    "",
+]
+
+
+def get_index() -> FundSearchIndex:
+    rows = [[name, str(code)] for code, name in enumerate(NAMES)]
+    return FundSearchIndex(FundTable(["name", "class_cafci_code"], rows))
+
+
+def test_fold_text():
+    assert fold_text("Fondo Acción  PESOS - Clase Ñ") == "fondo accion pesos clase n"
+    assert fold_text(None) == ""
+
+
+def test_rows_without_name_are_not_indexed():
+    assert len(get_index()) == 4
+
+
+def test_exact_name_ignoring_accents_is_first():
+    (score, record), *_ = get_index().search("fondo accion pesos")
+
+    assert score == 2
+    assert record.name == "Fondo Acción Pesos"
+
+
+def test_prefix_of_the_last_word():
+    names = {record.name for _, record in get_index().search("renta fija pes")}
+
+    assert "Renta Fija Pesos - Clase A" in names
+    assert get_index().find_prefix("fija dol") == {1}
+
+
+def test_typos_are_found_by_trigrams():
+    (_, record), *_ = get_index().search("acciones argentnas")
+
+    assert record.name == "Acciones Argentinas"
+
+
+def test_unrelated_queries_find_nothing():
+    assert get_index().search("xyz") == []
+    assert get_index().search("  ") == []
+
+
+def test_search_many_and_results():
+    results = get_index().search_many(["renta", "pesos"], results=1)
+
+    assert [len(found) for found in results.values()] == [1, 1]
@@ -0,0 +1,120 @@
+from datetime import datetime
+
+from app import services
+from app.common.metrics import get_metrics
+from app.models import FundClassParser
+from app.models.fetch_engine import AsyncFetchEngine
+from app.models.records import DEFAULT_HEADER
+
+from .conftest import (
+    make_fund_data,
+    make_fund_row,
+)
+
+
+TODAY = datetime(2024, 1, 3)
+BROKEN = ["None", "1.00", "1.00", "1.00", "1.00", "1.00", "02-01-2024"]
+VALID = ["1.00", "1.00", "1.00", "1.00", "1.00", "1.00", "02-01-2024"]
+
+
+def get_counter(name: str, **labels) -> float:
+    counter = get_metrics().counter(name, "", tuple(labels))
+    return counter.values.get(counter.get_key(labels), 0)
+
+
+def test_check_reports_the_funds_not_repaired(sheets_service, monkeypatch):
+    rows = [make_fund_row(index, BROKEN if index % 2 else VALID) for index in range(1, 7)]
+    service = sheets_service({"funds": [list(DEFAULT_HEADER), *rows]})
+    monkeypatch.setattr(services, "get_current_time", lambda: TODAY)
+
+    def calc_data_by_funds(self, fund_codes, **kwargs):
+        # Fund 3 failed, the rest are repaired
+        return [None if fund_code[1] == "3" else VALID for fund_code in fund_codes]
+
+    monkeypatch.setattr(FundClassParser, "calc_data_by_funds", calc_data_by_funds)
+    services.check_database_integrity(use_response_cache=False, rate_limit=0)
+
+    assert get_counter("integrity_funds_total", result="broken") == 3
+    assert get_counter("integrity_funds_total", result="repaired") == 2
+    assert get_counter("integrity_funds_total", result="not_repaired") == 1
+    # Written values are stored as numbers, like google does with USER_ENTERED
+    tna_values = [row[7] for row in service.sheets["funds"][1:]]
+    assert tna_values == [1.0, "1.00", "None", "1.00", 1.0, "1.00"]
+
+
+def test_create_streams_the_funds_in_chunks(sheets_service, monkeypatch):
+    service = sheets_service({"funds": [list(DEFAULT_HEADER)]})
+    fund_rows = [make_fund_row(index) for index in range(1, 8)]
+    monkeypatch.setattr(FundClassParser, "iter_all_funds", lambda self: iter(fund_rows))
+
+    services.create_initial_funds_database(chunk_size=3)
+
+    assert service.calls["append"] == 3
+    assert len(service.sheets["funds"]) == 8
+    assert get_counter("funds_total", result="listed") == 7
+
+
+def test_create_resumes_a_creation_that_failed_half_way(sheets_service, monkeypatch):
+    service = sheets_service({"funds": [list(DEFAULT_HEADER)]})
+    fund_rows = [make_fund_row(index) for index in range(1, 8)]
+    monkeypatch.setattr(FundClassParser, "iter_all_funds", lambda self: iter(fund_rows))
+
+    append = service.append
+
+    def failing_append(a1_range, values):
+        if service.calls["append"] >= 1:
+            raise TimeoutError("The write timed out")
+        return append(a1_range, values)
+
+    monkeypatch.setattr(service, "append", failing_append)
+    services.create_initial_funds_database(chunk_size=3)
+    assert len(service.sheets["funds"]) == 4
+
+    monkeypatch.setattr(service, "append", append)
+    services.create_initial_funds_database(chunk_size=3)
+
+    code_index = DEFAULT_HEADER.index("class_cafci_code")
+    codes = [str(row[code_index]) for row in service.sheets["funds"][1:]]
+    assert sorted(codes) == sorted(row[code_index] for row in fund_rows)
+    assert get_counter("funds_total", result="existing") == 3
+
+
+def test_update_keeps_the_values_of_the_funds_without_prices(sheets_service, monkeypatch):
+    rows = [make_fund_row(index, VALID) for index in range(1, 5)]
+    service = sheets_service({"funds": [list(DEFAULT_HEADER), *rows]})
+    monkeypatch.setattr(services, "get_current_time", lambda: TODAY)
+
+    async def fetch_fund_data(self, session, fund_code):
+        # Every request of fund 3 failed
+        return (None, None, None, None, None) if fund_code[1] == "3" else make_fund_data(int(fund_code[1]))
+
+    monkeypatch.setattr(AsyncFetchEngine, "fetch_fund_data", fetch_fund_data)
+    services.update_funds_database(use_response_cache=False, rate_limit=0)
+
+    assert service.sheets["funds"][3][7:14] == rows[2][7:14]
+    assert get_counter("funds_total", result="updated") == 3
+    assert get_counter("funds_total", result="unfinished") == 1
+
+
+def failing_get(a1_range, value_render_option):
+    raise TimeoutError("The read timed out")
+
+
+def test_check_aborts_when_the_sheet_cannot_be_read(sheets_service, monkeypatch):
+    service = sheets_service({"funds": [list(DEFAULT_HEADER), make_fund_row(1, BROKEN)]})
+    monkeypatch.setattr(service, "get", failing_get)
+
+    services.check_database_integrity(use_response_cache=False, rate_limit=0)
+
+    assert service.calls["batchUpdate"] == 0
+    assert get_counter("integrity_funds_total", result="checked") == 0
+
+
+def test_update_aborts_when_the_sheet_cannot_be_read(sheets_service, monkeypatch):
+    service = sheets_service({"funds": [list(DEFAULT_HEADER), make_fund_row(1, VALID)]})
+    monkeypatch.setattr(service, "get", failing_get)
+
+    services.update_funds_database(use_response_cache=False, rate_limit=0)
+
+    assert service.updated_cells == 0
+    assert get_counter("funds_total", result="updated") == 0
@@ -0,0 +1,141 @@
+from typing import Optional
+
+import pytest
+
+from app.common.exceptions import SheetWriteError
+from app.sheets import (
+    APISpreadsheet,
+    SheetMirror,
+)
+from app.sheets.sheet_api import cells_are_equal
+from benchmarks.fake_sheets import FakeSheetsService
+
+
+class FakeResponse(dict):
+    """httplib2 response of a failed google request."""
+
+    def __init__(self, status: int):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = "Error"
+
+
+def make_sheet(rows: list, mirror: Optional[SheetMirror] = None):
+    service = FakeSheetsService({"funds": rows})
+    sheet = APISpreadsheet(service=service, mirror=mirror)
+
+    return sheet, service
+
+
+def fail_batch_update(service, error, after_calls: int):
+    """
+    Make the batchUpdate calls fail after the first after_calls ones.
+    """
+    batch_update = service.batch_update
+
+    def failing_batch_update(data):
+        if service.calls["batchUpdate"] >= after_calls:
+            service.calls["batchUpdate"] += 1
+            raise error
+        return batch_update(data)
+
+    service.batch_update = failing_batch_update
+
+
+def get_ranges_values(count: int) -> list:
+    return [(f"B{row}", [[f"new {row}"]]) for row in range(1, count + 1)]
+
+
+def test_batch_update_splits_the_ranges_in_batches():
+    sheet, service = make_sheet([["a", "old"] for _ in range(10)])
+
+    updated_cells = sheet.batch_update_data(get_ranges_values(10), batch_size=4)
+
+    assert updated_cells == 10
+    assert service.calls["batchUpdate"] == 3
+    assert [row[1] for row in service.sheets["funds"]] == [f"new {row}" for row in range(1, 11)]
+
+
+def test_batch_update_failure_reports_the_ranges_written():
+    from googleapiclient.errors import HttpError
+
+    sheet, service = make_sheet([["a", "old"] for _ in range(10)])
+    fail_batch_update(service, HttpError(FakeResponse(400), b"Invalid range"), after_calls=2)
+
+    with pytest.raises(SheetWriteError) as error:
+        sheet.batch_update_data(get_ranges_values(10), batch_size=4)
+
+    assert error.value.written_ranges == 8
+    assert error.value.updated_cells == 8
+
+
+@pytest.mark.parametrize("error, mirror_kept", [
+    (FakeResponse(400), True),
+    (FakeResponse(503), False),
+    (TimeoutError("The read operation timed out"), False),
+])
+def test_mirror_keeps_only_the_ranges_written(data_dir, error, mirror_kept):
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, FakeResponse):
+        error = HttpError(error, b"Error")
+
+    mirror = SheetMirror()
+    sheet, service = make_sheet([["a", "old"] for _ in range(10)], mirror=mirror)
+    mirror.set_rows(sheet.SPREADSHEET_ID, "funds", service.sheets["funds"])
+    fail_batch_update(service, error, after_calls=1)
+
+    with pytest.raises(SheetWriteError):
+        sheet.batch_update_data(get_ranges_values(10), batch_size=4)
+
+    rows = mirror.get_rows(sheet.SPREADSHEET_ID, "funds")
+    if not mirror_kept:
+        # The failed call may have been applied, the next read goes to google
+        assert rows is None
+        return
+
+    assert [row[1] for row in rows] == ["new 1", "new 2", "new 3", "new 4"] + ["old"] * 6
+
+
+def test_diff_update_rows_counts_the_failed_ranges():
+    sheet, service = make_sheet([["old", "old"] for _ in range(3)])
+    fail_batch_update(service, TimeoutError("The read operation timed out"), after_calls=0)
+
+    stats = sheet.diff_update_rows([["old", "old"]] * 3, [["old", "new"], ["old", "old"], ["new", "new"]],
+                                   _range="A1:B3")
+
+    assert stats == {"updated_cells": 0, "skipped_cells": 3, "failed_ranges": 2}
+
+
+@pytest.mark.parametrize("old, new, equal", [
+    (1.5, "1.50", True),
+    ("1.00", 1, True),
+    (None, "", True),
+    ("", None, True),
+    (None, "0", False),
+    ("Fondo", "fondo", False),
+    ("03-01-2024", "03-01-2024", True),
+])
+def test_cells_are_compared_by_value(old, new, equal):
+    assert cells_are_equal(old, new) is equal
+
+
+def test_changed_cells_are_merged_into_ranges():
+    sheet, _ = make_sheet([])
+    current_values = [["1", "2", "3"], ["1", "2", "3"], ["1", "2", "3"], ["1", "2"]]
+    values = [["1", "x", "y"], ["1", "x", "y"], None, ["z", "2", "3"]]
+
+    changed_ranges, skipped_cells = sheet.get_changed_ranges(current_values, values, "H2:J5")
+
+    assert changed_ranges == [("H5:H5", [["z"]]), ("I2:J3", [["x", "y"], ["x", "y"]]), ("J5:J5", [["3"]])]
+    assert skipped_cells == 3
+
+
+def test_diff_update_writes_only_the_changed_cells():
+    sheet, service = make_sheet([["a", 1, 2], ["b", 3, 4]])
+
+    stats = sheet.diff_update_data([[1, "2.0"], [3, 5]], _range="B1:C2")
+
+    assert stats == {"updated_cells": 1, "skipped_cells": 3, "failed_ranges": 0}
+    assert service.calls["batchUpdate"] == 1
+    assert service.sheets["funds"] == [["a", 1, 2], ["b", 3, 5]]
@@ -0,0 +1,87 @@
+from app.sheets import sheet_mirror
+from app.sheets.sheet_mirror import (
+    SheetMirror,
+    get_sheet_mirror,
+    read_grid,
+    write_grid,
+)
+
+
+SPREADSHEET_ID = "spreadsheet"
+ROWS = [["class", "name"], ["A", "Fondo 1", ""], ["B", "Fondo 2"], [], [""]]
+
+
+def test_read_grid_drops_the_empty_cells_and_rows_at_the_end():
+    assert read_grid(ROWS, 0, 1, 1) == [["A", "Fondo 1"], ["B", "Fondo 2"]]
+    assert read_grid(ROWS, 1, 2, 5, 2) == [["Fondo 2"]]
+    assert read_grid(ROWS, 3, 0, 4) == []
+
+
+def test_write_grid_skips_none_cells_and_empty_rows():
+    rows = [["a", "b"]]
+
+    write_grid(rows, 1, 0, [["x", None, "z"], None, [1.5]])
+
+    assert rows == [["a", "x", "", "z"], [], ["", "1.5"]]
+
+
+def test_fresh_mirror_answers_the_reads(monkeypatch):
+    mirror = SheetMirror(max_age=60)
+    mirror.set_rows(SPREADSHEET_ID, "funds", [["A", 1]])
+
+    assert mirror.get_rows(SPREADSHEET_ID, "funds") == [["A", "1"]]
+    assert mirror.get_rows(SPREADSHEET_ID, "other") is None
+
+    now = sheet_mirror.time.time()
+    monkeypatch.setattr(sheet_mirror.time, "time", lambda: now + 61)
+    assert mirror.get_rows(SPREADSHEET_ID, "funds") is None
+    assert mirror.get_stats() == {"hits": 1, "misses": 2}
+
+
+def test_writes_are_saved_on_flush():
+    mirror = SheetMirror()
+    mirror.set_rows(SPREADSHEET_ID, "funds", [["A", "1"]])
+    mirror.write(SPREADSHEET_ID, "funds", 1, 0, [["2"]])
+    mirror.append(SPREADSHEET_ID, "funds", 0, [["B", "3"]])
+    # Sheets never mirrored are not written
+    mirror.write(SPREADSHEET_ID, "other", 0, 0, [["x"]])
+
+    assert SheetMirror().get_rows(SPREADSHEET_ID, "funds") == [["A", "1"]]
+
+    mirror.close()
+    assert SheetMirror().get_rows(SPREADSHEET_ID, "funds") == [["A", "2"], ["B", "3"]]
+    assert SheetMirror().get_rows(SPREADSHEET_ID, "other") is None
+
+
+def test_invalidate_forgets_the_sheet():
+    mirror = SheetMirror()
+    mirror.set_rows(SPREADSHEET_ID, "funds", [["A", "1"]])
+    mirror.write(SPREADSHEET_ID, "funds", 1, 0, [["2"]])
+
+    mirror.invalidate(SPREADSHEET_ID, "funds")
+    mirror.flush()
+
+    assert mirror.get_rows(SPREADSHEET_ID, "funds") is None
+    assert SheetMirror().get_rows(SPREADSHEET_ID, "funds") is None
+
+
+def test_mirror_is_shared_by_the_process(monkeypatch):
+    monkeypatch.setattr(sheet_mirror, "_mirrors", {})
+
+    mirror = get_sheet_mirror()
+    assert mirror.max_age == sheet_mirror.MIRROR_MAX_AGE
+    assert get_sheet_mirror(max_age=5) is mirror
+    assert mirror.max_age == 5
+
+
+def test_spreadsheet_reads_only_once(sheets_service):
+    from app.sheets import APISpreadsheet
+
+    service = sheets_service({"funds": [["class", "name"], ["A", "Fondo 1"]]})
+    sheet = APISpreadsheet(mirror=get_sheet_mirror())
+
+    assert sheet.get_data(_range="A2:B") == [["A", "Fondo 1"]]
+    sheet.update_data([["Fondo 2"]], _range="B2")
+    assert sheet.get_data(_range="B2:B") == [["Fondo 2"]]
+    assert sheet.get_data(_range="A2:B", refresh=True) == [["A", "Fondo 2"]]
+    assert service.calls["get"] == 2
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from app.sheets import client
+
+
+class SlowService():
+    """Sheets client whose spreadsheets resource takes a while to build, like the discovery document."""
+
+    def __init__(self):
+        self.built = 0
+
+    def spreadsheets(self):
+        self.built += 1
+        time.sleep(0.05)
+        return object()
+
+
+def test_spreadsheets_are_built_once_by_concurrent_threads():
+    service = SlowService()
+    client.set_sheets_service(service)
+    try:
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(client.get_spreadsheets())) for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        client.set_sheets_service(None)
+
+    assert service.built == 1
+    assert len({id(spreadsheets) for spreadsheets in results}) == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from app.models import transport
+from app.models.transport import (
+    get_endpoint,
+    get_transport,
+)
+
+
+@pytest.mark.parametrize("url, endpoint", [
+    ("https://api.cafci.org.ar/fondo/1222/clase/3924/ficha", "/fondo/:id/clase/:id/ficha"),
+    ("https://api.cafci.org.ar/fondo/1/clase/2/rendimiento/2024-01-01/2024-01-05",
+     "/fondo/:id/clase/:id/rendimiento/:date/:date"),
+    ("https://api.cafci.org.ar/fondo/", "/fondo"),
+    ("https://api.cafci.org.ar", "/"),
+])
+def test_endpoint_without_ids_and_dates(url, endpoint):
+    assert get_endpoint(url) == endpoint
+
+
+def test_transport_is_shared_until_a_bigger_pool_is_needed(monkeypatch):
+    monkeypatch.setattr(transport, "_transports", {})
+
+    small = get_transport(pool_size=5)
+    assert get_transport(pool_size=2) is small
+
+    big = get_transport(pool_size=20)
+    assert big is not small
+    assert big.pool_size == 20
+
+
+def test_requests_reuse_the_connection(cafci_server):
+    cafci_transport = transport.CafciTransport(pool_size=1)
+
+    for _ in range(5):
+        assert cafci_transport.get(f"{cafci_server.url}/fondo").status_code == 200
+
+    stats = cafci_transport.get_stats()
+    cafci_transport.close()
+    assert (stats.requests_count, stats.new_connections, stats.reused_connections) == (5, 1, 4)
@@ -0,0 +1,46 @@
+from decimal import (
+    Decimal,
+    ROUND_HALF_UP,
+    localcontext,
+)
+
+import pytest
+
+from app.common.utils import (
+    DECIMAL_ZERO,
+    normalize_decimals,
+    normalize_many,
+)
+
+
+def normalize_with_context(value, decimals_to_round=8, method="ROUND_DOWN"):
+    """
+    normalize_decimals before the fast path: quantize inside a localcontext.
+    """
+    with localcontext() as context:
+        context.rounding = method
+        return Decimal(str(value)).quantize(Decimal(f'0.{"0" * decimals_to_round}'))
+
+
+@pytest.mark.parametrize("value", [
+    0, 7, -3, "1.23456789123", "-0.000000019", 0.1, 1e-7, 123456.789, Decimal("2.5"), Decimal("-1.999999999"),
+])
+@pytest.mark.parametrize("decimals_to_round", [0, 2, 8])
+def test_normalize_decimals_matches_the_context_quantize(value, decimals_to_round):
+    assert normalize_decimals(value, decimals_to_round) == normalize_with_context(value, decimals_to_round)
+
+
+def test_normalize_decimals_rounding_method():
+    assert normalize_decimals("2.345", 2, ROUND_HALF_UP) == Decimal("2.35")
+    assert normalize_decimals("2.345", 2) == Decimal("2.34")
+
+
+def test_invalid_values_are_zero():
+    assert normalize_decimals(None) == DECIMAL_ZERO
+    assert normalize_decimals("not a number") == DECIMAL_ZERO
+
+
+def test_normalize_many_is_normalize_decimals_of_every_value():
+    values = [Decimal("1.239"), "4.5", 3, None, "x", 0.125, Decimal("-7")]
+
+    assert normalize_many(values, 2) == [normalize_decimals(value, 2) for value in values]
@@ -0,0 +1,73 @@
+from datetime import date
+
+import numpy as np
+
+from app.models.records import (
+    DEFAULT_HEADER,
+    FundTable,
+)
+from app.models.validation import (
+    REPORT_ROWS,
+    parse_day,
+    to_dates,
+    to_numbers,
+    validate_funds,
+)
+from .conftest import make_fund_row
+
+
+TODAY = date(2024, 1, 3)
+VALID_VALUES = ["1.00", "1.00", "1.00", "1.00", "1.00", "1.00", "01-01-2024"]
+
+
+def make_table(calc_values: list, first_row: int = 2) -> FundTable:
+    rows = [make_fund_row(index, values) for index, values in enumerate(calc_values)]
+    return FundTable(DEFAULT_HEADER, rows, first_row=first_row)
+
+
+def test_to_numbers_parses_the_mixed_columns():
+    assert to_numbers(["1.5", 2, 3.0]).tolist() == [1.5, 2, 3]
+    assert np.isnan(to_numbers(["1.5", "", None, "abc"])[1:]).all()
+
+
+def test_parse_day_accepts_any_separator():
+    assert parse_day("03/01/2024") == parse_day("03-01-2024") == date(2024, 1, 3).toordinal() - 719163
+    assert np.isnat(to_dates(["31-02-2024", "", None, "2024-01-03"])).all()
+
+
+def test_valid_funds_without_problems():
+    report = validate_funds(make_table([VALID_VALUES] * 3), today=TODAY)
+
+    assert not report
+    assert repr(report) == "3 funds without problems"
+
+
+def test_empty_table():
+    assert not validate_funds(FundTable(DEFAULT_HEADER, []), today=TODAY)
+
+
+def test_problems_have_the_sheet_row_numbers():
+    table = make_table([
+        VALID_VALUES,
+        ["abc", *VALID_VALUES[1:]],
+        ["1.00", "1.00", "5000", *VALID_VALUES[3:]],
+        [*VALID_VALUES[:6], "20-12-2023"],
+        [*VALID_VALUES[:6], "not a date"],
+    ], first_row=10)
+
+    report = validate_funds(table, today=TODAY)
+
+    assert report.problems == {
+        ("tna", "invalid"): [11],
+        ("tem", "out of range"): [12],
+        ("updated", "stale"): [13],
+        ("updated", "invalid"): [14],
+    }
+    assert report.get_row_numbers() == [11, 12, 13, 14]
+    assert repr(report).startswith("4 of 5 funds with problems")
+
+
+def test_report_shows_only_some_rows():
+    report = validate_funds(make_table([["", *VALID_VALUES[1:]]] * (REPORT_ROWS + 5)), today=TODAY)
+
+    assert "tna invalid: 15 rows (2, 3, 4, 5, 6, 7, 8, 9, 10, 11 and 5 more)" in repr(report)